@@ -0,0 +1,277 @@
+################################################################################
+#   Libraries                                                                  #
+################################################################################
+import os, sys, time, json, math, socket, getopt, threading, subprocess, urllib2
+################################################################################
+
+################################################################################
+#   Scenarios                                                                  #
+################################################################################
+
+#Every scenario starts server.py with these settings on top of its own
+SCENARIOS = {
+    'munch-off': {'MUNCHER_ENABLED': False},
+    'munch-on': {'MUNCHER_ENABLED': True, 'MUNCHER_TEMPLATES': False},
+    'munch-on-cached': {'MUNCHER_ENABLED': True, 'MUNCHER_TEMPLATES': True},
+}
+
+#Synthetic page built from every class and id in the test stylesheets
+HEAVY_ROW = """
+    <div class="box purple"><p class="red underline">row %(row)d Assertively leverage existing scalable growth strategies.</p>
+    <p class="blue italic" id="special">Appropriately incubate collaborative imperatives after team building networks.</p>
+    <p class="green">Interactively strategize plug-and-play platforms <span class="underline">whereas efficient infrastructures</span>.</p></div>
+"""
+
+HEAVY_TEMPLATE = """{%% extends "header1.html" %%}
+{%% block body %%}
+<body>
+%(rows)s
+</body>
+</html>
+{%% endblock %%}
+"""
+
+def usage():
+    print "\nUSAGE:\n"
+    print "python loadtest.py --concurrency 8 --requests 500 --output results.json\n"
+    print "REQUIRED ARGUMENTS:\n"
+    print "none, every scenario is run against /view1, /view2 and /heavy by default\n"
+    print "OPTIONAL ARGUMENTS:\n"
+    print "--scenarios {names}           comma separated scenarios to run, any of " + ", ".join(sorted(SCENARIOS))
+    print "--paths {paths}               comma separated paths to request (defaults to /view1,/view2,/heavy)"
+    print "--concurrency {count}         requests in flight at the same time (defaults to 4)"
+    print "--requests {count}            requests per scenario (defaults to 200)"
+    print "--rate {count}                requests per second across all workers, as fast as possible if not set"
+    print "--heavy-rows {count}          size of the synthetic /heavy page (defaults to 500)"
+    print "--executor {type}             munch on a pool of 'thread' or 'process' workers"
+    print "--port {port}                 port to start server.py on (defaults to 4100)"
+    print "--output {file}               saves the results as json"
+    print "--compare {file}              prints the change from results saved by an earlier run"
+    print "--help                        shows this menu\n"
+    sys.exit(2)
+
+################################################################################
+#   Server                                                                     #
+################################################################################
+
+def serve(port, scenario, heavy_rows, executor):
+    """runs server.py in this process with the settings of a scenario"""
+    import logging
+    from jinja2 import ChoiceLoader, DictLoader
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import server
+
+    app = server.app
+    app.config.update(SCENARIOS[scenario])
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    rows = "".join([HEAVY_ROW % {'row': row} for row in range(heavy_rows)])
+    app.jinja_env.loader = ChoiceLoader([app.jinja_env.loader, DictLoader({'heavy.html': HEAVY_TEMPLATE % {'rows': rows}})])
+
+    @app.route('/heavy')
+    def heavy():
+        from flask import render_template
+        return render_template('heavy.html')
+    heavy.munch = True
+
+    if app.config['MUNCHER_TEMPLATES']:
+        server.muncher.initTemplates(app)
+
+    if executor:
+        from muncher.offload import Offloader
+        server.muncher.offloader = Offloader(executor)
+
+    app.run(host='127.0.0.1', port=port, threaded=True, use_reloader=False)
+
+def startServer(port, scenario, heavy_rows, executor):
+    args = [sys.executable, os.path.abspath(__file__), '--serve', scenario, '--port', str(port), '--heavy-rows', str(heavy_rows)]
+    if executor:
+        args += ['--executor', executor]
+    process = subprocess.Popen(args)
+
+    # wait for it to accept connections
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server.py exited while starting the " + scenario + " scenario")
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return process
+        except socket.error:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server.py did not start the " + scenario + " scenario in time")
+
+def getRss(pid):
+    """resident memory of a process in bytes, 0 where /proc is not available"""
+    try:
+        for line in open('/proc/%d/status' % pid):
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return 0
+
+################################################################################
+#   Load                                                                       #
+################################################################################
+
+def percentile(values, percent):
+    """nearest rank percentile of a sorted list"""
+    if not len(values):
+        return 0
+    index = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+def drive(port, paths, total, concurrency, rate, pid):
+    """sends total requests spread over the paths from concurrency threads"""
+    lock = threading.Lock()
+    state = {'next': 0}
+    latencies = dict([(path, []) for path in paths])
+    errors = []
+    rss = []
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            rss.append(getRss(pid))
+            done.wait(0.1)
+
+    def worker(start):
+        while True:
+            with lock:
+                index = state['next']
+                if index >= total:
+                    return
+                state['next'] += 1
+
+            # keep a steady rate instead of sending in bursts
+            if rate:
+                delay = start + index / float(rate) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            path = paths[index % len(paths)]
+            sent = time.time()
+            try:
+                urllib2.urlopen('http://127.0.0.1:%d%s' % (port, path), timeout = 60).read()
+                latency = time.time() - sent
+                with lock:
+                    latencies[path].append(latency)
+            except Exception, e:
+                with lock:
+                    errors.append(path + ": " + str(e))
+
+    sampler = threading.Thread(target = sample)
+    sampler.start()
+
+    start = time.time()
+    threads = [threading.Thread(target = worker, args = (start,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    done.set()
+    sampler.join()
+
+    every = sorted(sum(latencies.values(), []))
+    result = summarize(every, elapsed)
+    result['errors'] = len(errors)
+    result['error_samples'] = errors[:5]
+    result['rss_peak'] = max(rss) if len(rss) else 0
+    result['rss_end'] = rss[-1] if len(rss) else 0
+    result['paths'] = dict([(path, summarize(sorted(values), elapsed)) for path, values in latencies.items()])
+    return result
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'max': (latencies[-1] if len(latencies) else 0) * 1000,
+    }
+
+################################################################################
+#   Report                                                                     #
+################################################################################
+
+def getVersion():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)), stderr = open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(results, previous = None):
+    print "\n%-18s %9s %9s %9s %9s %9s %9s" % ("scenario", "req/s", "p50 ms", "p95 ms", "p99 ms", "rss MB", "errors")
+    for scenario in sorted(results):
+        result = results[scenario]
+        print "%-18s %9.1f %9.2f %9.2f %9.2f %9.1f %9d" % (scenario, result['throughput'], result['p50'], result['p95'], result['p99'], result['rss_peak'] / 1048576.0, result['errors'])
+        if previous and scenario in previous:
+            old = previous[scenario]
+            changes = []
+            for key in ('throughput', 'p50', 'p95', 'p99', 'rss_peak'):
+                if old[key]:
+                    changes.append("%s %+.1f%%" % (key, (result[key] - old[key]) * 100.0 / old[key]))
+            print "%-18s %s" % ("", ", ".join(changes))
+    print ""
+
+################################################################################
+#  __main__                                                                    #
+################################################################################
+if __name__ == "__main__":
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "h", ["scenarios=", "paths=", "concurrency=", "requests=", "rate=", "heavy-rows=", "executor=", "port=", "output=", "compare=", "serve=", "help"])
+    except getopt.GetoptError, e:
+        print e
+        usage()
+
+    options = {'scenarios': sorted(SCENARIOS), 'paths': ['/view1', '/view2', '/heavy'], 'concurrency': 4, 'requests': 200, 'rate': None,
+               'heavy-rows': 500, 'executor': None, 'port': 4100, 'output': None, 'compare': None, 'serve': None}
+
+    for key, value in opts:
+        if key in ("-h", "--help"):
+            usage()
+        key = key[2:]
+        if key in ('scenarios', 'paths'):
+            value = value.split(',')
+        elif key in ('concurrency', 'requests', 'heavy-rows', 'port'):
+            value = int(value)
+        elif key == 'rate':
+            value = float(value)
+        options[key] = value
+
+    if options['serve']:
+        serve(options['port'], options['serve'], options['heavy-rows'], options['executor'])
+        sys.exit(0)
+
+    for scenario in options['scenarios']:
+        if not scenario in SCENARIOS:
+            print "unknown scenario " + scenario
+            usage()
+
+    results = {}
+    for scenario in options['scenarios']:
+        print "running " + scenario + "..."
+        process = startServer(options['port'], scenario, options['heavy-rows'], options['executor'])
+        try:
+            # warm up so the first request's imports and template loads are not measured
+            drive(options['port'], options['paths'], len(options['paths']), 1, None, process.pid)
+            results[scenario] = drive(options['port'], options['paths'], options['requests'], options['concurrency'], options['rate'], process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+
+    previous = None
+    if options['compare']:
+        previous = json.load(open(options['compare']))['results']
+
+    report(results, previous)
+
+    if options['output']:
+        settings = dict([(key, options[key]) for key in ('paths', 'concurrency', 'requests', 'rate', 'heavy-rows', 'executor')])
+        json.dump({'version': getVersion(), 'time': time.time(), 'settings': settings, 'results': results}, open(options['output'], 'w'), indent = 2, sort_keys = True)
+        print "results saved to " + options['output']
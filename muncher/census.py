@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, json
+from collections import OrderedDict
+from util import Util
+
+class Census(object):
+    """reads and writes the class/id census and rename maps so munching can be split across machines
+
+    a run can scan its shard and export the census, a single merge step sums every shard's
+    census and computes the map, and each shard is then rewritten from that shared map
+    """
+    @staticmethod
+    def toStr(value):
+        """json hands back unicode, everything else in the muncher works with byte strings"""
+        if isinstance(value, unicode):
+            return value.encode("utf-8")
+        return value
+
+    @staticmethod
+    def toDict(values):
+        result = {}
+        for key, value in values.items():
+            result[Census.toStr(key)] = Census.toStr(value)
+        return result
+
+    @staticmethod
+    def toSet(values):
+        return set([Census.toStr(value) for value in values])
+
+    @staticmethod
+    def write(path, data):
+        Util.filePutContents(path, json.dumps(data, separators = (",", ":"), sort_keys = True))
+
+    @staticmethod
+    def read(path):
+        return json.loads(Util.fileGetContents(path))
+
+    @staticmethod
+    def save(muncher, path):
+        """exports everything the scan phase found
+
+        Arguments:
+        muncher -- Muncher that has finished scanning
+        path -- file to write to
+
+        Returns:
+        void
+
+        """
+        Census.write(path, {
+            "classes": muncher.class_counter,
+            "ids": muncher.id_counter,
+            "used_classes": sorted(muncher.used_classes),
+            "used_ids": sorted(muncher.used_ids),
+            "manifest_ids": getattr(muncher, "manifest_ids", {}),
+            "manifest_classes": getattr(muncher, "manifest_classes", {})
+        })
+
+    @staticmethod
+    def load(muncher, paths):
+        """merges one or more exported census files into a muncher as if it had scanned them all
+
+        Arguments:
+        muncher -- Muncher to merge into
+        paths -- list of census files
+
+        Returns:
+        void
+
+        """
+        for path in paths:
+            data = Census.read(path)
+            for name, savings in Census.toDict(data["classes"]).items():
+                muncher.class_counter[name] = muncher.class_counter.get(name, 0) + savings
+
+            for name, savings in Census.toDict(data["ids"]).items():
+                muncher.id_counter[name] = muncher.id_counter.get(name, 0) + savings
+
+            muncher.used_classes.update(Census.toSet(data["used_classes"]))
+            muncher.used_ids.update(Census.toSet(data["used_ids"]))
+
+            if len(data["manifest_ids"]) or len(data["manifest_classes"]):
+                if not hasattr(muncher, "manifest_ids"):
+                    muncher.manifest_ids = {}
+                    muncher.manifest_classes = {}
+                muncher.manifest_ids.update(Census.toDict(data["manifest_ids"]))
+                muncher.manifest_classes.update(Census.toDict(data["manifest_classes"]))
+
+    @staticmethod
+    def saveMap(muncher, path):
+        """exports the computed rename maps
+
+        Arguments:
+        muncher -- Muncher that has run processMaps
+        path -- file to write to
+
+        Returns:
+        void
+
+        """
+        Census.write(path, {
+            "classes": muncher.class_map,
+            "ids": muncher.id_map,
+            "used_classes": sorted(muncher.used_classes),
+            "used_ids": sorted(muncher.used_ids)
+        })
+
+    @staticmethod
+    def writeMaps(path, class_map, id_map):
+        """writes a class and id map in the same format as Census.saveMap
+
+        Arguments:
+        path -- file to write to
+        class_map -- dictionary of classes to new names
+        id_map -- dictionary of ids to new names
+
+        Returns:
+        void
+
+        """
+        Census.write(path, {"classes": class_map, "ids": id_map})
+
+    @staticmethod
+    def readMaps(path):
+        """reads the class and id map from a file written by Census.writeMaps or Census.saveMap
+
+        Arguments:
+        path -- map file
+
+        Returns:
+        tuple -- (class map, id map)
+
+        """
+        data = Census.read(path)
+        return Census.toDict(data["classes"]), Census.toDict(data["ids"])
+
+    @staticmethod
+    def loadMap(muncher, path):
+        """loads rename maps exported by Census.saveMap instead of computing them
+
+        Arguments:
+        muncher -- Muncher to load into
+        path -- map file
+
+        Returns:
+        void
+
+        """
+        data = Census.read(path)
+        muncher.class_map = Census.toDict(data["classes"])
+        muncher.id_map = Census.toDict(data["ids"])
+        muncher.used_classes = Census.toSet(data["used_classes"])
+        muncher.used_ids = Census.toSet(data["used_ids"])
+
+class CensusCache(object):
+    """remembers what the scan found in each file so a process that munches many times only
+    scans the files that changed since
+
+    an entry is keyed on the path, mtime and size of the file and on every setting that
+    changes what a scan finds, the least recently used entries are dropped past max_files
+    """
+    def __init__(self, max_files = 100000):
+        """constructor
+
+        Arguments:
+        max_files -- files to remember at most
+
+        Returns:
+        void
+
+        """
+        self.max_files = max_files
+        self.files = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def getKey(kind, path, config):
+        """builds the key of a single file
+
+        Arguments:
+        kind -- css, view or js
+        path -- path to file
+        config -- Config the file is scanned with
+
+        Returns:
+        tuple
+
+        """
+        stat = os.stat(path)
+        return (kind, os.path.abspath(path), stat.st_mtime, stat.st_size, config.ignore, config.class_selectors,
+            config.id_selectors, config.custom_selectors, config.js_manifest is not None,
+            config.prune_css or config.critical_css)
+
+    def get(self, key):
+        """gets what a file was found to hold
+
+        Arguments:
+        key -- key from CensusCache.getKey
+
+        Returns:
+        tuple -- (class counter, id counter, used classes, used ids), None if the file is not known
+
+        """
+        found = self.files.pop(key, None)
+        if found is None:
+            self.misses += 1
+            return None
+
+        self.files[key] = found
+        self.hits += 1
+        return found
+
+    def set(self, key, found):
+        self.files[key] = found
+        while len(self.files) > self.max_files:
+            self.files.popitem(last = False)
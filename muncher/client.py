@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# thin client for a munch daemon, it only needs the standard library so it starts fast
+import os, sys, json, socket, getopt, threading
+
+def usage():
+    print "\nUSAGE:\n"
+    print "python -m muncher.client --socket /tmp/munch.sock -- --css css --html views\n"
+    print "REQUIRED ARGUMENTS:\n"
+    print "--socket {path}               unix socket the daemon started with munch --daemon {path} listens on\n"
+    print "OPTIONAL ARGUMENTS:\n"
+    print "--batch {file}                sends every line of a file (- for stdin) as a json job and prints every"
+    print "                              line the daemon sends back, instead of a single job from the options"
+    print "--stop                        stops the daemon"
+    print "--help                        shows this menu\n"
+    print "anything after -- is passed to the daemon as the options of a munch run\n"
+    sys.exit(2)
+
+class MunchClient(object):
+    """sends jobs to a munch daemon and hands back every line it answers with as it arrives"""
+    def __init__(self, path):
+        """constructor
+
+        Arguments:
+        path -- unix socket of the daemon
+
+        Returns:
+        void
+
+        """
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(path)
+
+    def submit(self, jobs):
+        """sends jobs and yields every message of the daemon until it answered all of them
+
+        jobs are written on their own thread so a long batch can not fill the socket while the
+        daemon waits for its answers to be read
+
+        Arguments:
+        jobs -- iterable of job dictionaries, strings are sent as they are
+
+        Returns:
+        generator -- message dictionaries
+
+        """
+        def write():
+            stream = self.connection.makefile("wb", 0)
+            try:
+                for job in jobs:
+                    if not isinstance(job, dict):
+                        # the daemon answers anything that is not a job with an error like any other
+                        stream.write((job if isinstance(job, basestring) else json.dumps(job)) + "\n")
+                        continue
+                    if job.get("cwd") is None and job.get("command") is None:
+                        job["cwd"] = os.getcwd()
+                    stream.write(json.dumps(job) + "\n")
+            finally:
+                stream.close()
+                self.connection.shutdown(socket.SHUT_WR)
+
+        writer = threading.Thread(target = write)
+        writer.daemon = True
+        writer.start()
+
+        reader = self.connection.makefile("rb")
+        try:
+            for line in reader:
+                yield json.loads(line)
+        finally:
+            reader.close()
+            self.connection.close()
+
+def readJobs(path):
+    lines = sys.stdin if path == "-" else open(path)
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line.strip()
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "", ["socket=", "batch=", "stop", "help"])
+    except getopt.GetoptError, e:
+        print "error: " + str(e)
+        usage()
+
+    opts = dict(opts)
+    if "--help" in opts or not "--socket" in opts:
+        usage()
+
+    if "--stop" in opts:
+        jobs = [{"command": "stop"}]
+    elif "--batch" in opts:
+        jobs = readJobs(opts["--batch"])
+    else:
+        jobs = [{"id": 1, "args": args}]
+
+    failed = False
+    for message in MunchClient(opts["--socket"]).submit(jobs):
+        if message.get("status") == "error":
+            failed = True
+
+        if "--batch" in opts:
+            print json.dumps(message)
+        elif "output" in message:
+            print message["output"].encode("utf-8")
+        elif message.get("status") == "error":
+            sys.stderr.write("error: " + message["error"].encode("utf-8") + "\n")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -13,11 +13,35 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sys, getopt
+import sys, getopt, re, copy, json, fnmatch
 from muncher import Muncher
 
+class ConfigError(Exception):
+    """raised for invalid settings instead of exiting, so a bad config cannot take down the program munching"""
+    pass
+
 class Config(object):
-    """configuration object for handling all config options for html-muncher"""
+    """configuration object for handling all config options for html-muncher
+
+    settings are gathered through the setters, processArgs or loadFile. freeze validates
+    them, turns every list that is only used for lookups into a set and every other list
+    into a tuple and compiles every pattern, after that the config can not be changed so one
+    config can be shared by any number of requests and threads. Config.replace makes a
+    changed copy
+    """
+
+    # command line options that take a value, config files use the same names without the dashes
+    value_options = ["css", "views", "html", "js", "ignore", "view-ext", "css-ext", "js-ext", "ignore-paths",
+        "framework", "selectors", "class-selectors", "id-selectors", "prune-safelist", "stream-window",
+        "max-memory", "export-census", "merge-census", "export-map", "import-map", "persist-map",
+        "remap-threshold", "name-budget", "write-threads", "changed-list", "js-manifest", "config", "daemon"]
+
+    # command line options that are switched on by being there
+    switch_options = ["no-follow-symlinks", "compress-html", "compress-js", "prune-css", "merge-css", "stream", "memory-report",
+        "show-savings", "gzip-names", "scope-names", "verbose", "rewrite-constants", "help"]
+
+    frameworks = (None, "jquery", "mootools")
+
     def __init__(self):
         """config object constructor
 
@@ -34,11 +58,55 @@ class Config(object):
         self.custom_selectors = ["document.querySelector"]
         self.framework = None
         self.view_extension = "html"
+        # files in css and js directories are only munched with one of these extensions, all when empty
+        self.css_extensions = []
+        self.js_extensions = []
+        # globs of files and directories to skip when walking directories
+        self.ignore_paths = [".*", "node_modules"]
+        self.follow_symlinks = True
         self.js_manifest = None
         self.show_savings = False
         self.compress_html = False
+        self.compress_js = False
+        self.prune_css = False
+        self.prune_safelist = []
+        self.merge_css = False
+        # set by the flask app when it wants Muncher.getCriticalCss for the page
+        self.critical_css = False
+        # set by the flask app to share the map of a stylesheet set between pages, in bytes
+        self.map_cache_memory = None
+        self.stream = False
+        self.stream_window = 1048576
+        self.memory_report = False
+        # in bytes, --max-memory takes megabytes
+        self.max_memory = None
+        self.export_census = None
+        self.merge_census = []
+        self.export_map = None
+        self.import_map = None
+        self.persist_map = None
+        self.remap_threshold = None
         self.rewrite_constants = False
+        self.gzip_names = False
+        # seconds --gzip-names may spend measuring strategies
+        self.name_budget = 10.0
+        self.scope_names = False
+        self.write_threads = 0
+        self.changed_list = None
         self.verbose = False
+        # unix socket to serve jobs on instead of munching
+        self.daemon = None
+        # set when munching inside another program, like the flask extension, to silence all output
+        self.quiet = False
+        self.js_selector_pattern = None
+        self.js_selector_name_pattern = None
+        self.prune_safelist_pattern = None
+        self.frozen = False
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise ConfigError("config is frozen, use Config.replace to change " + name)
+        object.__setattr__(self, name, value)
 
     def getArgCount(self):
         """gets the count of how many arguments are present
@@ -62,17 +130,223 @@ class Config(object):
         for name in value.split(","):
             self.ignore.append(name)
 
+    def setPruneSafelist(self, value):
+        """sets what classes and ids should be kept when pruning unused css
+
+        Arguments:
+        value -- comma separated list of classes or ids, wildcards are allowed
+
+        Returns:
+        void
+
+        """
+        for name in value.split(","):
+            self.prune_safelist.append(name)
+
+    def setMergeCensus(self, value):
+        for value in value.split(","):
+            self.merge_census.append(value)
+
     def setCustomSelectors(self, value):
         for value in value.split(","):
             self.custom_selectors.append(value.lstrip("."))
+        self.resetPatterns()
 
     def addClassSelectors(self, value):
         for value in value.split(","):
             self.class_selectors.append(value)
+        self.resetPatterns()
 
     def addIdSelectors(self, value):
         for value in value.split(","):
             self.id_selectors.append(value)
+        self.resetPatterns()
+
+    def resetPatterns(self):
+        """throws away the compiled selector patterns after the selectors change
+
+        Returns:
+        void
+
+        """
+        self.js_selector_pattern = None
+        self.js_selector_name_pattern = None
+        self.prune_safelist_pattern = None
+
+    def getSelectorAlternation(self):
+        # longest first so the alternation does not depend on the order selectors were added in
+        selectors = set(self.custom_selectors) | set(self.id_selectors) | set(self.class_selectors)
+        valid_selectors = "|".join(sorted(selectors, key = lambda selector: (-len(selector), selector)))
+        return valid_selectors.replace('$', '\$')
+
+    def getJsSelectorPattern(self):
+        """gets the compiled pattern matching js selector calls, compiled once per config
+
+        Returns:
+        regex
+
+        """
+        if self.js_selector_pattern is None:
+            self.js_selector_pattern = re.compile(r'(' + self.getSelectorAlternation() + r')(\(([^<>]*?)\))', re.DOTALL)
+        return self.js_selector_pattern
+
+    def getJsSelectorNamePattern(self):
+        """gets the compiled pattern matching the start of a js selector call
+
+        Returns:
+        regex
+
+        """
+        if self.js_selector_name_pattern is None:
+            self.js_selector_name_pattern = re.compile(r'(' + self.getSelectorAlternation() + r')\(')
+        return self.js_selector_name_pattern
+
+    def getPruneSafelistPattern(self):
+        """gets a single compiled pattern for every glob in the prune safelist
+
+        Returns:
+        regex -- None if the safelist is empty
+
+        """
+        if self.prune_safelist_pattern is None and len(self.prune_safelist):
+            globs = ["(?:" + fnmatch.translate(name) + ")" for name in self.prune_safelist]
+            self.prune_safelist_pattern = re.compile("|".join(globs))
+        return self.prune_safelist_pattern
+
+    def validate(self):
+        """checks that the settings make sense together
+
+        Returns:
+        void
+
+        """
+        errors = []
+        if not self.framework in Config.frameworks:
+            errors.append("unknown framework " + str(self.framework) + " (use jquery or mootools)")
+        if self.stream_window <= 0:
+            errors.append("the stream window has to be bigger than 0")
+        if self.max_memory is not None and self.max_memory <= 0:
+            errors.append("the memory budget has to be bigger than 0")
+        if self.remap_threshold is not None and not 0 <= self.remap_threshold <= 1:
+            errors.append("the remap threshold has to be between 0 and 1")
+        if self.name_budget < 0:
+            errors.append("the name budget can not be negative")
+        if self.write_threads < 0:
+            errors.append("the number of write threads can not be negative")
+        if len(self.merge_census) and self.export_map is None:
+            errors.append("merging census files needs --export-map to write the map to")
+        if self.scope_names and (self.export_census is not None or len(self.merge_census) or self.import_map is not None):
+            errors.append("scoped names need the views scanned in the same run, not a census or an imported map")
+
+        if len(errors):
+            raise ConfigError("invalid config: " + "; ".join(errors))
+
+    def freeze(self):
+        """validates the config, builds every lookup set and pattern and stops it from changing
+
+        Returns:
+        Config -- itself
+
+        """
+        if self.frozen:
+            return self
+
+        self.validate()
+        self.ignore = frozenset(self.ignore)
+        self.class_selectors = frozenset(self.class_selectors)
+        self.id_selectors = frozenset(self.id_selectors)
+        self.custom_selectors = frozenset(self.custom_selectors)
+        self.prune_safelist = tuple(self.prune_safelist)
+        self.css = tuple(self.css)
+        self.views = tuple(self.views)
+        self.js = tuple(self.js)
+        self.css_extensions = tuple(self.css_extensions)
+        self.js_extensions = tuple(self.js_extensions)
+        self.ignore_paths = tuple(self.ignore_paths)
+        self.merge_census = tuple(self.merge_census)
+        self.getJsSelectorPattern()
+        self.getJsSelectorNamePattern()
+        self.getPruneSafelistPattern()
+        self.frozen = True
+        return self
+
+    def replace(self, **values):
+        """makes a frozen copy of the config with some settings changed
+
+        Arguments:
+        values -- settings to change, by attribute name
+
+        Returns:
+        Config
+
+        """
+        config = copy.copy(self)
+        object.__setattr__(config, "frozen", False)
+        for name, value in values.items():
+            if not name in self.__dict__ or name.endswith("_pattern") or name == "frozen":
+                raise ConfigError("unknown setting " + name)
+            setattr(config, name, value)
+            if name in ("class_selectors", "id_selectors", "custom_selectors", "prune_safelist"):
+                config.resetPatterns()
+        return config.freeze()
+
+    @staticmethod
+    def load(path):
+        """builds a frozen config from a json file
+
+        Arguments:
+        path -- path to the config file
+
+        Returns:
+        Config
+
+        """
+        config = Config()
+        config.loadFile(path)
+        return config.freeze()
+
+    def loadFile(self, path):
+        """applies the settings from a json config file
+
+        the keys are the command line options without the dashes, options that take a
+        list can be given a list or a comma separated string and switches take true or false
+
+        {"css": ["static/css"], "html": ["templates"], "framework": "jquery", "compress-js": true}
+
+        Arguments:
+        path -- path to the config file
+
+        Returns:
+        void
+
+        """
+        try:
+            with open(path) as file:
+                values = json.load(file)
+        except (IOError, ValueError), e:
+            raise ConfigError("could not read config file " + path + ": " + str(e))
+
+        if not isinstance(values, dict):
+            raise ConfigError("config file " + path + " has to hold a json object")
+
+        for name in sorted(values):
+            value = values[name]
+            key = str(name)
+            if key in Config.switch_options and key != "help":
+                if not isinstance(value, bool):
+                    raise ConfigError(key + " in " + path + " has to be true or false")
+                if value:
+                    self.setOption("--" + key, "")
+                continue
+
+            if not key in Config.value_options or key == "config":
+                raise ConfigError("unknown setting " + key + " in " + path)
+
+            if isinstance(value, list):
+                value = ",".join([unicode(item) for item in value])
+            elif isinstance(value, bool) or not isinstance(value, (basestring, int, long, float)):
+                raise ConfigError(key + " in " + path + " has to be a string, number or list")
+            self.setOption("--" + key, unicode(value).encode("utf-8"))
 
     def setCssFiles(self, value):
         for value in value.split(","):
@@ -94,6 +368,7 @@ class Config(object):
         elif self.framework == "mootools":
             self.id_selectors.append("$")
             self.custom_selectors.append("getElement")
+        self.resetPatterns()
 
     def processArgs(*self):
 
@@ -109,44 +384,119 @@ class Config(object):
 
         try:
             opts = self[1]
-        except:
-            Muncher.showUsage()
-
-        views_set = False
+        except IndexError:
+            raise ConfigError("no arguments given, see --help")
 
         for key, value in opts:
             if key == "--help":
                 Muncher.showUsage()
-            elif key == "--css":
-                self[0].setCssFiles(value)
-            elif key == "--views" or key == "--html":
-                views_set = True
-                self[0].setViewFiles(value)
-            elif key == "--js":
-                self[0].setJsFiles(value)
-            elif key == "--ignore":
-                self[0].setIgnore(value)
-            elif key == "--view-ext":
-                self[0].view_extension = value
-            elif key == "--framework":
-                self[0].setFramework(value)
-            elif key == "--selectors":
-                self[0].setCustomSelectors(value)
-            elif key == "--class-selectors":
-                self[0].addClassSelectors(value)
-            elif key == "--id-selectors":
-                self[0].addIdSelectors(value)
-            elif key == "--compress-html":
-                self[0].compress_html = True
-            elif key == "--show-savings":
-                self[0].show_savings = True
-            elif key == "--verbose":
-                self[0].verbose = True
-            elif key == "--js-manifest":
-                self[0].js_manifest = value
-            elif key == "--rewrite-constants":
-                self[0].rewrite_constants = True
-
-        # you have to at least have a view
-        if views_set is False:
-            Muncher.showUsage()
+            self[0].setOption(key, value)
+
+        # you have to at least have a view, unless you are only merging census files or serving jobs
+        if not len(self[0].views) and not len(self[0].merge_census) and self[0].daemon is None:
+            raise ConfigError("--html is required, see --help")
+
+        self[0].freeze()
+
+    def setOption(self, key, value):
+        """applies a single command line option
+
+        Arguments:
+        key -- option including the leading dashes
+        value -- value of the option, empty for switches
+
+        Returns:
+        void
+
+        """
+        if self.frozen:
+            raise ConfigError("config is frozen, use Config.replace to change " + key)
+
+        if not key[2:] in Config.value_options and not key[2:] in Config.switch_options:
+            raise ConfigError("unknown option " + key + ", see --help")
+
+        try:
+            self.applyOption(key, value)
+        except ValueError:
+            raise ConfigError(key + " does not take " + repr(value))
+
+    def applyOption(self, key, value):
+        if key == "--config":
+            self.loadFile(value)
+        elif key == "--css":
+            self.setCssFiles(value)
+        elif key == "--views" or key == "--html":
+            self.setViewFiles(value)
+        elif key == "--js":
+            self.setJsFiles(value)
+        elif key == "--ignore":
+            self.setIgnore(value)
+        elif key == "--view-ext":
+            self.view_extension = value
+        elif key == "--css-ext":
+            self.css_extensions = value.split(",")
+        elif key == "--js-ext":
+            self.js_extensions = value.split(",")
+        elif key == "--ignore-paths":
+            self.ignore_paths = value.split(",")
+        elif key == "--no-follow-symlinks":
+            self.follow_symlinks = False
+        elif key == "--framework":
+            self.setFramework(value)
+        elif key == "--selectors":
+            self.setCustomSelectors(value)
+        elif key == "--class-selectors":
+            self.addClassSelectors(value)
+        elif key == "--id-selectors":
+            self.addIdSelectors(value)
+        elif key == "--compress-html":
+            self.compress_html = True
+        elif key == "--compress-js":
+            self.compress_js = True
+        elif key == "--prune-css":
+            self.prune_css = True
+        elif key == "--merge-css":
+            self.merge_css = True
+        elif key == "--prune-safelist":
+            self.setPruneSafelist(value)
+        elif key == "--stream":
+            self.stream = True
+        elif key == "--stream-window":
+            self.stream_window = int(value)
+        elif key == "--memory-report":
+            self.memory_report = True
+        elif key == "--max-memory":
+            self.max_memory = int(float(value) * 1048576)
+        elif key == "--export-census":
+            self.export_census = value
+        elif key == "--merge-census":
+            self.setMergeCensus(value)
+        elif key == "--export-map":
+            self.export_map = value
+        elif key == "--import-map":
+            self.import_map = value
+        elif key == "--persist-map":
+            self.persist_map = value
+        elif key == "--remap-threshold":
+            self.remap_threshold = float(value)
+        elif key == "--gzip-names":
+            self.gzip_names = True
+        elif key == "--scope-names":
+            self.scope_names = True
+        elif key == "--name-budget":
+            self.name_budget = float(value)
+        elif key == "--write-threads":
+            self.write_threads = int(value)
+        elif key == "--changed-list":
+            self.changed_list = value
+        elif key == "--show-savings":
+            self.show_savings = True
+        elif key == "--verbose":
+            self.verbose = True
+        elif key == "--js-manifest":
+            self.js_manifest = value
+        elif key == "--rewrite-constants":
+            self.rewrite_constants = True
+        elif key == "--daemon":
+            self.daemon = value
+
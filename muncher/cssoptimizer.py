@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from cssparser import CssParser
+
+class CssOptimizer(object):
+    """merges the rules a munched stylesheet repeats without changing what it styles
+
+    three things are done to every list of rules, and to the rules inside every @media and
+    other group rule on their own:
+
+    a rule with the same selectors as an earlier one is folded into it, as long as no rule in
+    between sets a property the later rule sets (or a shorthand or longhand of one), since
+    its declarations then end up in front of those rules. nothing is moved across an
+    at-rule, a group rule or a block with comments or nested rules in it
+
+    a declaration that is repeated with the same value further down in its block is dropped.
+    the same property with a different value is kept since that is how fallbacks for older
+    browsers are written
+
+    rules next to each other with the same declarations are joined into a single selector
+    list. a browser drops a whole rule for a selector it does not know, so rules using a
+    pseudo class or element that is not in safe_pseudos are never joined with another
+    """
+    # pseudo classes and elements every browser has long understood
+    safe_pseudos = frozenset(["hover", "active", "focus", "visited", "link", "first-child", "last-child",
+        "only-child", "first-of-type", "last-of-type", "only-of-type", "nth-child", "nth-last-child",
+        "nth-of-type", "nth-last-of-type", "not", "empty", "checked", "disabled", "enabled", "root",
+        "target", "lang", "before", "after", "first-line", "first-letter"])
+
+    # properties that set or are set by a shorthand that does not share their first word
+    property_groups = {"line-height": "font", "top": "inset", "right": "inset", "bottom": "inset",
+        "left": "inset", "place": "align", "justify": "align", "row": "gap", "column": "gap", "columns": "gap"}
+
+    @staticmethod
+    def optimize(css):
+        """merges the rules of a stylesheet
+
+        Arguments:
+        css -- contents of a munched stylesheet or style block
+
+        Returns:
+        string
+
+        """
+        rules, trailing = CssParser.parse(css)
+        return CssParser.serialize(CssOptimizer.optimizeRules(rules), trailing)
+
+    @staticmethod
+    def optimizeRules(rules):
+        """merges a list of rules and the rules of every group rule in it
+
+        Arguments:
+        rules -- list of CssRule
+
+        Returns:
+        list
+
+        """
+        for rule in rules:
+            if rule.isGroup():
+                rule.children = CssOptimizer.optimizeRules(rule.children)
+
+        return CssOptimizer.mergeIdenticalBlocks(CssOptimizer.mergeRepeatedSelectors(rules))
+
+    @staticmethod
+    def getDeclarations(rule):
+        """splits the block of a regular rule into its declarations
+
+        Arguments:
+        rule -- CssRule
+
+        Returns:
+        list -- (property, value, text) tuples, None if the rule is not a plain block of declarations
+
+        """
+        body = rule.body
+        if body is None or rule.isAtRule() or "/*" in body or "{" in body:
+            return None
+
+        parts = []
+        depth = 0
+        start = 0
+        i = 0
+        length = len(body)
+        while i < length:
+            char = body[i]
+            if char in "\"'":
+                i = CssParser.skipString(body, i)
+                continue
+            if char in "([":
+                depth = depth + 1
+            elif char in ")]":
+                depth = depth - 1
+            elif char == ";" and depth == 0:
+                parts.append(body[start:i])
+                start = i + 1
+            i = i + 1
+        parts.append(body[start:])
+
+        declarations = []
+        for text in parts:
+            if not text.strip():
+                continue
+            if not ":" in text:
+                return None
+            name, value = text.split(":", 1)
+            declarations.append((name.strip().lower(), value.strip(), text))
+        return declarations
+
+    @staticmethod
+    def getGroup(name):
+        """gets the name every property that can override this one shares with it
+
+        Arguments:
+        name -- property name
+
+        Returns:
+        string
+
+        """
+        if name.startswith("--"):
+            return name
+
+        name = re.sub(r'^-[a-z]+-', '', name)
+        if name in CssOptimizer.property_groups:
+            return CssOptimizer.property_groups[name]
+
+        first = name.split("-")[0]
+        return CssOptimizer.property_groups.get(first, first)
+
+    @staticmethod
+    def getSelectorKey(rule):
+        """gets the selectors of a rule with their whitespace collapsed
+
+        Returns:
+        string -- None for selectors with comments in them
+
+        """
+        if "/*" in rule.prelude:
+            return None
+        return ",".join([" ".join(selector.split()) for selector in rule.getSelectors()])
+
+    @staticmethod
+    def isMergeableSelector(prelude):
+        """determines if a selector list can be joined with another without a browser dropping either
+
+        Arguments:
+        prelude -- selector text
+
+        Returns:
+        bool
+
+        """
+        if "/*" in prelude:
+            return False
+
+        flat = re.sub(r'\[[^\]]*\]|"[^"]*"|\'[^\']*\'', '', prelude)
+        for name in re.findall(r'::?([\w\-]+)', flat):
+            if not name.lower() in CssOptimizer.safe_pseudos:
+                return False
+        return True
+
+    @staticmethod
+    def dropRepeatedDeclarations(declarations):
+        """drops every declaration that is repeated with the same value further down
+
+        Arguments:
+        declarations -- list of (property, value, text) tuples
+
+        Returns:
+        list
+
+        """
+        last = {}
+        for i, declaration in enumerate(declarations):
+            last[declaration[0:2]] = i
+        return [declaration for i, declaration in enumerate(declarations) if last[declaration[0:2]] == i]
+
+    @staticmethod
+    def setDeclarations(rule, declarations):
+        """writes a changed list of declarations back into a rule, keeping the block's own whitespace
+
+        Arguments:
+        rule -- CssRule
+        declarations -- list of (property, value, text) tuples
+
+        Returns:
+        void
+
+        """
+        body = rule.body.rstrip()
+        end = rule.body[len(body):]
+        if body.endswith(";"):
+            end = ";" + end
+        rule.body = ";".join([declaration[2].rstrip() for declaration in declarations]) + end
+
+    @staticmethod
+    def mergeRepeatedSelectors(rules):
+        """folds rules into an earlier rule with the same selectors when nothing in between interferes
+
+        Arguments:
+        rules -- list of CssRule
+
+        Returns:
+        list
+
+        """
+        kept = []
+        blocks = []
+        changed = []
+        # position in kept of the last rule with each selector list that later rules can fold into
+        targets = {}
+        # position in kept of the last rule that set a property of each group
+        declared = {}
+        for rule in rules:
+            declarations = CssOptimizer.getDeclarations(rule)
+            groups = set()
+            if declarations is not None:
+                groups = set([CssOptimizer.getGroup(declaration[0]) for declaration in declarations])
+
+            if declarations is None or "all" in groups:
+                targets = {}
+                kept.append(rule)
+                blocks.append(None)
+                changed.append(False)
+                continue
+
+            key = CssOptimizer.getSelectorKey(rule)
+            position = targets.get(key) if key is not None else None
+            if position is not None and not [group for group in groups if declared.get(group, -1) > position]:
+                blocks[position].extend(declarations)
+                changed[position] = True
+                for group in groups:
+                    declared[group] = max(declared.get(group, -1), position)
+                continue
+
+            position = len(kept)
+            kept.append(rule)
+            blocks.append(declarations)
+            changed.append(False)
+            if key is not None:
+                targets[key] = position
+            for group in groups:
+                declared[group] = position
+
+        for i, rule in enumerate(kept):
+            if blocks[i] is None:
+                continue
+            declarations = CssOptimizer.dropRepeatedDeclarations(blocks[i])
+            if changed[i] or len(declarations) < len(blocks[i]):
+                CssOptimizer.setDeclarations(rule, declarations)
+        return kept
+
+    @staticmethod
+    def mergeIdenticalBlocks(rules):
+        """joins rules next to each other that have the same declarations
+
+        Arguments:
+        rules -- list of CssRule
+
+        Returns:
+        list
+
+        """
+        kept = []
+        previous = None
+        for rule in rules:
+            declarations = CssOptimizer.getDeclarations(rule)
+            current = None
+            # the order matters when a shorthand and its longhands are both set, so it has to match too
+            if declarations and CssOptimizer.isMergeableSelector(rule.prelude):
+                current = [declaration[0:2] for declaration in declarations]
+
+            if current is not None and previous == current:
+                last = kept[-1]
+                leading = last.prelude[:len(last.prelude) - len(last.prelude.lstrip())]
+                end = last.prelude[len(last.prelude.rstrip()):]
+                selectors = []
+                for selector in last.getSelectors() + rule.getSelectors():
+                    if not selector.strip() in selectors:
+                        selectors.append(selector.strip())
+                last.prelude = leading + ",".join(selectors) + end
+                continue
+
+            kept.append(rule)
+            previous = current
+        return kept
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+class CssRule(object):
+    """a single rule or at-rule from a stylesheet
+
+    prelude is everything in front of the opening brace (or semicolon for things like @import)
+    including any whitespace and comments, so joining every rule back together gives the
+    original stylesheet
+    """
+    def __init__(self, prelude, body = None, children = None, trailing = ""):
+        """constructor
+
+        Arguments:
+        prelude -- selector text or at-rule text
+        body -- text between the braces, None for statements like @import
+        children -- list of CssRule objects for group rules like @media
+        trailing -- text after the last child of a group rule
+
+        Returns:
+        void
+
+        """
+        self.prelude = prelude
+        self.body = body
+        self.children = children
+        self.trailing = trailing
+
+    def isAtRule(self):
+        return self.prelude.lstrip().startswith("@")
+
+    def isGroup(self):
+        return self.children is not None
+
+    def getSelectors(self):
+        """gets the list of selectors for a regular rule
+
+        Returns:
+        list
+
+        """
+        return CssParser.splitSelectors(self.prelude)
+
+    def toString(self):
+        if self.body is None and self.children is None:
+            return self.prelude + ";"
+
+        if self.children is not None:
+            return self.prelude + "{" + CssParser.serialize(self.children, self.trailing) + "}"
+
+        return self.prelude + "{" + self.body + "}"
+
+
+class CssParser(object):
+    """minimal stylesheet parser that is just smart enough to split css into rules"""
+
+    # at-rules whose blocks contain other rules rather than declarations
+    group_rules = ("@media", "@supports", "@document", "@-moz-document", "@layer", "@container")
+
+    @staticmethod
+    def skipString(css, i):
+        """finds the end of a quoted string starting at position i
+
+        Arguments:
+        css -- stylesheet source
+        i -- position of the opening quote
+
+        Returns:
+        int -- position just past the closing quote
+
+        """
+        quote = css[i]
+        length = len(css)
+        i = i + 1
+        while i < length:
+            if css[i] == "\\":
+                i = i + 2
+                continue
+            i = i + 1
+            if css[i - 1] == quote:
+                break
+        return min(i, length)
+
+    @staticmethod
+    def findBlockEnd(css, i):
+        """finds the closing brace matching the opening brace at position i
+
+        Arguments:
+        css -- stylesheet source
+        i -- position of the opening brace
+
+        Returns:
+        int -- position of the closing brace
+
+        """
+        depth = 0
+        length = len(css)
+        while i < length:
+            char = css[i]
+            if char in "\"'":
+                i = CssParser.skipString(css, i)
+                continue
+            if char == "/" and css[i + 1:i + 2] == "*":
+                end = css.find("*/", i + 2)
+                i = length if end == -1 else end + 2
+                continue
+            if char == "{":
+                depth = depth + 1
+            elif char == "}":
+                depth = depth - 1
+                if depth == 0:
+                    return i
+            i = i + 1
+        return length
+
+    @staticmethod
+    def parse(css):
+        """splits a stylesheet into a list of rules
+
+        Arguments:
+        css -- stylesheet source
+
+        Returns:
+        tuple -- (list of CssRule, trailing text that is not part of any rule)
+
+        """
+        rules = []
+        length = len(css)
+        start = 0
+        i = 0
+        while i < length:
+            char = css[i]
+            if char in "\"'":
+                i = CssParser.skipString(css, i)
+                continue
+
+            if char == "/" and css[i + 1:i + 2] == "*":
+                end = css.find("*/", i + 2)
+                i = length if end == -1 else end + 2
+                continue
+
+            if char == ";" and css[start:i].lstrip().startswith("@"):
+                rules.append(CssRule(css[start:i]))
+                i = i + 1
+                start = i
+                continue
+
+            if char == "{":
+                end = CssParser.findBlockEnd(css, i)
+                prelude = css[start:i]
+                body = css[i + 1:end]
+                if CssParser.isGroupPrelude(prelude):
+                    children, trailing = CssParser.parse(body)
+                    rules.append(CssRule(prelude, None, children, trailing))
+                else:
+                    rules.append(CssRule(prelude, body))
+                i = end + 1
+                start = i
+                continue
+
+            # stray closing brace, keep it as text
+            i = i + 1
+
+        return rules, css[start:]
+
+    @staticmethod
+    def isGroupPrelude(prelude):
+        name = prelude.strip()
+        # strip any leading comments
+        name = re.sub(r'\/\*.*?\*\/', '', name, flags = re.DOTALL).strip().lower()
+        for group in CssParser.group_rules:
+            if name.startswith(group):
+                return True
+        return False
+
+    @staticmethod
+    def serialize(rules, trailing = ""):
+        """joins a list of rules back into a stylesheet
+
+        Arguments:
+        rules -- list of CssRule
+        trailing -- text to put at the end
+
+        Returns:
+        string
+
+        """
+        parts = []
+        for rule in rules:
+            parts.append(rule.toString())
+        parts.append(trailing)
+        return "".join(parts)
+
+    @staticmethod
+    def splitSelectors(prelude):
+        """splits a selector list on the commas that are not inside parens, brackets or strings
+
+        Arguments:
+        prelude -- selector text
+
+        Returns:
+        list -- each selector with its surrounding whitespace left intact
+
+        """
+        selectors = []
+        depth = 0
+        start = 0
+        i = 0
+        length = len(prelude)
+        while i < length:
+            char = prelude[i]
+            if char in "\"'":
+                i = CssParser.skipString(prelude, i)
+                continue
+            if char in "([":
+                depth = depth + 1
+            elif char in ")]":
+                depth = depth - 1
+            elif char == "," and depth == 0:
+                selectors.append(prelude[start:i])
+                start = i + 1
+            i = i + 1
+        selectors.append(prelude[start:])
+        return selectors
+
+    @staticmethod
+    def getSelectorNames(selector):
+        """gets the classes and ids a selector requires, ignoring anything inside
+        parens (like :not(.foo)) or attribute brackets
+
+        Arguments:
+        selector -- a single selector
+
+        Returns:
+        list -- names with their leading . or #
+
+        """
+        selector = re.sub(r'\/\*.*?\*\/', '', selector, flags = re.DOTALL)
+        flat = ""
+        depth = 0
+        for char in selector:
+            if char in "([":
+                depth = depth + 1
+            elif char in ")]":
+                depth = depth - 1
+            elif depth == 0:
+                flat = flat + char
+        return re.findall(r'[\.#][\w\-]+', flat)
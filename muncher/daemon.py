@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, sys, json, time, socket, getopt, tempfile, traceback
+from collections import OrderedDict
+from config import Config, ConfigError
+from census import Census, CensusCache
+from htmlmuncher import HtmlMuncher
+from sizetracker import SizeTracker
+from muncher import Muncher
+
+class JobOutput(object):
+    """stands in for stdout while a job runs and sends every line it prints to the client"""
+    def __init__(self, daemon, id):
+        self.daemon = daemon
+        self.id = id
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.daemon.send({"id": self.id, "output": line})
+
+    def flush(self):
+        if self.buffer:
+            self.daemon.send({"id": self.id, "output": self.buffer})
+            self.buffer = ""
+
+class MunchDaemon(object):
+    """keeps the muncher loaded and runs jobs sent to it over a unix socket
+
+    every message is a line of json. a client sends any number of jobs and reads a line back
+    for everything the job prints and one with its result:
+
+    {"id": 1, "cwd": "/site", "args": ["--css", "css", "--html", "views"]}
+    {"id": 2, "args": ["--framework", "jquery"], "sources": [{"name": "a.css", "type": "css", "contents": "..."}]}
+    {"command": "stop"}
+
+    a job with args munches files like the command line does, a job with sources munches
+    the sources it was sent together and sends them back. configs are only parsed and
+    compiled once for the same arguments, and what the scan finds in every file is kept
+    so the next job only scans files that changed. jobs run one at a time
+    """
+    # options that would start another daemon inside a job, print the usage or belong to the client
+    rejected_options = ("daemon", "help", "socket", "batch", "stop")
+
+    def __init__(self, path, max_configs = 64):
+        """constructor
+
+        Arguments:
+        path -- path of the unix socket to listen on
+        max_configs -- compiled configs to keep
+
+        Returns:
+        void
+
+        """
+        self.path = path
+        self.max_configs = max_configs
+        self.configs = OrderedDict()
+        self.census_cache = CensusCache()
+        self.stream = None
+        self.running = False
+
+    def serve(self):
+        """listens until a client sends the stop command or the process is interrupted
+
+        Returns:
+        void
+
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listen(server)
+        print "munch daemon listening on " + self.path
+
+        self.running = True
+        try:
+            while self.running:
+                connection, address = server.accept()
+                try:
+                    self.handle(connection)
+                except socket.error:
+                    # the client went away, the next one is not affected
+                    pass
+                finally:
+                    connection.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def listen(self, server):
+        """binds the socket and starts listening so no one but the owner can ever connect to it
+
+        the socket is bound inside a new directory only the owner can open and moved into
+        place once it is private and listening, instead of being changed after it was already
+        reachable
+
+        Arguments:
+        server -- unbound unix socket
+
+        Returns:
+        void
+
+        """
+        directory = tempfile.mkdtemp(prefix = ".munch-", dir = os.path.dirname(os.path.abspath(self.path)))
+        bound = os.path.join(directory, "socket")
+        try:
+            server.bind(bound)
+            os.chmod(bound, 0600)
+            server.listen(16)
+            os.rename(bound, self.path)
+        finally:
+            if os.path.exists(bound):
+                os.unlink(bound)
+            os.rmdir(directory)
+
+    def handle(self, connection):
+        """runs every job a client sends until it closes its end
+
+        Arguments:
+        connection -- socket of the client
+
+        Returns:
+        void
+
+        """
+        self.stream = connection.makefile("wb", 0)
+        reader = connection.makefile("rb")
+        try:
+            for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    job = json.loads(line)
+                except ValueError:
+                    self.send({"id": None, "status": "error", "error": "job is not valid json"})
+                    continue
+
+                if not isinstance(job, dict):
+                    self.send({"id": None, "status": "error", "error": "job has to be a json object"})
+                elif job.get("command") == "stop":
+                    self.running = False
+                    self.send({"id": job.get("id"), "status": "stopping"})
+                else:
+                    self.send(self.runJob(job))
+        finally:
+            # the socket stays open for as long as a file made from it does
+            reader.close()
+            self.stream.close()
+            self.stream = None
+
+    def send(self, message):
+        self.stream.write(json.dumps(message) + "\n")
+
+    def getConfig(self, args, cwd, inline):
+        """parses and freezes the config for a job, only once for the same arguments
+
+        Arguments:
+        args -- command line options of the job
+        cwd -- directory relative paths in the options are relative to
+        inline -- whether the job sends sources instead of naming files
+
+        Returns:
+        Config
+
+        """
+        key = (cwd, inline, tuple(args))
+        if key in self.configs:
+            config = self.configs.pop(key)
+            self.configs[key] = config
+            return config
+
+        options = [name + "=" for name in Config.value_options] + Config.switch_options + ["socket=", "batch=", "stop"]
+        try:
+            opts, rest = getopt.getopt(args, "", options)
+        except getopt.GetoptError, e:
+            raise ConfigError(str(e))
+        if len(rest):
+            raise ConfigError("unexpected arguments " + " ".join(rest))
+        for name, value in opts:
+            if name[2:] in MunchDaemon.rejected_options:
+                raise ConfigError(name + " can not be used in a job")
+
+        config = Config()
+        if inline:
+            for key_name, value in opts:
+                config.setOption(key_name, value)
+            config.freeze()
+        else:
+            config.processArgs(opts)
+
+        # a config file can name a socket too
+        if config.daemon is not None:
+            raise ConfigError("a job can not start another daemon")
+
+        # a config file can change between jobs without the arguments changing
+        if not "--config" in [name for name, value in opts]:
+            self.configs[key] = config
+            while len(self.configs) > self.max_configs:
+                self.configs.popitem(last = False)
+        return config
+
+    def runJob(self, job):
+        """runs a single job with its output going to the client
+
+        Arguments:
+        job -- dictionary sent by the client
+
+        Returns:
+        dict -- result to send back
+
+        """
+        id = job.get("id")
+        started = time.time()
+        cwd = os.getcwd()
+        stdout = sys.stdout
+        sys.stdout = JobOutput(self, id)
+        try:
+            os.chdir(job.get("cwd") or cwd)
+            args = [Census.toStr(arg) for arg in job.get("args", [])]
+            if "sources" in job:
+                result = self.munchSources(self.getConfig(args, os.getcwd(), True), job["sources"])
+            else:
+                result = self.munchFiles(self.getConfig(args, os.getcwd(), False))
+            result["status"] = "ok"
+        except SystemExit, e:
+            # --help and a blown memory budget exit, the daemon keeps going
+            result = {"status": "error", "error": "exited with status " + str(e.code)}
+        except ConfigError, e:
+            result = {"status": "error", "error": str(e)}
+        except Exception, e:
+            result = {"status": "error", "error": str(e), "traceback": traceback.format_exc()}
+        finally:
+            sys.stdout.flush()
+            sys.stdout = stdout
+            os.chdir(cwd)
+
+        result["id"] = id
+        result["seconds"] = round(time.time() - started, 4)
+        return result
+
+    def munchFiles(self, config):
+        """munches files the way the command line does
+
+        Arguments:
+        config -- Config of the job
+
+        Returns:
+        dict
+
+        """
+        SizeTracker.reset()
+        muncher = Muncher(config)
+        muncher.census_cache = self.census_cache
+        muncher.run()
+
+        writer = muncher.getWriter()
+        return {"changed": writer.changed, "unchanged": len(writer.unchanged)}
+
+    def munchSources(self, config, sources):
+        """munches sources sent with the job together, as if they were the files of one site
+
+        Arguments:
+        config -- Config of the job
+        sources -- list of {"name", "type", "contents"} with type css, html or js
+
+        Returns:
+        dict
+
+        """
+        muncher = Muncher(config)
+        for source in sources:
+            contents = Census.toStr(source.get("contents", ""))
+            if source.get("type") == "css":
+                muncher.processCssContents(contents)
+            elif source.get("type") == "html":
+                muncher.processViewSource(contents)
+            elif source.get("type") == "js":
+                muncher.processJsContents(contents)
+            else:
+                raise ConfigError("source " + str(source.get("name")) + " has to be of type css, html or js")
+
+        muncher.processMaps()
+
+        munched = []
+        for source in sources:
+            contents = Census.toStr(source.get("contents", ""))
+            if source["type"] == "css":
+                contents = muncher.replaceInlineCss(contents)
+            elif source["type"] == "html" and config.compress_html:
+                contents = HtmlMuncher(muncher, True, ()).munch(contents)
+            elif source["type"] == "html":
+                contents = muncher.munchHtml(contents)
+            else:
+                contents = muncher.replaceJavascript(contents, config.compress_js)
+            munched.append({"name": source.get("name"), "type": source["type"], "contents": contents})
+
+        return {"sources": munched, "classes": len(muncher.class_map), "ids": len(muncher.id_map)}
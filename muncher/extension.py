@@ -0,0 +1,538 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, time, hashlib, threading
+from collections import OrderedDict
+import click
+from bs4 import BeautifulSoup
+from flask import request
+from util import Util
+from config import Config
+from templateloader import MunchLoader
+from offload import Offloader, MunchedBody, MunchMiddleware, munchPage
+from freezer import Freezer
+from munchbudget import MunchBudget
+import muncher
+
+def munch(view):
+    """route decorator that opts a single view into munching
+
+    @app.route('/view1')
+    @munch
+    def view1():
+        ...
+    """
+    view.munch = True
+    return view
+
+class Muncher(object):
+    """flask extension that minifies and munches the html of opted in routes
+
+    muncher = Muncher(app) or muncher.init_app(app)
+
+    routes opt in with the @munch decorator, whole blueprints with Muncher.enableBlueprint
+    or every route with MUNCHER_ALL_ROUTES. the selector configuration is built once in
+    init_app so a request only pays for the munching itself, and routes that are not opted
+    in are not touched at all
+    """
+    def __init__(self, app = None):
+        """constructor
+
+        Arguments:
+        app -- flask app, can be passed to init_app later instead
+
+        Returns:
+        void
+
+        """
+        self.app = None
+        self.config = None
+        self.blueprints = set()
+        self.critical_css_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.css_bundle_cache = OrderedDict()
+        self.offloader = None
+        self.budget = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """reads the app config, builds the base munch config and registers the after_request hook
+
+        Arguments:
+        app -- flask app
+
+        Returns:
+        void
+
+        """
+        app.config.setdefault('MUNCHER_ENABLED', True)
+        # json file with the same settings as the command line, the settings below are added to it
+        app.config.setdefault('MUNCHER_CONFIG_FILE', None)
+        # munch every html response instead of just the opted in routes
+        app.config.setdefault('MUNCHER_ALL_ROUTES', False)
+        app.config.setdefault('MUNCHER_FRAMEWORK', None)
+        app.config.setdefault('MUNCHER_IGNORE', [])
+        app.config.setdefault('MUNCHER_SELECTORS', [])
+        app.config.setdefault('MUNCHER_CLASS_SELECTORS', [])
+        app.config.setdefault('MUNCHER_ID_SELECTORS', [])
+        app.config.setdefault('MUNCHER_COMPRESS_JS', False)
+        # inline the css each view needs and load the full stylesheets asynchronously
+        app.config.setdefault('MUNCHER_CRITICAL_CSS', False)
+        # serve every linked stylesheet of a page as a single munched bundle
+        app.config.setdefault('MUNCHER_CSS_BUNDLE', False)
+        app.config.setdefault('MUNCHER_CACHE_SIZE', 256)
+        # megabytes the class/id maps shared by pages linking the same stylesheets may hold, 0 turns it off
+        app.config.setdefault('MUNCHER_MAP_CACHE_MEMORY', 64)
+        # give the classes and ids only a page's own inline blocks use the shortest names free in that page
+        app.config.setdefault('MUNCHER_SCOPE_NAMES', False)
+        app.config.setdefault('MUNCHER_BUNDLE_DIR', os.path.join(app.static_folder, 'bundles'))
+        app.config.setdefault('MUNCHER_BUNDLE_URL', app.static_url_path + '/bundles/')
+        # munch the template source once when jinja loads it instead of every response
+        app.config.setdefault('MUNCHER_TEMPLATES', False)
+        # stylesheets and scripts the template map is built from, every .css file in the
+        # static folder when no stylesheets are given
+        app.config.setdefault('MUNCHER_CSS', [])
+        app.config.setdefault('MUNCHER_JS', [])
+        # munch on a pool of 'thread' or 'process' workers instead of the request thread
+        app.config.setdefault('MUNCHER_EXECUTOR', None)
+        app.config.setdefault('MUNCHER_WORKERS', None)
+        # pages longer than this many characters or taking longer than this many seconds to munch
+        # are only minified, a time limit munches on a thread pool when there is no executor
+        app.config.setdefault('MUNCHER_MAX_PAGE_SIZE', None)
+        app.config.setdefault('MUNCHER_MAX_MUNCH_TIME', None)
+        # only minify while this many munch jobs are outstanding or the load average per core is this high
+        app.config.setdefault('MUNCHER_SHED_QUEUE', None)
+        app.config.setdefault('MUNCHER_SHED_LOAD', None)
+
+        self.app = app
+        self.config = self.buildConfig(app.config)
+
+        app.extensions = getattr(app, 'extensions', {})
+        app.extensions['muncher'] = self
+        app.after_request(self.afterRequest)
+
+        @app.cli.command('munch-freeze')
+        @click.option('--output', default = 'build', help = 'directory to write the site to')
+        def freezeCommand(output):
+            """exports every page and static file as munched, fingerprinted and precompressed files"""
+            click.echo(self.freeze(output).getReport())
+
+        self.budget = MunchBudget(self.config,
+            app.config['MUNCHER_MAX_PAGE_SIZE'],
+            app.config['MUNCHER_MAX_MUNCH_TIME'],
+            app.config['MUNCHER_SHED_QUEUE'],
+            app.config['MUNCHER_SHED_LOAD'])
+
+        # a munch can only be given up on while something else waits for it
+        if app.config['MUNCHER_EXECUTOR'] or app.config['MUNCHER_MAX_MUNCH_TIME']:
+            self.offloader = Offloader(app.config['MUNCHER_EXECUTOR'] or 'thread', app.config['MUNCHER_WORKERS'])
+
+        if app.config['MUNCHER_TEMPLATES']:
+            self.initTemplates(app)
+
+    def freeze(self, output):
+        """exports the app as a static site munched with a single map
+
+        Arguments:
+        output -- directory to write the site to
+
+        Returns:
+        Freezer
+
+        """
+        freezer = Freezer(self.app, self.config, output)
+        freezer.freeze()
+        return freezer
+
+    def getStaticCss(self, app):
+        """finds every original stylesheet in the static folder
+
+        Arguments:
+        app -- flask app
+
+        Returns:
+        list
+
+        """
+        paths = []
+        for root, dirs, files in os.walk(app.static_folder):
+            if os.path.abspath(root).startswith(os.path.abspath(app.config['MUNCHER_BUNDLE_DIR'])):
+                continue
+            for name in sorted(files):
+                if name.endswith('.css') and not name.endswith('.opt.css'):
+                    paths.append(os.path.join(root, name))
+        return paths
+
+    def initTemplates(self, app):
+        """builds a map from the static css, js and templates, writes the munched css and js
+        and makes jinja munch every template it loads with that map
+
+        Arguments:
+        app -- flask app
+
+        Returns:
+        void
+
+        """
+        # templates only get the inline blocks rewritten, critical css needs the final page
+        # and templates extend and include each other so none of them is a scope of its own
+        config = self.config.replace(
+            css = list(app.config['MUNCHER_CSS']) or self.getStaticCss(app),
+            js = list(app.config['MUNCHER_JS']),
+            views = [os.path.join(app.root_path, app.template_folder)],
+            critical_css = False,
+            scope_names = False)
+
+        self.template_muncher = muncher.Muncher(config)
+        self.template_muncher.scan()
+        # the templates are munched by the loader, not from the parsed copies
+        self.template_muncher.parsed_views.clear()
+        self.template_muncher.processMaps()
+        self.template_muncher.optimizeFiles(config.css, self.template_muncher.optimizeCss)
+        self.template_muncher.optimizeFiles(config.js, self.template_muncher.optimizeJavascript)
+
+        extensions = ('css', 'js') if len(config.js) else ('css',)
+        app.jinja_env.loader = MunchLoader(app.jinja_env.loader, self.template_muncher, extensions)
+
+    @staticmethod
+    def buildConfig(app_config):
+        """builds the config every munched request starts from
+
+        Arguments:
+        app_config -- flask config
+
+        Returns:
+        Config
+
+        """
+        config = Config()
+        if app_config['MUNCHER_CONFIG_FILE']:
+            config.loadFile(app_config['MUNCHER_CONFIG_FILE'])
+        config.quiet = True
+        if app_config['MUNCHER_FRAMEWORK']:
+            config.setFramework(app_config['MUNCHER_FRAMEWORK'])
+        for name in app_config['MUNCHER_IGNORE']:
+            config.setIgnore(name)
+        for name in app_config['MUNCHER_SELECTORS']:
+            config.setCustomSelectors(name)
+        for name in app_config['MUNCHER_CLASS_SELECTORS']:
+            config.addClassSelectors(name)
+        for name in app_config['MUNCHER_ID_SELECTORS']:
+            config.addIdSelectors(name)
+        config.compress_js = config.compress_js or app_config['MUNCHER_COMPRESS_JS']
+        config.critical_css = app_config['MUNCHER_CRITICAL_CSS']
+        config.map_cache_memory = int(app_config['MUNCHER_MAP_CACHE_MEMORY'] * 1048576) or None
+        config.scope_names = config.scope_names or app_config['MUNCHER_SCOPE_NAMES']
+
+        # validate and compile everything now so requests never have to
+        return config.freeze()
+
+    def enableBlueprint(self, blueprint):
+        """opts every route of a blueprint into munching
+
+        Arguments:
+        blueprint -- flask blueprint or its name
+
+        Returns:
+        void
+
+        """
+        self.blueprints.add(getattr(blueprint, 'name', blueprint))
+
+    def isEnabled(self):
+        """determines if the current request should be munched
+
+        Returns:
+        bool
+
+        """
+        if self.app.config['MUNCHER_ALL_ROUTES']:
+            return True
+
+        if request.blueprint is not None and request.blueprint in self.blueprints:
+            return True
+
+        view = self.app.view_functions.get(request.endpoint)
+        return getattr(view, 'munch', False)
+
+    def afterRequest(self, response):
+        """minifies and munches the html of opted in routes
+
+        Arguments:
+        response -- flask response
+
+        Returns:
+        response
+
+        """
+        if not self.app.config['MUNCHER_ENABLED'] or not self.isEnabled():
+            return response
+
+        # the templates were already munched when jinja loaded them
+        if self.app.config['MUNCHER_TEMPLATES']:
+            return response
+
+        if response.mimetype != 'text/html' or response.direct_passthrough:
+            return response
+
+        html = response.get_data(as_text = True)
+        path = request.path
+        template = self.getTemplateKey()
+        reason = self.budget.getSkipReason(html, self.offloader)
+        if reason is not None:
+            self.app.logger.warning('only minified %s (%s)', path, reason)
+            response.set_data(self.budget.fallback(path, html, reason))
+            return response
+
+        started = time.time()
+        if self.offloader is None:
+            response.set_data(self.munchPage(html))
+            self.budget.recordMunch(time.time() - started)
+            return response
+
+        # the page is sent once a worker has munched it, the request thread moves on
+        css_paths = self.getCssPaths(html)
+        job = self.offloader.submit(munchPage, self.config, html, css_paths)
+
+        def finish(result):
+            if result is None:
+                return None
+            self.budget.recordMunch(time.time() - started)
+            return self.finishPage(result[0], result[1], css_paths, template)
+
+        def fallback():
+            self.app.logger.warning('only minified %s (munching took over %ss)', path, self.budget.max_time)
+            return self.budget.fallback(path, html, 'time', time.time() - started)
+
+        def error(e):
+            # the headers are out, the page still has to be sent
+            self.app.logger.error('munching %s failed, only minified it', path, exc_info = True)
+            return self.budget.fallback(path, html, 'error', time.time() - started)
+
+        response.response = MunchedBody(job, finish, response.charset, self.budget.max_time, fallback, error)
+        response.headers.pop('Content-Length', None)
+        return response
+
+    def getMetrics(self):
+        """gets how many pages were munched and how many were only minified and why
+
+        Returns:
+        dict
+
+        """
+        return self.budget.getMetrics()
+
+    def getCssPaths(self, html):
+        """gets the files on disk of every stylesheet a page links
+
+        Arguments:
+        html -- rendered page
+
+        Returns:
+        list
+
+        """
+        return MunchMiddleware.getCssPaths(self.app.root_path, html)
+
+    def munchPage(self, html):
+        """minifies and munches a single page
+
+        the page is scanned and rewritten straight from the response, the only files written
+        are the munched stylesheets next to the originals as {name}.{tag}.opt.css
+
+        Arguments:
+        html -- rendered page
+
+        Returns:
+        string
+
+        """
+        css_paths = self.getCssPaths(html)
+        html, page_muncher = munchPage(self.config, html, css_paths)
+        return self.finishPage(html, page_muncher, css_paths, self.getTemplateKey())
+
+    @staticmethod
+    def getTemplateKey():
+        """gets what the critical css of the current request is cached under
+
+        every url of a route like /post/<id> renders the same template, so they share the
+        endpoint. a response without one, like a 404 page, is keyed on its path
+
+        Returns:
+        string
+
+        """
+        return request.endpoint or request.path
+
+    def finishPage(self, html, page_muncher, css_paths, template):
+        """bundles the stylesheets and inlines the critical css of a munched page
+
+        Arguments:
+        html -- munched page
+        page_muncher -- muncher that munched the page
+        css_paths -- files on disk of every stylesheet the page links
+        template -- see Muncher.getTemplateKey
+
+        Returns:
+        string
+
+        """
+        css_links = ','.join(css_paths)
+        bundle = self.app.config['MUNCHER_CSS_BUNDLE'] and len(css_paths)
+        critical = self.config.critical_css and len(css_paths)
+        if not bundle and not critical:
+            return html
+
+        soup = BeautifulSoup(html, features = 'html.parser')
+
+        # swap the stylesheets for a single bundle
+        if bundle:
+            self.linkCssBundle(soup, self.getCssBundle(page_muncher, css_links))
+
+        # inline the critical css and load the stylesheets asynchronously
+        if critical:
+            self.inlineCriticalCss(soup, self.getCriticalCss(page_muncher, template, css_links))
+
+        return unicode(soup)
+
+    @staticmethod
+    def getMapDigest(page_muncher):
+        """hash of the class/id map, munched css is only valid for the map it was made with
+
+        Arguments:
+        page_muncher -- muncher that has computed its maps
+
+        Returns:
+        string
+
+        """
+        names = sorted(page_muncher.class_map.items()) + sorted(page_muncher.id_map.items())
+        return hashlib.sha256(repr(names)).hexdigest()
+
+    def getCriticalCss(self, page_muncher, template, css_links):
+        """gets the munched css rules a template needs, cached per template and stylesheet set
+
+        Arguments:
+        page_muncher -- muncher that munched the page
+        template -- see Muncher.getTemplateKey
+        css_links -- comma separated stylesheet paths
+
+        Returns:
+        string
+
+        """
+        # the new names are part of the css, so the map is part of the key
+        key = (template, css_links, Muncher.getMapDigest(page_muncher))
+        return self.getCached(self.critical_css_cache, key, lambda: page_muncher.getCriticalCss(css_links.split(',')))
+
+    def getCached(self, cache, key, build):
+        """gets an entry of a cache, building it on a miss
+
+        once the cache holds MUNCHER_CACHE_SIZE entries the least recently used one is dropped.
+        two requests missing on the same key at once both build it, the result is the same
+
+        Arguments:
+        cache -- OrderedDict to look in
+        key -- key of the entry
+        build -- called without arguments on a miss
+
+        Returns:
+        mixed
+
+        """
+        with self.cache_lock:
+            if key in cache:
+                value = cache.pop(key)
+                cache[key] = value
+                return value
+
+        value = build()
+        with self.cache_lock:
+            cache[key] = value
+            while len(cache) > self.app.config['MUNCHER_CACHE_SIZE']:
+                cache.popitem(last = False)
+        return value
+
+    @staticmethod
+    def inlineCriticalCss(soup, css):
+        """puts the critical css in the head and loads the full stylesheets without blocking
+
+        Arguments:
+        soup -- BeautifulSoup of the page
+        css -- critical css
+
+        Returns:
+        void
+
+        """
+        if soup.head is None:
+            return
+        style = soup.new_tag('style')
+        style.string = css
+        soup.head.append(style)
+        for link in soup.find_all('link', rel = 'stylesheet'):
+            # fallback for browsers without javascript
+            noscript = soup.new_tag('noscript')
+            noscript.append(soup.new_tag('link', href = link.get('href'), rel = 'stylesheet'))
+            link.insert_after(noscript)
+            # preload and switch to a stylesheet once it arrives
+            link['rel'] = 'preload'
+            link['as'] = 'style'
+            link['onload'] = "this.onload=null;this.rel='stylesheet'"
+
+    def getCssBundle(self, page_muncher, css_links):
+        """gets the url of the munched bundle for a stylesheet set, building it the first time
+
+        Arguments:
+        page_muncher -- muncher that munched the page
+        css_links -- comma separated stylesheet paths
+
+        Returns:
+        string
+
+        """
+        def build():
+            bundle_dir = self.app.config['MUNCHER_BUNDLE_DIR']
+            name, contents = page_muncher.getCssBundle(css_links.split(','), bundle_dir)
+            bundle_path = os.path.join(bundle_dir, name)
+            # same contents means same name, so pages sharing a set share the file
+            if not Util.fileExists(bundle_path):
+                if not Util.isDir(bundle_dir):
+                    os.makedirs(bundle_dir)
+                Util.filePutContents(bundle_path, contents)
+            return self.app.config['MUNCHER_BUNDLE_URL'] + name
+
+        key = (css_links, Muncher.getMapDigest(page_muncher))
+        return self.getCached(self.css_bundle_cache, key, build)
+
+    @staticmethod
+    def linkCssBundle(soup, url):
+        """replaces the stylesheet links of a page with a single link to the bundle
+
+        Arguments:
+        soup -- BeautifulSoup of the page
+        url -- url of the bundle
+
+        Returns:
+        void
+
+        """
+        links = [link for link in soup.find_all('link', rel = 'stylesheet') if 'css' in link.get('href', '')]
+        if not len(links):
+            return
+        links[0].insert_before(soup.new_tag('link', href = url, rel = 'stylesheet', type = 'text/css'))
+        for link in links:
+            link.decompose()
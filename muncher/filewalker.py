@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, fnmatch
+
+# scandir hands back the entry type with the listing so no file needs its own stat,
+# it is built in from python 3.5 and a package before that
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+class FileWalker(object):
+    """walks a directory tree once and lists every file in it
+
+    anything matching an ignore glob is skipped along with everything under it, the globs
+    are matched against both the name and the path relative to the directory being walked
+    """
+    def __init__(self, ignore = (".*", "node_modules"), follow_symlinks = True):
+        """constructor
+
+        Arguments:
+        ignore -- globs of files and directories to skip (ie .git,node_modules,build)
+        follow_symlinks -- whether symlinked directories are walked
+
+        Returns:
+        void
+
+        """
+        self.ignore = list(ignore)
+        self.follow_symlinks = follow_symlinks
+
+    @staticmethod
+    def listDirectory(path):
+        """lists a single directory sorted by name
+
+        Arguments:
+        path -- directory to list
+
+        Returns:
+        list -- (name, is a directory, is a symlink) tuples
+
+        """
+        if scandir is not None:
+            return sorted([(entry.name, entry.is_dir(), entry.is_symlink()) for entry in scandir(path)])
+
+        entries = []
+        for name in os.listdir(path):
+            entry_path = os.path.join(path, name)
+            entries.append((name, os.path.isdir(entry_path), os.path.islink(entry_path)))
+        return sorted(entries)
+
+    @staticmethod
+    def hasExtension(name, extensions):
+        """determines if a file name ends in one of the extensions, any name if there are none
+
+        Arguments:
+        name -- file name
+        extensions -- list of extensions without the leading dot
+
+        Returns:
+        bool
+
+        """
+        if not len(extensions):
+            return True
+        for extension in extensions:
+            if name.endswith("." + extension.lstrip(".")):
+                return True
+        return False
+
+    def isIgnored(self, name, relative):
+        for pattern in self.ignore:
+            if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative, pattern):
+                return True
+        return False
+
+    def walk(self, path):
+        """lists every file under a directory
+
+        Arguments:
+        path -- directory to walk
+
+        Returns:
+        list -- (path to file, path relative to the directory) tuples
+
+        """
+        files = []
+        self.walkDirectory(path.rstrip("/"), "", os.path.realpath(path), files)
+        return files
+
+    def walkDirectory(self, path, relative, real_path, files):
+        for name, is_dir, is_link in FileWalker.listDirectory(path):
+            entry_path = path + "/" + name
+            entry_relative = relative + name
+            if self.isIgnored(name, entry_relative):
+                continue
+
+            if not is_dir:
+                # skip links that point nowhere
+                if not is_link or os.path.exists(entry_path):
+                    files.append((entry_path, entry_relative))
+                continue
+
+            entry_real_path = real_path + "/" + name
+            if is_link:
+                if not self.follow_symlinks:
+                    continue
+
+                # a link back up the tree would be walked forever
+                entry_real_path = os.path.realpath(entry_path)
+                if (real_path + "/").startswith(entry_real_path + "/"):
+                    continue
+
+            self.walkDirectory(entry_path, entry_relative + "/", entry_real_path, files)
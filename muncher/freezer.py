@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, re, gzip, hashlib, urlparse
+from collections import deque
+from cStringIO import StringIO
+from htmlmuncher import HtmlMuncher
+from filewalker import FileWalker
+from outputwriter import OutputWriter
+from templateloader import MunchLoader
+from muncher import Muncher
+
+# brotli is optional, files are only precompressed with gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class Freezer(object):
+    """exports the pages of a flask app and their assets as munched static files
+
+    the crawl starts from every GET route in app.url_map that takes no arguments and follows
+    every local link of the pages it finds. all pages, stylesheets and scripts are munched
+    with one map, so the output can be served by any web server or cdn without python.
+
+    every static file is written under its own name, munched if it is a stylesheet or a
+    script, and every one a page or stylesheet links is also written under a name with the
+    hash of its contents that the link is pointed at. text files get a .gz copy (and a .br
+    copy when brotli is installed) next to them for servers that serve precompressed files.
+    a page at /about is written to about/index.html
+    """
+    link_pattern = re.compile(r'(\b(?:href|src)\s*=\s*)([\'"])([^\'"]*)\2', re.IGNORECASE)
+    css_url_pattern = re.compile(r'(url\(\s*[\'"]?|@import\s+[\'"])([^\'")\s]+)', re.IGNORECASE)
+    compress_extensions = ("html", "css", "js", "json", "svg", "txt", "xml")
+
+    def __init__(self, app, config, output):
+        """constructor
+
+        Arguments:
+        app -- flask app
+        config -- Config the pages are munched with
+        output -- directory to write the site to
+
+        Returns:
+        void
+
+        """
+        self.app = app
+        self.config = config
+        self.output = output.rstrip("/")
+        self.static_url = app.static_url_path.rstrip("/") + "/"
+        self.static_files = {}
+        self.pages = {}
+        self.files = {}
+        self.assets = {}
+        self.skipped = []
+        self.muncher = None
+        self.writer = OutputWriter()
+
+    def getRoutes(self):
+        """gets the url of every route that can be requested without arguments
+
+        Returns:
+        list
+
+        """
+        urls = []
+        for rule in self.app.url_map.iter_rules():
+            if rule.endpoint == "static" or len(rule.arguments) or not "GET" in (rule.methods or ()):
+                continue
+            urls.append(rule.rule)
+        return sorted(urls)
+
+    def getStaticFiles(self):
+        """finds every file in the static folder by its url
+
+        Returns:
+        dict
+
+        """
+        bundle_dir = os.path.abspath(self.app.config.get("MUNCHER_BUNDLE_DIR") or self.app.static_folder + "/bundles")
+        walker = FileWalker(list(self.config.ignore_paths) + ["*.opt.css", "*.opt.js", "*.gz", "*.br"], self.config.follow_symlinks)
+        files = {}
+        for path, relative in walker.walk(self.app.static_folder):
+            if not os.path.abspath(path).startswith(bundle_dir + "/"):
+                files[self.static_url + relative] = path
+        return files
+
+    def getLocalUrl(self, base, link):
+        """resolves a link against the url it was found on
+
+        Arguments:
+        base -- url of the page or stylesheet
+        link -- href, src or url() value
+
+        Returns:
+        tuple -- (path, query and fragment), None for links off the site
+
+        """
+        parts = urlparse.urlsplit(urlparse.urljoin(base, link))
+        if parts.scheme or parts.netloc or not parts.path.startswith("/"):
+            return None
+
+        suffix = ""
+        if parts.query:
+            suffix += "?" + parts.query
+        if parts.fragment:
+            suffix += "#" + parts.fragment
+        return parts.path, suffix
+
+    def crawl(self):
+        """requests every route and every page linked from one, without munching
+
+        Returns:
+        void
+
+        """
+        enabled = self.app.config.get("MUNCHER_ENABLED")
+        loader = self.app.jinja_env.loader
+        self.app.config["MUNCHER_ENABLED"] = False
+        # templates munched by the loader would have the template map, not the global one
+        if isinstance(loader, MunchLoader):
+            self.app.jinja_env.loader = loader.loader
+            self.app.jinja_env.cache.clear()
+
+        try:
+            client = self.app.test_client()
+            queue = deque(self.getRoutes())
+            seen = set(queue)
+            while len(queue):
+                url = queue.popleft()
+                response = client.get(url)
+                if response.status_code != 200:
+                    self.skipped.append((url, response.status))
+                    continue
+
+                if response.mimetype != "text/html":
+                    self.files[url] = response.get_data()
+                    continue
+
+                html = response.get_data(as_text = True)
+                self.pages[url] = html
+                for match in self.link_pattern.finditer(html):
+                    local = self.getLocalUrl(url, match.group(3))
+                    if local is None or local[0] in seen or local[0].startswith(self.static_url):
+                        continue
+                    seen.add(local[0])
+                    queue.append(local[0])
+        finally:
+            self.app.config["MUNCHER_ENABLED"] = enabled
+            if isinstance(loader, MunchLoader):
+                self.app.jinja_env.loader = loader
+                self.app.jinja_env.cache.clear()
+
+    def buildMuncher(self):
+        """scans every page, stylesheet and script into a single map
+
+        Returns:
+        Muncher
+
+        """
+        css = sorted([path for url, path in self.static_files.items() if path.endswith(".css")])
+        js = sorted([path for url, path in self.static_files.items() if path.endswith(".js")])
+        config = self.config.replace(css = css, js = js, views = [], critical_css = False)
+
+        muncher = Muncher(config)
+        muncher.processCss()
+        muncher.processJs()
+        for url in sorted(self.pages):
+            muncher.processViewSource(self.pages[url])
+        muncher.processMaps()
+        return muncher
+
+    def freeze(self):
+        """crawls the app and writes the munched site
+
+        Returns:
+        void
+
+        """
+        self.static_files = self.getStaticFiles()
+        self.crawl()
+        self.muncher = self.buildMuncher()
+
+        for url in sorted(self.static_files):
+            self.writeFile(url, self.getAssetContents(url))
+
+        for url in sorted(self.pages):
+            html = HtmlMuncher(self.muncher, True, ()).munch(self.pages[url])
+            html = self.link_pattern.sub(lambda match: self.linkAsset(url, match), html)
+            self.writeFile(Freezer.getPagePath(url), html.encode("utf-8"))
+
+        for url in sorted(self.files):
+            if "." in url.rsplit("/", 1)[-1]:
+                self.writeFile(url, self.files[url])
+            else:
+                self.skipped.append((url, "not html and no extension to write it under"))
+
+        self.writer.close()
+
+    @staticmethod
+    def getPagePath(url):
+        if "." in url.rsplit("/", 1)[-1]:
+            return url
+        return url.rstrip("/") + "/index.html"
+
+    def getAssetContents(self, url):
+        """munches a stylesheet or script, any other file comes back as it is
+
+        Arguments:
+        url -- url of the static file
+
+        Returns:
+        string
+
+        """
+        path = self.static_files[url]
+        if url.endswith(".css"):
+            css = self.muncher.optimizeCss(path)
+            return self.css_url_pattern.sub(lambda match: match.group(1) + self.getAssetUrl(url, match.group(2)), css)
+        if url.endswith(".js"):
+            return self.muncher.optimizeJavascript(path)
+
+        file = open(path, "rb")
+        try:
+            return file.read()
+        finally:
+            file.close()
+
+    def getAssetUrl(self, base, link):
+        """gets the fingerprinted url of a linked static file, writing it the first time
+
+        Arguments:
+        base -- url the link was found on
+        link -- href, src or url() value
+
+        Returns:
+        string -- the link as it was when it is not a static file
+
+        """
+        local = self.getLocalUrl(base, link)
+        if local is None or not local[0] in self.static_files:
+            return link
+
+        url = local[0]
+        if not url in self.assets:
+            # a stylesheet importing itself further down keeps the plain name
+            self.assets[url] = url
+            contents = self.getAssetContents(url)
+            name, extension = os.path.splitext(url)
+            self.assets[url] = name + "." + hashlib.sha1(contents).hexdigest()[:12] + extension
+            self.writeFile(self.assets[url], contents)
+        return self.assets[url] + local[1]
+
+    def linkAsset(self, base, match):
+        return match.group(1) + match.group(2) + self.getAssetUrl(base, match.group(3)) + match.group(2)
+
+    def writeFile(self, url, contents):
+        """writes a file of the site along with its precompressed copies
+
+        Arguments:
+        url -- url the file is served at
+        contents -- contents of the file
+
+        Returns:
+        void
+
+        """
+        path = self.output + url
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.writer.write(path, contents)
+        if not url.rsplit(".", 1)[-1].lower() in self.compress_extensions:
+            return
+
+        # no timestamp in the header so the same contents always give the same file
+        buffer = StringIO()
+        f_out = gzip.GzipFile(os.path.basename(path), "wb", 9, buffer, 0)
+        f_out.write(contents)
+        f_out.close()
+        self.writer.write(path + ".gz", buffer.getvalue())
+
+        if brotli is not None:
+            self.writer.write(path + ".br", brotli.compress(contents))
+
+    def getReport(self):
+        """sums up what was written
+
+        Returns:
+        string
+
+        """
+        report = "froze " + str(len(self.pages)) + " pages and " + str(len(self.static_files)) + " static files to " + self.output
+        report += " (" + str(len(self.assets)) + " fingerprinted)"
+        report += "\nwrote " + str(len(self.writer.changed)) + " files, " + str(len(self.writer.unchanged)) + " were unchanged"
+        for url, reason in self.skipped:
+            report += "\nskipped " + url + ": " + reason
+        return report
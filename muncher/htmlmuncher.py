@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+class HtmlMuncher(object):
+    """single pass over an html document that minifies and munches it at the same time
+
+    the document is tokenized once into text, comments and tags. text has its whitespace
+    collapsed (except inside <pre> and <textarea>), comments are dropped (except conditional
+    comments), class and id attributes are renamed, inline <style> and <script> blocks are
+    munched and local stylesheet links are pointed at their .opt copies
+    """
+
+    token_pattern = re.compile(r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<![^>]*>|<(/?)([a-zA-Z][\w:\-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', re.DOTALL)
+    attribute_pattern = re.compile(r'([^\s=/>]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+))?')
+    whitespace_pattern = re.compile(r'\s+')
+
+    # elements whose contents are not html
+    raw_tags = ("script", "style", "textarea")
+    raw_end_patterns = dict([(tag, re.compile(r'</' + tag + r'\s*>', re.IGNORECASE)) for tag in raw_tags])
+
+    # elements whose whitespace matters
+    preformatted_tags = ("pre", "textarea")
+
+    # script types that actually hold javascript
+    js_types = ("", "text/javascript", "application/javascript", "module", "text/ecmascript")
+
+    def __init__(self, muncher, minify = True, link_extensions = ("css",), tag = None):
+        """constructor
+
+        Arguments:
+        muncher -- Muncher that has already computed its class and id maps
+        minify -- whether whitespace and comments should be stripped
+        link_extensions -- linked local files that should be pointed at their .opt copies
+        tag -- put in front of .opt in the links, for copies named after the map they were munched with
+
+        Returns:
+        void
+
+        """
+        self.muncher = muncher
+        self.minify = minify
+        self.link_extensions = link_extensions
+        self.tag = tag
+
+    @staticmethod
+    def getStylesheetLinks(html):
+        """gets the href of every stylesheet <link> in a document
+
+        Arguments:
+        html -- document to search
+
+        Returns:
+        list
+
+        """
+        links = []
+        for match in HtmlMuncher.token_pattern.finditer(html):
+            if match.group(2) is None or match.group(2).lower() != "link" or match.group(1):
+                continue
+            attributes = HtmlMuncher.getAttributes(match.group(3))
+            if "css" in attributes.get("href", ""):
+                links.append(attributes["href"])
+        return links
+
+    @staticmethod
+    def getAttributes(text):
+        """parses the attributes of a tag into a dictionary of unquoted values
+
+        Arguments:
+        text -- everything between the tag name and the closing >
+
+        Returns:
+        dict
+
+        """
+        attributes = {}
+        for name, value in HtmlMuncher.attribute_pattern.findall(text):
+            if value[:1] in ("'", '"'):
+                value = value[1:-1]
+            attributes[name.lower()] = value
+        return attributes
+
+    def munch(self, html):
+        """minifies and munches a document
+
+        Arguments:
+        html -- document to munch
+
+        Returns:
+        string
+
+        """
+        parts = []
+        preformatted = 0
+        position = 0
+        length = len(html)
+
+        while position < length:
+            match = self.token_pattern.search(html, position)
+            if match is None:
+                parts.append(self.munchText(html[position:], preformatted))
+                break
+
+            parts.append(self.munchText(html[position:match.start()], preformatted))
+            position = match.end()
+            token = match.group(0)
+
+            if match.group(2) is None:
+                parts.append(self.munchComment(token, preformatted))
+                continue
+
+            closing = match.group(1) == "/"
+            tag = match.group(2).lower()
+            if tag in self.preformatted_tags:
+                preformatted += -1 if closing else 1
+                preformatted = max(preformatted, 0)
+
+            if closing:
+                parts.append("</" + match.group(2) + ">")
+                continue
+
+            parts.append(self.munchTag(match.group(2), match.group(3)))
+
+            # raw text runs straight to the closing tag
+            if tag in self.raw_tags and not match.group(3).rstrip().endswith("/"):
+                end = self.raw_end_patterns[tag].search(html, position)
+                end_position = length if end is None else end.start()
+                contents = html[position:end_position]
+                attributes = HtmlMuncher.getAttributes(match.group(3))
+                if tag == "style":
+                    contents = self.munchStyle(contents)
+                elif tag == "script" and attributes.get("type", "").lower() in self.js_types and not "src" in attributes:
+                    contents = self.munchScript(contents)
+                parts.append(contents)
+                position = end_position
+
+        return "".join(parts)
+
+    def munchText(self, text, preformatted):
+        if not self.minify or preformatted or not text:
+            return text
+        return self.whitespace_pattern.sub(" ", text)
+
+    def munchComment(self, comment, preformatted):
+        # keep doctypes, cdata and conditional comments
+        if not self.minify or preformatted or not comment.startswith("<!--"):
+            return comment
+        if comment.startswith("<!--[if") or comment.startswith("<!--<![endif]"):
+            return comment
+        return ""
+
+    def munchStyle(self, css):
+        return self.muncher.replaceInlineCss(css)
+
+    def munchScript(self, js):
+        return self.muncher.replaceJavascript(js, self.minify and (self.muncher.config.compress_html or self.muncher.config.compress_js))
+
+    def munchTag(self, name, text):
+        """rewrites the attributes of a single opening tag
+
+        Arguments:
+        name -- tag name as written
+        text -- everything between the tag name and the closing >
+
+        Returns:
+        string
+
+        """
+        stylesheet = name.lower() == "link" and "stylesheet" in HtmlMuncher.getAttributes(text).get("rel", "").lower()
+
+        def rewrite(match):
+            attribute = match.group(1).lower()
+            value = match.group(2)
+            if value is None or not attribute in ("class", "id", "href"):
+                return match.group(0)
+
+            quote = value[:1] if value[:1] in ("'", '"') else ""
+            unquoted = value[1:-1] if quote else value
+            if attribute == "class":
+                unquoted = self.renameClasses(unquoted)
+            elif attribute == "id":
+                unquoted = self.muncher.id_map.get("#" + unquoted, "#" + unquoted)[1:]
+            elif stylesheet:
+                unquoted = self.linkOptimized(unquoted)
+            return match.group(1) + "=" + quote + unquoted + quote
+
+        if not self.minify:
+            return "<" + name + self.attribute_pattern.sub(rewrite, text) + ">"
+
+        attributes = [rewrite(match) for match in self.attribute_pattern.finditer(text)]
+        closing = "/" if text.rstrip().endswith("/") else ""
+        return "<" + " ".join([name] + attributes) + closing + ">"
+
+    def renameClasses(self, value):
+        """renames every class in a class attribute
+
+        only whole names are renamed, a.name or name.other are left alone like
+        Muncher.replaceHtmlClasses leaves them: it hands replaceClassBlock the name without
+        its dot, so the branch there for a.name never matches a class attribute
+
+        Arguments:
+        value -- unquoted attribute value
+
+        Returns:
+        string
+
+        """
+        class_map = self.muncher.class_map
+
+        def rename(match):
+            return class_map.get("." + match.group(0), "." + match.group(0))[1:]
+
+        value = re.sub(r'\S+', rename, value)
+        if self.minify:
+            return " ".join(value.split())
+        return value
+
+    def linkOptimized(self, href):
+        """points a local stylesheet link at its munched .opt copy
+
+        Arguments:
+        href -- link to the stylesheet
+
+        Returns:
+        string
+
+        """
+        if re.match(r'^([a-z]+:|//)', href, re.IGNORECASE):
+            return href
+        match = re.match(r'^(.*?)\.([a-z]+)((?:[\?#].*)?)$', href, re.IGNORECASE)
+        if match is None or match.group(2).lower() not in self.link_extensions or match.group(1).endswith(".opt"):
+            return href
+        opt = ".opt." if self.tag is None else "." + self.tag + ".opt."
+        return match.group(1) + opt + match.group(2) + match.group(3)
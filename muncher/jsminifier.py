@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+class JsMinifier(object):
+    """single pass javascript tokenizer that strips comments and collapses whitespace
+
+    strings, template literals and regular expression literals are copied through
+    untouched so things like "http://" or /\/*/ never get mistaken for comments
+    """
+
+    # a / following one of these characters starts a regex literal rather than a division
+    regex_prefixes = "(,=:[!&|?{};+-*%<>~^"
+
+    # same goes for a / following one of these keywords
+    regex_keywords = ("return", "typeof", "case", "do", "else", "in", "instanceof", "new", "void", "delete", "throw", "yield")
+
+    # a newline can be dropped after or before these characters without changing semicolon insertion
+    newline_after = "{[(,;:=&|?!<>*%^~."
+    newline_before = "}]),;:=&|?.<>*%^"
+
+    @staticmethod
+    def isWordChar(char):
+        """determines if a character can be part of an identifier, keyword or number
+
+        Arguments:
+        char -- single character
+
+        Returns:
+        bool
+
+        """
+        return char.isalnum() or char in "_$\\" or ord(char) > 126
+
+    @staticmethod
+    def lastWord(parts):
+        """gets the identifier or keyword at the end of what has been output so far
+
+        Arguments:
+        parts -- list of output chunks
+
+        Returns:
+        string
+
+        """
+        if not len(parts):
+            return ""
+
+        chunk = parts[-1]
+        i = len(chunk)
+        while i > 0 and JsMinifier.isWordChar(chunk[i - 1]):
+            i = i - 1
+
+        return chunk[i:]
+
+    @staticmethod
+    def regexAllowed(parts):
+        """determines if a / at the current position would start a regex literal
+
+        Arguments:
+        parts -- list of output chunks
+
+        Returns:
+        bool
+
+        """
+        if not len(parts):
+            return True
+
+        last = parts[-1][-1]
+        if last == "\n":
+            return True
+
+        if last in JsMinifier.regex_prefixes:
+            return True
+
+        return JsMinifier.lastWord(parts) in JsMinifier.regex_keywords
+
+    @staticmethod
+    def skipString(js, i):
+        """finds the end of a string or template literal starting at position i
+
+        Arguments:
+        js -- javascript source
+        i -- position of the opening quote
+
+        Returns:
+        int -- position just past the closing quote
+
+        """
+        quote = js[i]
+        length = len(js)
+        i = i + 1
+        while i < length:
+            char = js[i]
+            if char == "\\":
+                i = i + 2
+                continue
+            i = i + 1
+            if char == quote:
+                break
+
+            # a newline ends an unterminated single or double quoted string
+            if char == "\n" and quote != "`":
+                break
+
+        return min(i, length)
+
+    @staticmethod
+    def skipRegex(js, i):
+        """finds the end of a regex literal starting at position i
+
+        Arguments:
+        js -- javascript source
+        i -- position of the opening /
+
+        Returns:
+        int -- position just past the closing / and any flags
+
+        """
+        length = len(js)
+        in_class = False
+        i = i + 1
+        while i < length:
+            char = js[i]
+            if char == "\\":
+                i = i + 2
+                continue
+            if char == "\n":
+                return i
+            i = i + 1
+            if char == "[":
+                in_class = True
+            elif char == "]":
+                in_class = False
+            elif char == "/" and not in_class:
+                break
+
+        while i < length and JsMinifier.isWordChar(js[i]):
+            i = i + 1
+
+        return min(i, length)
+
+    @staticmethod
+    def minify(js):
+        """strips comments and collapses whitespace in a block of javascript
+
+        comments starting with /*! are kept since they usually hold license text
+
+        Arguments:
+        js -- javascript source
+
+        Returns:
+        string
+
+        """
+        parts = []
+        length = len(js)
+        pending_space = False
+        pending_newline = False
+        i = 0
+
+        while i < length:
+            char = js[i]
+
+            if char in " \t\r\n\f\v":
+                if char == "\n":
+                    pending_newline = True
+                pending_space = True
+                i = i + 1
+                continue
+
+            if char == "/" and i + 1 < length and js[i + 1] == "/":
+                end = js.find("\n", i)
+                i = length if end == -1 else end
+                continue
+
+            if char == "/" and i + 1 < length and js[i + 1] == "*":
+                end = js.find("*/", i + 2)
+                end = length if end == -1 else end + 2
+                comment = js[i:end]
+                i = end
+                if comment[2:3] == "!":
+                    JsMinifier.appendToken(parts, comment, pending_space, pending_newline)
+                    pending_space = pending_newline = False
+                    continue
+
+                # a multi line comment counts as a line break for semicolon insertion
+                if "\n" in comment:
+                    pending_newline = True
+                pending_space = True
+                continue
+
+            if char in "\"'`":
+                end = JsMinifier.skipString(js, i)
+            elif char == "/" and JsMinifier.regexAllowed(parts):
+                end = JsMinifier.skipRegex(js, i)
+            elif JsMinifier.isWordChar(char):
+                end = i + 1
+                while end < length and JsMinifier.isWordChar(js[end]):
+                    end = end + 1
+            else:
+                end = i + 1
+
+            JsMinifier.appendToken(parts, js[i:end], pending_space, pending_newline)
+            pending_space = pending_newline = False
+            i = end
+
+        return "".join(parts)
+
+    @staticmethod
+    def getLastStatementEnd(js):
+        """finds the end of the last statement or block in some javascript, for cutting it in two
+
+        only a ; or } outside of strings, template literals, regular expressions and comments
+        counts, tokenized the same way minify does it
+
+        Arguments:
+        js -- javascript source, starting outside of any string or comment
+
+        Returns:
+        int -- position just past the last ; or }, 0 if there is none
+
+        """
+        parts = []
+        length = len(js)
+        pending_space = False
+        pending_newline = False
+        last = 0
+        i = 0
+
+        while i < length:
+            char = js[i]
+
+            if char in " \t\r\n\f\v":
+                if char == "\n":
+                    pending_newline = True
+                pending_space = True
+                i = i + 1
+                continue
+
+            if char == "/" and i + 1 < length and js[i + 1] == "/":
+                end = js.find("\n", i)
+                i = length if end == -1 else end
+                continue
+
+            if char == "/" and i + 1 < length and js[i + 1] == "*":
+                end = js.find("*/", i + 2)
+                if end == -1:
+                    break
+                pending_space = True
+                i = end + 2
+                continue
+
+            if char in "\"'`":
+                end = JsMinifier.skipString(js, i)
+            elif char == "/" and JsMinifier.regexAllowed(parts):
+                end = JsMinifier.skipRegex(js, i)
+            elif JsMinifier.isWordChar(char):
+                end = i + 1
+                while end < length and JsMinifier.isWordChar(js[end]):
+                    end = end + 1
+            else:
+                end = i + 1
+                if char in ";}":
+                    last = end
+
+            JsMinifier.appendToken(parts, js[i:end], pending_space, pending_newline)
+            pending_space = pending_newline = False
+            i = end
+
+        return last
+
+    @staticmethod
+    def appendToken(parts, token, pending_space, pending_newline):
+        """adds a token to the output along with whatever whitespace has to be kept in front of it
+
+        Arguments:
+        parts -- list of output chunks
+        token -- the token to add
+        pending_space -- was there whitespace before this token
+        pending_newline -- did that whitespace contain a line break
+
+        Returns:
+        void
+
+        """
+        if len(parts) and pending_space:
+            last = parts[-1][-1]
+            first = token[0]
+            if pending_newline and last not in JsMinifier.newline_after and first not in JsMinifier.newline_before:
+                parts.append("\n")
+            elif JsMinifier.isWordChar(last) and JsMinifier.isWordChar(first):
+                parts.append(" ")
+
+            # keep things like "a + +b" and "a - -b" from turning into increments
+            elif last in "+-" and first == last:
+                parts.append(" ")
+
+            # "1 .toString()" can't become "1.toString()"
+            elif last.isdigit() and first == ".":
+                parts.append(" ")
+
+        parts.append(token)
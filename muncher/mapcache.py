@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, sys, hashlib, threading
+from collections import OrderedDict
+
+class StylesheetMap(object):
+    """class and id map computed from a set of stylesheets, shared by every page linking that set"""
+    def __init__(self, class_map, id_map, reserved, tag, files):
+        """constructor
+
+        Arguments:
+        class_map -- dictionary of classes to new names
+        id_map -- dictionary of ids to new names
+        reserved -- every original and new name a page local name must not take
+        tag -- the munched stylesheets were written as {name}.{tag}.opt.css
+        files -- paths of those munched copies, deleted when the map is evicted
+
+        Returns:
+        void
+
+        """
+        self.class_map = class_map
+        self.id_map = id_map
+        self.reserved = reserved
+        self.tag = tag
+        self.files = tuple(files)
+        self.size = StylesheetMap.getSize(class_map, id_map, reserved)
+
+    @staticmethod
+    def getSize(class_map, id_map, reserved):
+        """estimates the memory held by the maps in bytes
+
+        Arguments:
+        class_map -- dictionary of classes to new names
+        id_map -- dictionary of ids to new names
+        reserved -- set of names, its strings are already counted in the maps
+
+        Returns:
+        int
+
+        """
+        size = sys.getsizeof(class_map) + sys.getsizeof(id_map) + sys.getsizeof(reserved)
+        for name, value in class_map.items() + id_map.items():
+            size += sys.getsizeof(name) + sys.getsizeof(value)
+        return size
+
+class MapCache(object):
+    """bounded lru of the maps built for each set of stylesheets
+
+    the map a page gets only depends on the stylesheets it links, so pages sharing a set
+    share a map and the stylesheets are only scanned and munched when that set is first seen
+    or one of its files changes. entries are keyed on the paths and the sha1 of every file and
+    the least recently used ones are dropped once the maps hold more than max_bytes, along
+    with the munched copies of their stylesheets
+    """
+    # one cache per process, workers of a process pool each keep their own
+    instance = None
+    instance_lock = threading.Lock()
+
+    def __init__(self, max_bytes, max_entries = 256):
+        """constructor
+
+        Arguments:
+        max_bytes -- estimated memory the maps may hold
+        max_entries -- stylesheet sets to keep at most
+
+        Returns:
+        void
+
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.size = 0
+        self.digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def getInstance(max_bytes, max_entries = 256):
+        """gets the cache of this process, creating it the first time
+
+        Arguments:
+        max_bytes -- estimated memory the maps may hold
+        max_entries -- stylesheet sets to keep at most
+
+        Returns:
+        MapCache
+
+        """
+        with MapCache.instance_lock:
+            if MapCache.instance is None:
+                MapCache.instance = MapCache(max_bytes, max_entries)
+            MapCache.instance.max_bytes = max_bytes
+            MapCache.instance.max_entries = max_entries
+        return MapCache.instance
+
+    def getDigest(self, path):
+        """hashes a stylesheet, only reading it again when its size or mtime moved
+
+        Arguments:
+        path -- path to stylesheet
+
+        Returns:
+        string
+
+        """
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.digests.get(path)
+        if cached is not None and cached[0] == (stat.st_mtime, stat.st_size):
+            return cached[1]
+
+        digest = hashlib.sha1(open(path, "rb").read()).hexdigest()
+        with self.lock:
+            self.digests[path] = ((stat.st_mtime, stat.st_size), digest)
+        return digest
+
+    def getKey(self, config, css_paths):
+        """builds the key of a stylesheet set
+
+        Arguments:
+        config -- Config the map is built with
+        css_paths -- files on disk of every stylesheet a page links
+
+        Returns:
+        tuple
+
+        """
+        # ignored names never get a map entry so they change the map too
+        return (config.ignore, tuple([(path, self.getDigest(path)) for path in css_paths]))
+
+    def get(self, config, css_paths, build):
+        """gets the map of a stylesheet set, building it on a miss
+
+        two requests missing on the same set at once both build it, the result is the
+        same so whichever finishes last is kept
+
+        Arguments:
+        config -- Config the map is built with
+        css_paths -- files on disk of every stylesheet a page links
+        build -- called with config and css_paths on a miss, returns a StylesheetMap
+
+        Returns:
+        StylesheetMap
+
+        """
+        key = self.getKey(config, css_paths)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = build(config, css_paths)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).size
+            self.entries[key] = entry
+            self.size += entry.size
+            self.evict()
+        return entry
+
+    def evict(self):
+        evicted = []
+        while len(self.entries) and (self.size > self.max_bytes or len(self.entries) > self.max_entries):
+            key, entry = self.entries.popitem(last = False)
+            self.size -= entry.size
+            evicted.extend(entry.files)
+
+        if len(evicted):
+            kept = set()
+            for entry in self.entries.values():
+                kept.update(entry.files)
+            removeFiles(evicted, kept)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.digests.clear()
+            self.size = 0
+
+class StylesheetCopies(object):
+    """bounded lru of the munched stylesheet copies written for pages that do not share a map
+
+    without the map cache, or when pruning, every page can get copies of its own. only the
+    copies of the max_sets sets that were linked last are kept on disk, older ones are deleted
+    """
+    # one list per process, like MapCache
+    instance = None
+    instance_lock = threading.Lock()
+
+    def __init__(self, max_sets = 256):
+        """constructor
+
+        Arguments:
+        max_sets -- sets of copies to keep at most
+
+        Returns:
+        void
+
+        """
+        self.max_sets = max_sets
+        self.sets = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def getInstance():
+        with StylesheetCopies.instance_lock:
+            if StylesheetCopies.instance is None:
+                StylesheetCopies.instance = StylesheetCopies()
+        return StylesheetCopies.instance
+
+    def add(self, files):
+        """marks a set of copies as just linked, deleting the least recently linked sets over max_sets
+
+        Arguments:
+        files -- paths of the copies a page links
+
+        Returns:
+        void
+
+        """
+        key = tuple(files)
+        with self.lock:
+            self.sets.pop(key, None)
+            self.sets[key] = True
+
+            evicted = []
+            while len(self.sets) > self.max_sets:
+                evicted.extend(self.sets.popitem(last = False)[0])
+
+            if len(evicted):
+                kept = set()
+                for files in self.sets:
+                    kept.update(files)
+                removeFiles(evicted, kept)
+
+def removeFiles(paths, kept):
+    """deletes munched copies nothing links anymore
+
+    Arguments:
+    paths -- files to delete
+    kept -- files still in use, left alone
+
+    Returns:
+    void
+
+    """
+    for path in set(paths) - kept:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
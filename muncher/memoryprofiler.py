@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, resource, threading, thread
+from sizetracker import SizeTracker
+
+class MemoryBudgetExceeded(Exception):
+    """raised when a run goes over --max-memory"""
+    pass
+
+class MemoryProfiler(object):
+    """samples the resident memory of the process while the muncher runs
+
+    every phase of Muncher.run gets its own peak, and every file gets charged with how far
+    memory grew above where it was when the file was started, so the report shows which
+    phase and which files a large site pays for. with a budget, a sample over it stops the
+    run straight away instead of waiting for the oom killer
+    """
+    interval = 0.01
+
+    def __init__(self, budget = None):
+        """constructor
+
+        Arguments:
+        budget -- bytes the process may use, no limit if None
+
+        Returns:
+        void
+
+        """
+        self.budget = budget
+        self.phases = []
+        self.phase = None
+        self.file = None
+        self.file_start = 0
+        self.file_peak = 0
+        self.files = {}
+        self.exceeded = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sampler = None
+        self.main_thread = threading.current_thread()
+
+    @staticmethod
+    def getRss():
+        """gets the resident memory of this process in bytes
+
+        Returns:
+        int
+
+        """
+        try:
+            pages = int(open("/proc/self/statm").read().split()[1])
+            return pages * resource.getpagesize()
+        except (IOError, IndexError, ValueError):
+            # no /proc, fall back to the high water mark (kilobytes on linux, bytes on mac)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if os.uname()[0] == "Darwin" else peak * 1024
+
+    def start(self):
+        self.sampler = threading.Thread(target = self.sample)
+        self.sampler.daemon = True
+        self.sampler.start()
+
+    def stop(self):
+        self.endPhase()
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.record(MemoryProfiler.getRss())
+
+    def record(self, rss):
+        """keeps track of the peaks and stops the run if a sample is over the budget
+
+        Arguments:
+        rss -- resident memory in bytes
+
+        Returns:
+        void
+
+        """
+        with self.lock:
+            if self.phase is not None:
+                self.phase["peak"] = max(self.phase["peak"], rss)
+            if self.file is not None:
+                self.file_peak = max(self.file_peak, rss)
+
+            if self.budget is None or rss <= self.budget or self.exceeded is not None:
+                return
+
+            self.exceeded = self.getBudgetMessage(rss)
+
+        # raises KeyboardInterrupt in the main thread, Muncher.run turns it into the budget error
+        if threading.current_thread() is not self.main_thread:
+            thread.interrupt_main()
+
+    def getBudgetMessage(self, rss):
+        where = ""
+        if self.phase is not None:
+            where = " while " + self.phase["name"]
+        if self.file is not None:
+            where += " (" + self.file + ")"
+        return "memory budget of " + SizeTracker.getSize(self.budget) + " exceeded" + where + ": using " + SizeTracker.getSize(rss)
+
+    def check(self):
+        """samples memory right now and raises if the run is over budget
+
+        Returns:
+        void
+
+        """
+        self.record(MemoryProfiler.getRss())
+        if self.exceeded is not None:
+            raise MemoryBudgetExceeded(self.exceeded)
+
+    def startPhase(self, name):
+        """ends the current phase and starts measuring a new one
+
+        Arguments:
+        name -- phase of Muncher.run
+
+        Returns:
+        void
+
+        """
+        self.endPhase()
+        rss = MemoryProfiler.getRss()
+        with self.lock:
+            self.phase = {"name": name, "start": rss, "peak": rss, "end": rss}
+        self.check()
+
+    def endPhase(self):
+        self.trackFile(None)
+        rss = MemoryProfiler.getRss()
+        with self.lock:
+            if self.phase is None:
+                return
+            self.phase["end"] = rss
+            self.phase["peak"] = max(self.phase["peak"], rss)
+            self.phases.append(self.phase)
+            self.phase = None
+
+    def trackFile(self, path):
+        """charges memory growth to the file being worked on from now on
+
+        Arguments:
+        path -- file the muncher is about to read, None when it is done with files
+
+        Returns:
+        void
+
+        """
+        rss = MemoryProfiler.getRss()
+        with self.lock:
+            if self.file is not None:
+                growth = max(self.file_peak, rss) - self.file_start
+                self.files[self.file] = max(self.files.get(self.file, 0), growth)
+            self.file = path
+            self.file_start = rss
+            self.file_peak = rss
+
+        if path is not None:
+            self.check()
+
+    def getReport(self, top = 5):
+        """builds the per phase report
+
+        Arguments:
+        top -- how many of the files that grew memory the most to list
+
+        Returns:
+        string
+
+        """
+        report = "\n%-22s %12s %12s %12s" % ("phase", "start", "peak", "end")
+        for phase in self.phases:
+            report += "\n%-22s %12s %12s %12s" % (phase["name"], SizeTracker.getSize(phase["start"]), SizeTracker.getSize(phase["peak"]), SizeTracker.getSize(phase["end"]))
+
+        files = sorted([(growth, path) for path, growth in self.files.items() if growth > 0], reverse = True)[:top]
+        if len(files):
+            report += "\n\nfiles that grew memory the most:"
+            for growth, path in files:
+                report += "\n  +" + SizeTracker.getSize(growth) + "  " + path
+        return report
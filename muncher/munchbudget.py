@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, time, threading, multiprocessing
+from collections import deque
+from htmlmuncher import HtmlMuncher
+from muncher import Muncher
+
+class MunchBudget(object):
+    """limits on what munching a single response may cost, and what happened when one went over
+
+    a page bigger than max_size is never munched, and a munch still running after max_time
+    is given up on. while the munch workers have shed_queue jobs outstanding or the load
+    average per core is over shed_load nothing new is munched. in every one of those cases,
+    and when munching on a worker failed, the page is only minified, which is a single
+    linear pass, and the page is recorded
+    """
+    reasons = ("size", "time", "queue", "load", "error")
+
+    def __init__(self, config, max_size = None, max_time = None, shed_queue = None, shed_load = None, history = 100):
+        """constructor
+
+        Arguments:
+        config -- Config pages are munched with
+        max_size -- characters a page may have to be munched, no limit if None
+        max_time -- seconds a munch may take, no limit if None
+        shed_queue -- outstanding munch jobs at which munching is skipped, never if None
+        shed_load -- 1 minute load average per core at which munching is skipped, never if None
+        history -- how many of the latest pages that went over are kept
+
+        Returns:
+        void
+
+        """
+        self.max_size = max_size
+        self.max_time = max_time
+        self.shed_queue = shed_queue
+        self.shed_load = shed_load
+        self.cores = multiprocessing.cpu_count()
+        self.lock = threading.Lock()
+        self.munched = 0
+        self.munch_time = 0.0
+        self.slowest = None
+        self.skipped = dict([(reason, 0) for reason in MunchBudget.reasons])
+        self.offenders = deque(maxlen = history)
+
+        # maps stay empty so this only ever minifies, nothing is pruned or run through the js minifier
+        self.minifier = Muncher(config.replace(prune_css = False, compress_js = False, compress_html = False))
+
+    def getSkipReason(self, html, offloader = None):
+        """determines if a page should only be minified before munching even starts
+
+        Arguments:
+        html -- page about to be munched
+        offloader -- Offloader the page would be munched on
+
+        Returns:
+        string -- size, queue or load, None to munch the page
+
+        """
+        if self.max_size is not None and len(html) > self.max_size:
+            return "size"
+
+        if self.shed_queue is not None and offloader is not None and offloader.getPending() >= self.shed_queue:
+            return "queue"
+
+        if self.shed_load is not None and hasattr(os, "getloadavg"):
+            if os.getloadavg()[0] / self.cores >= self.shed_load:
+                return "load"
+
+        return None
+
+    def fallback(self, path, html, reason, seconds = None):
+        """minifies a page that is not going to be munched and records why
+
+        Arguments:
+        path -- path of the page
+        html -- page
+        reason -- one of MunchBudget.reasons
+        seconds -- how long was spent munching before giving up
+
+        Returns:
+        string
+
+        """
+        with self.lock:
+            self.skipped[reason] += 1
+            self.offenders.append({"path": path, "reason": reason, "size": len(html), "seconds": seconds, "time": time.time()})
+        return HtmlMuncher(self.minifier, True, ()).munch(html)
+
+    def recordMunch(self, seconds):
+        """records how long a page that was munched took
+
+        Arguments:
+        seconds -- time spent munching
+
+        Returns:
+        void
+
+        """
+        with self.lock:
+            self.munched += 1
+            self.munch_time += seconds
+            if self.slowest is None or seconds > self.slowest:
+                self.slowest = seconds
+
+    def getMetrics(self):
+        """gets a snapshot of everything recorded so far
+
+        Returns:
+        dict
+
+        """
+        with self.lock:
+            return {
+                "munched": self.munched,
+                "average_seconds": self.munch_time / self.munched if self.munched else None,
+                "slowest_seconds": self.slowest,
+                "skipped": dict(self.skipped),
+                "offenders": list(self.offenders)
+            }
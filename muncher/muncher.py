@@ -13,11 +13,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sys, re, glob, os
+import sys, re, os, hashlib, gc
 from operator import itemgetter
 from util import Util
 from varfactory import VarFactory
+from namestrategy import NameStrategy
 from sizetracker import SizeTracker
+from jsminifier import JsMinifier
+from cssparser import CssParser
+from cssoptimizer import CssOptimizer
+from streamer import Streamer
+from census import Census, CensusCache
+from htmlmuncher import HtmlMuncher
+from memoryprofiler import MemoryProfiler, MemoryBudgetExceeded
+from filewalker import FileWalker
+from outputwriter import OutputWriter
+from viewparser import ViewParser, ViewSegment
 
 class Muncher(object):
     def __init__(self, config):
@@ -31,7 +42,32 @@ class Muncher(object):
         self.class_counter = {}
         self.id_map = {}
         self.class_map = {}
-        self.config = config
+        self.used_ids = set()
+        self.used_classes = set()
+        self.pruned_bytes = 0
+        self.merged_bytes = 0
+        self.profiler = None
+        self.walker = None
+        self.walked = {}
+        self.writer = None
+        self.tracked = []
+        self.parsed_views = {}
+        self.manifest_entries = None
+        # set by a long running process to skip scanning files that did not change
+        self.census_cache = None
+        # with --scope-names, what each view adds on its own and the names only one view uses
+        self.view_census = {}
+        self.scoped_names = set()
+        self.view_maps = {}
+        # the config is validated and compiled once, then shared as is
+        self.config = config.freeze()
+
+    def __getstate__(self):
+        """the maps and census can be sent to another process, the writer and profiler stay behind"""
+        state = self.__dict__.copy()
+        state["writer"] = None
+        state["profiler"] = None
+        return state
 
     @staticmethod
     def showUsage():
@@ -51,10 +87,60 @@ class Muncher(object):
         print ""
         print "--view-ext {extension}       sets the extension to look for in the view directory (defaults to html)"
         print ""
+        print "--css-ext {extensions}       comma separated extensions to munch in css directories (defaults to every file)"
+        print ""
+        print "--js-ext {extensions}        comma separated extensions to munch in js directories (defaults to every file)"
+        print ""
+        print "--ignore-paths {globs}       comma separated files and directories to skip when walking directories"
+        print "                             (defaults to .*,node_modules which skips .git, .svn and other dotfiles)"
+        print ""
+        print "--no-follow-symlinks         does not walk into symlinked directories"
+        print ""
         print "--ignore {classes,ids}       comma separated list of classes or ids to ignore when rewriting css (ie .sick_class,#sweet_id)"
         print ""
-        print "--compress-html              strips new line characters to compress html files specified with --html"
-        print "                             be careful when using this becuase it has not been thoroughly tested"
+        print "--compress-html              collapses whitespace and strips comments in html files specified with --html"
+        print "                             (keeping <pre>, <textarea> and conditional comments) while munching them"
+        print ""
+        print "--compress-js                strips comments and extra whitespace from js files and inline script blocks"
+        print ""
+        print "--prune-css                  drops css rules whose selectors use classes or ids that never appear"
+        print "                             in a view's class/id attributes or in a js selector"
+        print ""
+        print "--prune-safelist {names}     comma separated classes or ids that should never be pruned, wildcards"
+        print "                             are allowed (ie .js-*,#modal_*)"
+        print ""
+        print "--merge-css                  merges the rules munching leaves repeated in css files and style blocks:"
+        print "                             joins rules next to each other with the same declarations, folds a rule"
+        print "                             into an earlier one with the same selectors when the cascade allows it"
+        print "                             and drops declarations repeated further down the same block"
+        print ""
+        print "--stream                     reads css and js files through mmap and rewrites them in bounded windows"
+        print "                             so memory use does not grow with file size (for huge generated bundles)"
+        print "                             --prune-css, --merge-css and --compress-js are skipped for streamed files"
+        print ""
+        print "--stream-window {bytes}      size of each window when streaming (defaults to 1048576)"
+        print ""
+        print "--memory-report              shows the peak memory of every phase and the files that grew it the most"
+        print ""
+        print "--max-memory {megabytes}     stops the run as soon as it uses more memory than this, and streams every"
+        print "                             css and js file bigger than --stream-window to stay under it"
+        print "                             (--prune-css, --merge-css and --compress-js are skipped for those files)"
+        print ""
+        print "--export-census {file}       scans the files and writes the classes and ids found to a file instead of"
+        print "                             munching, so several machines can each scan part of a site"
+        print ""
+        print "--merge-census {files}       comma separated census files to merge into a single map (use with --export-map)"
+        print ""
+        print "--export-map {file}          writes the class and id map to a file"
+        print ""
+        print "--import-map {file}          munches the files using a map written by --export-map instead of scanning"
+        print ""
+        print "--persist-map {file}         keeps the class and id map in a file between runs so existing names never"
+        print "                             change and only new classes and ids get new names"
+        print ""
+        print "--remap-threshold {ratio}    with --persist-map, reassigns every name from scratch once the share of"
+        print "                             classes and ids added or removed since the last full assignment goes over"
+        print "                             this ratio (ie 0.25)"
         print ""
         print "--framework                  name of js framework to use for selectors (currently only jquery or mootools)"
         print ""
@@ -74,8 +160,31 @@ class Muncher(object):
         print ""
         print "--show-savings               will output how many bytes were saved by munching"
         print ""
+        print "--gzip-names                 assigns names by how small the munched files are once gzipped instead of"
+        print "                             by raw savings, trying other alphabets and orders on a sample of the site"
+        print "                             and showing how each one compares with the default"
+        print ""
+        print "--name-budget {seconds}      time --gzip-names may spend trying strategies (defaults to 10)"
+        print ""
+        print "--scope-names                gives classes and ids that only a single view uses in its inline css and"
+        print "                             js blocks the shortest names free in that view, instead of names drawn"
+        print "                             after every name of the site (for views that are rendered as whole pages"
+        print "                             on their own, not ones that include each other)"
+        print ""
+        print "--write-threads {count}      writes the munched files on this many threads (for network filesystems)"
+        print ""
+        print "--changed-list {file}        writes the path of every munched file whose contents changed to a file,"
+        print "                             one per line (files that come out the same are never rewritten)"
+        print ""
         print "--verbose                    output more information while the script runs"
         print ""
+        print "--daemon {socket}            stays running and munches jobs sent to a unix socket, configs and what"
+        print "                             was found in files that did not change are kept between jobs"
+        print "                             (send jobs with python -m muncher.client --socket {socket} -- {options})"
+        print ""
+        print "--config {file}              reads settings from a json file, the keys are these options without the"
+        print "                             dashes (ie {\"css\": [\"css\"], \"html\": [\"views\"], \"compress-js\": true})"
+        print ""
         print "--help                       shows this menu\n"
         sys.exit(2)
 
@@ -86,45 +195,198 @@ class Muncher(object):
         void
 
         """
-        self.output("searching for classes and ids...", False)
+        if self.config.daemon is not None:
+            # imported here because the daemon builds configs and config imports this module
+            from daemon import MunchDaemon
+            MunchDaemon(self.config.daemon).serve()
+            return
+
+        if not self.config.memory_report and self.config.max_memory is None:
+            self.runPhases()
+            return
 
+        self.profiler = MemoryProfiler(self.config.max_memory)
+        self.profiler.start()
+        try:
+            self.runPhases()
+        except KeyboardInterrupt:
+            # the sampler interrupts the run when it goes over the budget
+            if self.profiler.exceeded is None:
+                raise
+            self.exitOverBudget(self.profiler.exceeded)
+        except MemoryBudgetExceeded, e:
+            self.exitOverBudget(str(e))
+        finally:
+            self.profiler.stop()
+
+        if self.config.memory_report:
+            self.output(self.profiler.getReport(), False)
+
+    def exitOverBudget(self, message):
+        self.profiler.stop()
+        if self.config.memory_report:
+            self.output(self.profiler.getReport(), False)
+        print "error: " + message
+        sys.exit(1)
+
+    def runPhases(self):
+        """runs every phase of the optimizer
+
+        Returns:
+        void
+
+        """
         if self.config.js_manifest is not None:
             self.outputJsWarnings()
 
-        self.processCss()
-        self.processViews()
-
-        if self.config.js_manifest is None:
-            self.processJs()
+        if self.config.stream:
+            self.outputStreamWarnings()
+
+        if len(self.config.merge_census):
+            self.output("merging census files...", False)
+            self.startPhase("merging census")
+            Census.load(self, self.config.merge_census)
+        elif self.config.import_map is not None:
+            self.output("loading class and id map from " + self.config.import_map + "...", False)
+            self.startPhase("loading map")
+            Census.loadMap(self, self.config.import_map)
+
+            # the manifest constants still have to be known to rewrite the manifest
+            if self.config.js_manifest is not None:
+                self.processJsManifest()
         else:
-            self.processJsManifest()
+            self.output("searching for classes and ids...", False)
+            self.startPhase("searching")
+            self.scan()
+
+        if self.config.export_census is not None:
+            self.output("writing census to " + self.config.export_census + "...", False)
+            Census.save(self, self.config.export_census)
+            self.output("done", False)
+            return
+
+        if self.config.import_map is None:
+            self.output("mapping classes and ids to new names...", False)
+            self.startPhase("mapping")
+            # maps all classes and ids found to shorter names
+            self.processMaps()
 
-        self.output("mapping classes and ids to new names...", False)
-        # maps all classes and ids found to shorter names
-        self.processMaps()
+        if self.config.export_map is not None:
+            self.output("writing class and id map to " + self.config.export_map + "...", False)
+            Census.saveMap(self, self.config.export_map)
+
+        # merging only computes the map, each shard munches its own files with it
+        if len(self.config.merge_census):
+            self.output("done", False)
+            return
 
         # optimize everything
         self.output("munching css files...", False)
-        self.optimizeFiles(self.config.css, self.optimizeCss)
+        self.startPhase("munching css")
+        self.optimizeFiles(self.config.css, self.optimizeCss, self.config.css_extensions)
 
         self.output("munching html files...", False)
-        self.optimizeFiles(self.config.views, self.optimizeHtml, self.config.view_extension, self.config.compress_html)
+        self.startPhase("munching html")
+        self.optimizeFiles(self.config.views, self.optimizeHtml, [self.config.view_extension])
 
         self.output("munching js files...", False)
+        self.startPhase("munching js")
 
         if self.config.js_manifest is None:
-            self.optimizeFiles(self.config.js, self.optimizeJavascript)
+            self.optimizeFiles(self.config.js, self.optimizeJavascript, self.config.js_extensions)
         else:
             self.optimizeJsManifest()
 
         self.output("done", False)
 
+        writer = self.getWriter()
+        writer.close()
+        self.output("wrote " + str(len(writer.changed)) + " files, " + str(len(writer.unchanged)) + " were unchanged", False)
+        if self.config.changed_list is not None:
+            Util.filePutContents(self.config.changed_list, "".join([path + "\n" for path in writer.changed]))
+
+        if self.config.prune_css:
+            self.output("pruned " + SizeTracker.getSize(self.pruned_bytes) + " of unused css", False)
+
+        if self.config.merge_css:
+            self.output("merging css rules saved " + SizeTracker.getSize(self.merged_bytes), False)
+
         if self.config.show_savings:
             self.output(SizeTracker.savings(), False)
 
+    def scan(self):
+        """searches every css, view and js file for classes and ids to replace
+
+        Returns:
+        void
+
+        """
+        self.processCss()
+        self.processViews()
+
+        if self.config.js_manifest is None:
+            self.processJs()
+        else:
+            self.processJsManifest()
+
     def outputJsWarnings(self):
         pass
 
+    def outputStreamWarnings(self):
+        if self.config.prune_css:
+            self.output("warning: --prune-css is skipped for streamed css files", False)
+
+        if self.config.compress_js:
+            self.output("warning: --compress-js is skipped for streamed js files", False)
+
+        if self.config.merge_css:
+            self.output("warning: --merge-css is skipped for streamed css files", False)
+
+    def startPhase(self, name):
+        """starts measuring the memory of a phase of the run when profiling
+
+        Arguments:
+        name -- phase that is starting
+
+        Returns:
+        void
+
+        """
+        if self.profiler is None:
+            return
+
+        # nothing from the last phase is needed anymore, give it back before measuring
+        if self.config.max_memory is not None:
+            gc.collect()
+        self.profiler.startPhase(name)
+
+    def trackMemory(self, path):
+        """charges memory growth to a file when profiling and stops the run if it is over budget
+
+        Arguments:
+        path -- file that is about to be read
+
+        Returns:
+        void
+
+        """
+        if self.profiler is not None:
+            self.profiler.trackFile(path)
+
+    def shouldStream(self, path):
+        """determines if a css or js file should be read in windows instead of all at once
+
+        Arguments:
+        path -- path to file
+
+        Returns:
+        bool
+
+        """
+        if self.config.stream:
+            return True
+        return self.config.max_memory is not None and os.path.getsize(path) > self.config.stream_window
+
     def output(self, text, verbose_only = True):
         """outputs text during the script run
 
@@ -136,284 +398,883 @@ class Muncher(object):
         void
 
         """
-        if verbose_only and not self.config.verbose:
+        if self.config.quiet or (verbose_only and not self.config.verbose):
             return
 
         print text
 
-    def processCssDirectory(self, file):
-        """processes a directory of css files
+    def processCss(self):
+        """gets all css files from config and processes them to see what to replace
+
+        Returns:
+        void
+
+        """
+        for file, new_path in self.getFiles(self.config.css, self.config.css_extensions):
+            self.scanFile("css", file, self.processCssFile)
+
+    def processViews(self):
+        """processes all view files
+
+        Returns:
+        void
+
+        """
+        for file, new_path in self.getFiles(self.config.views):
+            self.scanFile("view", file, self.processView)
+
+    def processJs(self):
+        """gets all js files from config and processes them to see what to replace
+
+        Returns:
+        void
+
+        """
+        for file, new_path in self.getFiles(self.config.js, self.config.js_extensions):
+            self.scanFile("js", file, self.processJsFile)
+
+    def scanFile(self, kind, path, scan):
+        """scans a single file, or adds what it held the last time when it has not changed since
 
         Arguments:
-        file -- path to directory
+        kind -- css, view or js
+        path -- path to file
+        scan -- method that scans the file
 
         Returns:
         void
 
         """
-        if ".svn" in file:
+        scoped = kind == "view" and self.config.scope_names
+        if self.census_cache is None and not scoped:
+            scan(path)
             return
 
-        for dir_file in Util.getFilesFromDir(file):
-            if Util.isDir(dir_file):
-                self.processCssDirectory(dir_file)
+        found = None
+        if self.census_cache is not None:
+            key = CensusCache.getKey(kind, path, self.config)
+            found = self.census_cache.get(key)
+
+        if found is None:
+            # scan into empty counters to find out what this file adds on its own
+            totals = (self.class_counter, self.id_counter, self.used_classes, self.used_ids)
+            self.class_counter, self.id_counter, self.used_classes, self.used_ids = {}, {}, set(), set()
+            try:
+                scan(path)
+                found = (self.class_counter, self.id_counter, self.used_classes, self.used_ids)
+            finally:
+                self.class_counter, self.id_counter, self.used_classes, self.used_ids = totals
+            if self.census_cache is not None:
+                self.census_cache.set(key, found)
+
+        if scoped:
+            self.view_census[path] = found
+
+        for name, savings in found[0].items():
+            self.class_counter[name] = self.class_counter.get(name, 0) + savings
+        for name, savings in found[1].items():
+            self.id_counter[name] = self.id_counter.get(name, 0) + savings
+        self.used_classes.update(found[2])
+        self.used_ids.update(found[3])
+
+    def getFiles(self, paths, extensions = ()):
+        """gets every file in a list of files and directories along with where its munched copy goes
+
+        each directory is only walked once per run, the scan and the rewrite both get their
+        files from the same listing
+
+        Arguments:
+        paths -- list of files and directories
+        extensions -- only files in directories with one of these extensions, all files if empty
+
+        Returns:
+        list -- (path to file, path to munched copy) tuples
+
+        """
+        if self.walker is None:
+            self.walker = FileWalker(self.config.ignore_paths, self.config.follow_symlinks)
+
+        files = []
+        for path in paths:
+            if not Util.isDir(path):
+                files.append((path, Util.prependExtension("opt", path)))
                 continue
 
-            self.processCssFile(dir_file)
+            path = path.rstrip("/")
+            if not path in self.walked:
+                self.walked[path] = self.walker.walk(path)
 
-    def processCss(self):
-        """gets all css files from config and processes them to see what to replace
+            for file, relative in self.walked[path]:
+                if FileWalker.hasExtension(file, extensions):
+                    files.append((file, path + "_opt/" + relative))
+        return files
+
+    def processView(self, file):
+        """processes a single view file
+
+        Arguments:
+        file -- path to directory
+
+        """
+        self.trackMemory(file)
+        html, segments = self.getView(file)
+        self.processViewSource(html, segments)
+
+    def getView(self, path):
+        """reads and splits a view into segments, only once per run for both the scan and the rewrite
+
+        Arguments:
+        path -- path to view
+
+        Returns:
+        tuple -- (contents of view, list of ViewSegment objects)
+
+        """
+        if path in self.parsed_views:
+            return self.parsed_views[path]
+
+        html = Util.fileGetContents(path)
+        view = (html, ViewParser.parse(html))
+
+        # on a memory budget views are read from disk again instead of being kept around
+        if self.config.max_memory is None:
+            self.parsed_views[path] = view
+        return view
+
+    def processViewSource(self, html, segments = None):
+        """processes the inline css and js blocks and the markup of a single view
+
+        Arguments:
+        html -- contents of view
+        segments -- the view split up by ViewParser.parse, parsed here if None
 
         Returns:
         void
 
         """
-        files = self.config.css
-        for file in files:
-            if not Util.isDir(file):
-                self.processCssFile(file)
-                continue
-            self.processCssDirectory(file)
+        if segments is None:
+            segments = ViewParser.parse(html)
+
+        self.processCssContents(ViewParser.getText(segments, ViewSegment.STYLE))
+        self.processJsContents(ViewParser.getText(segments, ViewSegment.SCRIPT))
 
-    def processViewDirectory(self, file):
-        """processes a directory of view files
+        if self.config.prune_css or self.config.critical_css:
+            self.processMarkup(html)
+
+    def processMarkup(self, html):
+        """finds every class and id used in html attributes so unused css can be pruned
 
         Arguments:
-        file -- path to directory
+        html -- contents of view file
 
         Returns:
         void
 
         """
-        if ".svn" in file:
+        classes, ids = Muncher.getMarkupNames(html)
+        self.used_classes.update(classes)
+        self.used_ids.update(ids)
+
+    @staticmethod
+    def getMarkupNames(html):
+        """finds every class and id in html attributes
+
+        Arguments:
+        html -- markup to search
+
+        Returns:
+        tuple -- (set of classes, set of ids)
+
+        """
+        classes = set()
+        for value in re.findall(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', html):
+            for class_name in (value[0] or value[1]).split():
+                classes.add("." + class_name)
+
+        ids = set()
+        for value in re.findall(r'\bid\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', html):
+            id = (value[0] or value[1]).strip()
+            if id:
+                ids.add("#" + id)
+
+        return classes, ids
+
+    def processCssFile(self, path):
+        """processes a single css file to find all classes and ids to replace
+
+        Arguments:
+        path -- path to css file to process
+
+        Returns:
+        void
+
+        """
+        self.trackMemory(path)
+
+        if self.shouldStream(path):
+            for chunk in Streamer.getChunks(path, self.config.stream_window, Streamer.cssBoundary):
+                self.processCssContents(chunk)
             return
 
-        for dir_file in Util.getFilesFromDir(file):
-            if Util.isDir(dir_file):
-                self.processViewDirectory(dir_file)
-                continue
+        self.processCssContents(Util.fileGetContents(path))
 
-            self.processView(dir_file)
+    def processCssContents(self, contents):
+        """finds all classes and ids to replace in a block of css
 
-    def processViews(self):
-        """processes all view files
+        Arguments:
+        contents -- css to search
 
         Returns:
         void
 
         """
-        files = self.config.views
-        for file in files:
-            if not Util.isDir(file):
-                self.processView(file)
-                continue
-            self.processViewDirectory(file)
+        ids_found = re.findall(r'((?<!\:\s)(?<!\:)#[\w|_|-]+)(\.|\{|,|\s|#)', contents, re.DOTALL)
+        classes_found = re.findall(r'(?!\.[0-9])\.[\w|_|-]+', contents)
+        self.addIds(ids_found)
+        self.addClasses(classes_found)
 
-    def processJsDirectory(self, file):
-        """processes a directory of js files
+    def processJsFile(self, path):
+        """processes a single js file to find all classes and ids to replace
 
         Arguments:
-        file -- path to directory
+        path -- path to css file to process
 
         Returns:
         void
 
         """
-        if ".svn" in file:
+        self.trackMemory(path)
+
+        if self.shouldStream(path):
+            for chunk in Streamer.getChunks(path, self.config.stream_window, self.jsBoundary):
+                self.processJsContents(chunk)
             return
 
-        for dir_file in Util.getFilesFromDir(file):
-            if Util.isDir(dir_file):
-                self.processJsDirectory(dir_file)
+        self.processJsContents(Util.fileGetContents(path))
+
+    def processJsContents(self, contents):
+        """finds all classes and ids to replace in a block of javascript
+
+        Arguments:
+        contents -- javascript to search
+
+        Returns:
+        void
+
+        """
+        selectors = self.getJsSelectors(contents, self.config)
+        for selector in selectors:
+            if selector[0] in self.config.id_selectors:
+                if ',' in selector[2]:
+                    id_to_add = re.search(r'(\'|\")(.*?)(\'|\")', selector[2])
+                    if id_to_add is None:
+                        continue
+
+                    if not id_to_add.group(2):
+                        continue
+
+                    self.addUsedId("#" + id_to_add.group(2))
+
+                # if this is something like document.getElementById(variable) don't add it
+                if not '\'' in selector[2] and not '"' in selector[2]:
+                    continue
+
+                self.addUsedId("#" + selector[2].strip("\"").strip("'"))
                 continue
-            self.processJsFile(dir_file)
 
-    def processJs(self):
-        """gets all js files from config and processes them to see what to replace
+            if selector[0] in self.config.class_selectors:
+                class_to_add = re.search(r'(\'|\")(.*?)(\'|\")', selector[2])
+                if class_to_add is None:
+                    continue
+
+                if not class_to_add.group(2):
+                    continue
+
+                self.addUsedClass("." + class_to_add.group(2))
+                continue
+
+            if selector[0] in self.config.custom_selectors:
+                matches = re.findall(r'((#|\.)[a-zA-Z0-9_\-]*)', selector[2])
+                for match in matches:
+                    if match[1] == "#":
+                        self.addUsedId(match[0])
+                        continue
+
+                    self.addUsedClass(match[0])
+
+    # a single constant in the js manifest: $ID_NAME: "id", $$CLASS_NAME: "class" or CONSTANT: "value"
+    manifest_pattern = re.compile(r'(\s(?:var\s)?)(\$\$|\$)?([A-Z0-9_]+)(\s?:\s?)([\'"])(.*?)([\'"])([,;])')
+
+    def getManifestEntries(self):
+        """reads and parses the js manifest, only once per run
+
+        Returns:
+        tuple -- (contents of the manifest, list of matches of Muncher.manifest_pattern)
+
+        """
+        if self.manifest_entries is None:
+            contents = Util.fileGetContents(self.config.js_manifest)
+            self.manifest_entries = (contents, list(self.manifest_pattern.finditer(contents)))
+        return self.manifest_entries
+
+    def processJsManifest(self):
+        contents, entries = self.getManifestEntries()
+
+        self.manifest_ids = {}
+        self.manifest_classes = {}
+
+        for entry in entries:
+            if entry.group(2) == "$":
+                self.addUsedId("#" + entry.group(6))
+                self.manifest_ids[entry.group(3)] = entry.group(6)
+            elif entry.group(2) == "$$":
+                self.addUsedClass("." + entry.group(6))
+                self.manifest_classes[entry.group(3)] = entry.group(6)
+
+    def optimizeJsManifest(self):
+        """rewrites every id, class and constant of the js manifest in one pass
 
         Returns:
         void
 
         """
-        files = self.config.js
-        for file in files:
-            if not Util.isDir(file):
-                self.processJsFile(file)
+        contents, entries = self.getManifestEntries()
+        self.manifest_entries = None
+
+        parts = []
+        position = 0
+        constant = 0
+        for entry in entries:
+            prefix, value = entry.group(2), entry.group(6)
+            if prefix == "$" and "#" + value in self.id_map:
+                value = entry.group(5) + self.id_map["#" + value][1:] + entry.group(7)
+            elif prefix == "$$" and "." + value in self.class_map:
+                value = entry.group(5) + self.class_map["." + value][1:] + entry.group(7)
+            # underscore constants are left alone
+            elif prefix is None and self.config.rewrite_constants and not entry.group(3).startswith("_"):
+                constant += 1
+                value = str(constant)
+            else:
                 continue
-            self.processJsDirectory(file)
 
-    def processView(self, file):
-        """processes a single view file
+            parts.append(contents[position:entry.start(5)])
+            parts.append(value)
+            parts.append(entry.group(8))
+            position = entry.end()
+
+        parts.append(contents[position:])
+
+        new_manifest = Util.prependExtension("opt", self.config.js_manifest)
+        self.writeFile(self.config.js_manifest, new_manifest, "".join(parts))
+        self.finishWrites()
+
+    def addUsedId(self, id):
+        """adds an id that was found in a js selector
+
+        Arguments:
+        id -- single id to add
+
+        Returns:
+        void
+
+        """
+        self.used_ids.add(id)
+        self.addId(id)
+
+    def addUsedClass(self, class_name):
+        """adds a class that was found in a js selector
+
+        Arguments:
+        class_name -- single class to add
+
+        Returns:
+        void
+
+        """
+        self.used_classes.add(class_name)
+        self.addClass(class_name)
+
+    def isUsed(self, name):
+        """determines if a class or id is referenced by a view or js selector
+
+        Arguments:
+        name -- class or id including the leading . or #
+
+        Returns:
+        bool
+
+        """
+        if name in self.used_classes or name in self.used_ids or name in self.config.ignore:
+            return True
+
+        safelist = self.config.getPruneSafelistPattern()
+        return safelist is not None and safelist.match(name) is not None
+
+    def isSelectorUsed(self, selector):
+        """determines if a css selector can match anything in the views
+
+        Arguments:
+        selector -- single css selector
+
+        Returns:
+        bool
+
+        """
+        for name in CssParser.getSelectorNames(selector):
+            if not self.isUsed(name):
+                return False
+        return True
+
+    def pruneRules(self, rules):
+        """removes selectors that can never match and any rules left without selectors
+
+        Arguments:
+        rules -- list of CssRule
+
+        Returns:
+        list
+
+        """
+        kept = []
+        for rule in rules:
+            if rule.isGroup():
+                rule.children = self.pruneRules(rule.children)
+                if not len(rule.children):
+                    continue
+            elif rule.body is not None and not rule.isAtRule():
+                selectors = [selector for selector in rule.getSelectors() if self.isSelectorUsed(selector)]
+                if not len(selectors):
+                    continue
+                leading = rule.prelude[:len(rule.prelude) - len(rule.prelude.lstrip())]
+                rule.prelude = leading + ",".join(selectors).lstrip()
+            kept.append(rule)
+        return kept
+
+    def pruneCss(self, css, path = "inline css"):
+        """drops css rules that nothing in the views or js uses
+
+        Arguments:
+        css -- contents of css to prune
+        path -- where the css came from for reporting
+
+        Returns:
+        string
+
+        """
+        rules, trailing = CssParser.parse(css)
+        pruned = CssParser.serialize(self.pruneRules(rules), trailing)
+        removed = len(css) - len(pruned)
+        self.pruned_bytes += removed
+        self.output("pruned " + SizeTracker.getSize(removed) + " from " + path)
+        return pruned
+
+    def mergeCss(self, css, path = "inline css"):
+        """merges the rules renaming left repeated in munched css
+
+        Arguments:
+        css -- munched css
+        path -- where the css came from for reporting
+
+        Returns:
+        string
+
+        """
+        merged = CssOptimizer.optimize(css)
+        saved = len(css) - len(merged)
+        self.merged_bytes += saved
+        self.output("merging rules saved " + SizeTracker.getSize(saved) + " in " + path)
+        return merged
+
+    def getCriticalCss(self, paths):
+        """gets the munched css rules from a list of stylesheets that the processed views can use
+
+        Arguments:
+        paths -- list of paths to the original css files
+
+        Returns:
+        string
+
+        """
+        critical = ""
+        for path in paths:
+            rules, trailing = CssParser.parse(Util.fileGetContents(path))
+            critical = critical + CssParser.serialize(self.pruneRules(rules)) + "\n"
+
+        return self.replaceCss(critical)
+
+    @staticmethod
+    def isLocalUrl(url):
+        """determines if a url in a stylesheet points at a file relative to that stylesheet
+
+        Arguments:
+        url -- url from @import or url()
+
+        Returns:
+        bool
+
+        """
+        return not (url == "" or url.startswith("/") or url.startswith("#") or url.startswith("data:") or "://" in url)
+
+    @staticmethod
+    def rebaseUrls(css, from_dir, to_dir):
+        """rewrites relative url() references so they still work from another directory
+
+        Arguments:
+        css -- contents of css
+        from_dir -- directory the css was written for
+        to_dir -- directory the css will be served from
+
+        Returns:
+        string
+
+        """
+        def rebase(match):
+            url = match.group(2)
+            if not Muncher.isLocalUrl(url):
+                return match.group(0)
+            new_url = os.path.relpath(os.path.join(from_dir, url), to_dir).replace(os.sep, "/")
+            return "url(" + match.group(1) + new_url + match.group(1) + ")"
+
+        return re.sub(r'url\(\s*([\'"]?)([^\'"\)]*?)\1\s*\)', rebase, css)
+
+    def inlineImports(self, path, bundle_dir, hoisted, seen):
+        """reads a stylesheet with every local @import replaced by the imported file
+
+        Arguments:
+        path -- path to css file
+        bundle_dir -- directory the bundle will be served from
+        hoisted -- list that remote @import rules are collected in, they have to stay at the top
+        seen -- set of files already inlined so import cycles stop
+
+        Returns:
+        string
+
+        """
+        real_path = os.path.realpath(path)
+        if real_path in seen:
+            return ""
+        seen.add(real_path)
+
+        base_dir = os.path.dirname(path)
+        rules, trailing = CssParser.parse(Util.fileGetContents(path))
+        parts = []
+        for rule in rules:
+            prelude = rule.prelude.strip()
+            if rule.body is not None or rule.children is not None or not prelude.startswith("@"):
+                parts.append(Muncher.rebaseUrls(rule.toString(), base_dir, bundle_dir))
+                continue
+
+            # the bundle is always utf-8 and @charset is only allowed at the very top
+            if prelude.lower().startswith("@charset"):
+                continue
+
+            match = re.match(r'@import\s+(?:url\(\s*)?([\'"]?)([^\'"\)\s]+)\1\s*\)?\s*(.*)$', prelude, re.DOTALL | re.IGNORECASE)
+            if match is None:
+                parts.append(rule.toString())
+                continue
+
+            url = match.group(2)
+            import_path = os.path.join(base_dir, url)
+            if not Muncher.isLocalUrl(url) or not Util.fileExists(import_path):
+                hoisted.append(prelude + ";")
+                continue
+
+            imported = self.inlineImports(import_path, bundle_dir, hoisted, seen)
+            media = match.group(3).strip()
+            if media:
+                imported = "@media " + media + "{" + imported + "}"
+            parts.append("\n" + imported + "\n")
+
+        parts.append(trailing)
+        return "".join(parts)
+
+    def getCssBundle(self, paths, bundle_dir):
+        """concatenates and munches a set of stylesheets into a single bundle
 
         Arguments:
-        file -- path to directory
+        paths -- list of paths to the original css files in the order they are linked
+        bundle_dir -- directory the bundle will be written to
+
+        Returns:
+        tuple -- (file name based on a hash of the contents, contents)
 
         """
-        self.processCssFile(file, True)
-        self.processJsFile(file, True)
+        hoisted = []
+        seen = set()
+        parts = []
+        for path in paths:
+            parts.append(self.inlineImports(path, bundle_dir, hoisted, seen))
 
-    def processCssFile(self, path, inline = False):
-        """processes a single css file to find all classes and ids to replace
+        css = self.replaceCss("\n".join(hoisted + parts))
+        if self.config.merge_css:
+            css = self.mergeCss(css, "bundle")
+        return "bundle." + hashlib.sha1(css).hexdigest()[:12] + ".css", css
 
-        Arguments:
-        path -- path to css file to process
+    def processMaps(self):
+        """loops through classes and ids to process to determine shorter names to use for them
+        and creates a dictionary with these mappings
 
         Returns:
         void
 
         """
-        contents = Util.fileGetContents(path)
-        if inline is True:
-            blocks = self.getCssBlocks(contents)
-            contents = ""
-            for block in blocks:
-                contents = contents + block
+        stable_classes, stable_ids = self.getStableMaps()
 
-        ids_found = re.findall(r'((?<!\:\s)(?<!\:)#[\w|_|-]+)(\.|\{|,|\s|#)', contents, re.DOTALL)
-        classes_found = re.findall(r'(?!\.[0-9])\.[\w|_|-]+', contents)
-        self.addIds(ids_found)
-        self.addClasses(classes_found)
+        if self.config.scope_names:
+            self.scoped_names = self.getScopedNames()
 
-    def processJsFile(self, path, inline = False):
-        """processes a single js file to find all classes and ids to replace
+        if self.config.gzip_names:
+            strategy = NameStrategy(self, self.config.name_budget)
+            strategy.choose(stable_classes, stable_ids)
+            self.output(strategy.getReport(), False)
+        else:
+            self.assignNames(stable_classes, stable_ids)
+
+        if len(self.scoped_names):
+            self.assignScopedNames()
+
+        if self.config.persist_map is not None:
+            # names that disappeared stay in the file so they come back with the same name
+            stable_classes.update(self.class_map)
+            stable_ids.update(self.id_map)
+            Census.writeMaps(self.config.persist_map, stable_classes, stable_ids)
+
+    def assignNames(self, stable_classes, stable_ids, symbols = None, order = None):
+        """gives every class and id its new name, starting over from empty maps
 
         Arguments:
-        path -- path to css file to process
+        stable_classes -- class names to keep from the last run
+        stable_ids -- id names to keep from the last run
+        symbols -- alphabet to build names from, VarFactory.symbols if None
+        order -- dictionary of name to the position it gets its new name in, by savings if None
 
         Returns:
         void
 
         """
-        contents = Util.fileGetContents(path)
-        if inline is True:
-            blocks = self.getJsBlocks(contents)
-            contents = ""
-            for block in blocks:
-                contents = contents + block
-
-        selectors = self.getJsSelectors(contents, self.config)
-        for selector in selectors:
-            if selector[0] in self.config.id_selectors:
-                if ',' in selector[2]:
-                    id_to_add = re.search(r'(\'|\")(.*?)(\'|\")', selector[2])
-                    if id_to_add is None:
-                        continue
-
-                    if not id_to_add.group(2):
-                        continue
-
-                    self.addId("#" + id_to_add.group(2))
+        VarFactory.reset()
+        self.class_map = {}
+        self.id_map = {}
+        reserved = set(stable_classes.values()) | set(stable_ids.values())
 
-                # if this is something like document.getElementById(variable) don't add it
-                if not '\'' in selector[2] and not '"' in selector[2]:
-                    continue
+        # reverse sort so we can figure out the biggest savings
+        # ties are broken by name so the same census always gives the same map
+        classes = self.class_counter.items()
+        classes.sort(key = itemgetter(0))
+        classes.sort(key = itemgetter(1), reverse=True)
+        if order is not None:
+            classes.sort(key = lambda item: order.get(item[0], len(order)))
 
-                self.addId("#" + selector[2].strip("\"").strip("'"))
+        for class_name, savings in classes:
+            # unused names are pruned from the css so there is no point giving them short names
+            if self.config.prune_css and not self.isUsed(class_name):
                 continue
 
-            if selector[0] in self.config.class_selectors:
-                class_to_add = re.search(r'(\'|\")(.*?)(\'|\")', selector[2])
-                if class_to_add is None:
-                    continue
-
-                if not class_to_add.group(2):
-                    continue
+            # names only one view uses get a name of that view's own
+            if class_name in self.scoped_names:
+                continue
 
-                self.addClass("." + class_to_add.group(2))
+            # keep the name from the last deploy unless a real class has taken it since
+            if class_name in stable_classes and not stable_classes[class_name] in self.class_counter:
+                self.class_map[class_name] = stable_classes[class_name]
                 continue
 
-            if selector[0] in self.config.custom_selectors:
-                matches = re.findall(r'((#|\.)[a-zA-Z0-9_\-]*)', selector[2])
-                for match in matches:
-                    if match[1] == "#":
-                        self.addId(match[0])
-                        continue
+            small_class = "." + VarFactory.getNext("class", symbols)
 
-                    self.addClass(match[0])
+            # adblock extensions may block class "ad" so we should never generate it
+            # also if the generated class already exists as a class to be processed
+            # we can't use it or bad things will happen
+            while small_class == ".ad" or small_class in self.class_counter or small_class in reserved:
+                small_class = "." + VarFactory.getNext("class", symbols)
 
-    def processJsManifest(self):
-        contents = Util.fileGetContents(self.config.js_manifest)
-        ids = re.findall(r'\s+?(var\s)?\${1}([A-Z0-9_]+)\s?:\s?[\'|\"](.*?)[\'|\"][,|;]', contents)
-        classes = re.findall(r'\s+?(var\s)?\${2}([A-Z0-9_]+)\s?:\s?[\'|\"](.*?)[\'|\"][,|;]', contents)
+            self.class_map[class_name] = small_class
 
-        self.manifest_ids = {}
-        self.manifest_classes = {}
+        ids = self.id_counter.items()
+        ids.sort(key = itemgetter(0))
+        ids.sort(key = itemgetter(1), reverse=True)
+        if order is not None:
+            ids.sort(key = lambda item: order.get(item[0], len(order)))
 
-        for id in ids:
-            self.addId("#" + id[2])
-            self.manifest_ids[id[1]] = id[2]
+        for id, savings in ids:
+            if self.config.prune_css and not self.isUsed(id):
+                continue
 
-        for manifest_class in classes:
-            self.addClass("." + manifest_class[2])
-            self.manifest_classes[manifest_class[1]] = manifest_class[2]
+            if id in self.scoped_names:
+                continue
 
-    def optimizeJsManifest(self):
-        contents = Util.fileGetContents(self.config.js_manifest)
-
-        for key, value in self.manifest_ids.items():
-            #print key,'yyyyyyyyy'
-            #print value,'tttttt'
-            if "#" + value in self.id_map:
-                contents = re.sub(r'((?<!\$)\${1}[A-Z0-9_]+\s?:\s?[\'|\"])(' + value + ')([\'|\"][,|;])', r'\1' + self.id_map["#" + value].replace("#", "") + r'\3', contents)
-
-        for key, value in self.manifest_classes.items():
-            if "." + value in self.class_map:
-                contents = re.sub(r'(\${2}[A-Z0-9_]+\s?:\s?[\'|\"])(' + value + ')([\'|\"][,|;])', r'\1' + self.class_map["." + value].replace(".", "") + r'\3', contents)
-
-        if self.config.rewrite_constants:
-            constants = re.findall(r'(\s+?(var\s)?([A-Z0-9_]+)\s?:\s?[\'|\"](.*?)[\'|\"][,|;])', contents)
-            new_constants = {}
-            i = 0
-            for constant in constants:
-                # underscore variables are ignored
-                if constant[2][0] == "_":
-                    continue
+            if id in stable_ids and not stable_ids[id] in self.id_counter:
+                self.id_map[id] = stable_ids[id]
+                continue
 
-                i += 1
-                new_constant = re.sub(r'=(.*)([,|;])',': ' + str(i) + r'\2', constant[0])
-                contents = contents.replace(constant[0], new_constant)
+            small_id = "#" + VarFactory.getNext("id", symbols)
 
-        new_manifest = Util.prependExtension("opt", self.config.js_manifest)
-        Util.filePutContents(new_manifest, contents)
+            # same holds true for ids as classes
+            while small_id == "#ad" or small_id in self.id_counter or small_id in reserved:
+                small_id = "#" + VarFactory.getNext("id", symbols)
 
-        if self.config.show_savings:
-            SizeTracker.trackFile(self.config.js_manifest, new_manifest)
+            self.id_map[id] = small_id
 
-    def processMaps(self):
-        """loops through classes and ids to process to determine shorter names to use for them
-        and creates a dictionary with these mappings
+    def extendMaps(self, class_map, id_map, reserved):
+        """starts from maps shared with other pages and only gives new names to the classes
+        and ids this muncher found that they do not have
+
+        Arguments:
+        class_map -- dictionary of classes to new names
+        id_map -- dictionary of ids to new names
+        reserved -- names the new ones must not take
 
         Returns:
         void
 
         """
-        # reverse sort so we can figure out the biggest savings
-        classes = self.class_counter.items()
+        VarFactory.reset()
+        self.class_map = dict(class_map)
+        self.id_map = dict(id_map)
+
+        if self.config.scope_names:
+            # the page is the whole scope of the names only it uses
+            taken = (reserved, self.class_counter, self.id_counter, self.config.ignore)
+            self.class_map.update(self.getScopedMap(dict([item for item in self.class_counter.items() if not item[0] in class_map]), ".", taken))
+            self.id_map.update(self.getScopedMap(dict([item for item in self.id_counter.items() if not item[0] in id_map]), "#", taken))
+            return
+
+        classes = [item for item in self.class_counter.items() if not item[0] in class_map]
+        classes.sort(key = itemgetter(0))
         classes.sort(key = itemgetter(1), reverse=True)
 
         for class_name, savings in classes:
             small_class = "." + VarFactory.getNext("class")
-
-            # adblock extensions may block class "ad" so we should never generate it
-            # also if the generated class already exists as a class to be processed
-            # we can't use it or bad things will happen
-            while small_class == ".ad" or Util.keyInTupleList(small_class, classes):
+            while small_class == ".ad" or small_class in self.class_counter or small_class in reserved:
                 small_class = "." + VarFactory.getNext("class")
-
             self.class_map[class_name] = small_class
 
-        ids = self.id_counter.items()
+        ids = [item for item in self.id_counter.items() if not item[0] in id_map]
+        ids.sort(key = itemgetter(0))
         ids.sort(key = itemgetter(1), reverse=True)
 
         for id, savings in ids:
             small_id = "#" + VarFactory.getNext("id")
-
-            # same holds true for ids as classes
-            while small_id == "#ad" or Util.keyInTupleList(small_id, ids):
+            while small_id == "#ad" or small_id in self.id_counter or small_id in reserved:
                 small_id = "#" + VarFactory.getNext("id")
-
             self.id_map[id] = small_id
 
+    def getScopedNames(self):
+        """finds the classes and ids that only a single view uses in its inline css and js blocks
+
+        Returns:
+        set
+
+        """
+        views = {}
+        savings = {}
+        for path, found in self.view_census.items():
+            for counter in found[0:2]:
+                for name, saved in counter.items():
+                    views[name] = views.get(name, 0) + 1
+                    savings[name] = savings.get(name, 0) + saved
+
+        scoped = set()
+        for name, count in views.items():
+            # a name a css or js file uses as well has counted more than the views did
+            counter = self.id_counter if name[0] == "#" else self.class_counter
+            if count == 1 and counter.get(name) == savings[name]:
+                scoped.add(name)
+        return scoped
+
+    def assignScopedNames(self):
+        """gives the names only a single view uses the shortest names that view leaves free
+
+        every view starts over from the shortest name, so a view with a handful of names of its
+        own gets one and two letter names no matter how many names the whole site has
+
+        Returns:
+        void
+
+        """
+        self.view_maps = {}
+        reserved = set(self.class_map.values()) | set(self.id_map.values())
+        count = 0
+        for path in sorted(self.view_census):
+            found = self.view_census[path]
+            classes = dict([item for item in found[0].items() if item[0] in self.scoped_names])
+            ids = dict([item for item in found[1].items() if item[0] in self.scoped_names])
+            if not len(classes) and not len(ids):
+                continue
+
+            # a class or id the markup uses without any css or js knowing it must not be taken either
+            markup_classes, markup_ids = Muncher.getMarkupNames(self.getView(path)[0])
+            taken = (reserved, self.class_counter, self.id_counter, self.config.ignore, markup_classes, markup_ids)
+            self.view_maps[path] = (self.getScopedMap(classes, ".", taken), self.getScopedMap(ids, "#", taken))
+            count += len(self.view_maps[path][0]) + len(self.view_maps[path][1])
+
+        self.output("gave " + str(count) + " classes and ids only used by a single view names of their own")
+
+    def getScopedMap(self, counter, prefix, taken):
+        """packs names into the shortest names that are free in a single page
+
+        Arguments:
+        counter -- dictionary of classes or ids to the bytes they save
+        prefix -- . for classes, # for ids
+        taken -- collections of names the new ones must not take
+
+        Returns:
+        dict
+
+        """
+        names = counter.items()
+        names.sort(key = itemgetter(0))
+        names.sort(key = itemgetter(1), reverse=True)
+
+        scoped_map = {}
+        index = 0
+        for name, savings in names:
+            if self.config.prune_css and not self.isUsed(name):
+                continue
+
+            small_name = prefix + VarFactory.getShortName(index)
+            index += 1
+            while small_name == prefix + "ad" or any(small_name in collection for collection in taken):
+                small_name = prefix + VarFactory.getShortName(index)
+                index += 1
+            scoped_map[name] = small_name
+        return scoped_map
+
+    def getStableMaps(self):
+        """loads the maps persisted by the last run so existing classes and ids keep their names
+
+        Returns:
+        tuple -- (class map, id map), empty when there is nothing to keep
+
+        """
+        if self.config.persist_map is None or not Util.fileExists(self.config.persist_map):
+            return {}, {}
+
+        stable_classes, stable_ids = Census.readMaps(self.config.persist_map)
+        if self.config.remap_threshold is None:
+            return stable_classes, stable_ids
+
+        # share of names that were added or removed since everything was last assigned
+        changed = 0
+        for name in self.class_counter:
+            if not name in stable_classes:
+                changed += 1
+        for name in stable_classes:
+            if not name in self.class_counter:
+                changed += 1
+        for name in self.id_counter:
+            if not name in stable_ids:
+                changed += 1
+        for name in stable_ids:
+            if not name in self.id_counter:
+                changed += 1
+
+        drift = float(changed) / max(len(self.class_counter) + len(self.id_counter), 1)
+        if drift > self.config.remap_threshold:
+            self.output("map has drifted " + str(round(drift * 100, 2)) + "%, reassigning all names", False)
+            return {}, {}
+
+        return stable_classes, stable_ids
+
     def incrementIdCounter(self, name):
         """called for every time an id is added to increment the bytes we will save
 
@@ -529,119 +1390,173 @@ class Muncher(object):
         for class_name in classes:
             self.addClass(class_name)
 
-    def optimizeFiles(self, paths, callback, extension = "", minimize = False):
+    def optimizeFiles(self, paths, callback, extensions = ()):
         """loops through a bunch of files and directories, runs them through a callback, then saves them to disk
 
+        files in a directory are written to the same place in a copy of it named {directory}_opt
+
         Arguments:
         paths -- array of files and directories
         callback -- function to process each file with
+        extensions -- only files in directories with one of these extensions, all files if empty
 
         Returns:
         void
 
         """
-        for file in paths:
-            if not Util.isDir(file):
-                self.optimizeFile(file, callback, minimize)
-                continue
+        for path in paths:
+            if Util.isDir(path):
+                self.prepareDirectory(path.rstrip("/") + "_opt")
 
-            self.optimizeDirectory(file, callback, extension, minimize)
+        for file, new_path in self.getFiles(paths, extensions):
+            directory = os.path.dirname(new_path)
+            if directory and not Util.isDir(directory):
+                self.output("creating directory " + directory)
+                os.makedirs(directory)
+            self.optimizeFile(file, callback, new_path)
 
-    def optimizeFile(self, file, callback, minimize = False, new_path = None, prepend = "opt"):
+        self.finishWrites()
+
+    def optimizeFile(self, file, callback, new_path = None, prepend = "opt"):
         """optimizes a single file
 
         Arguments:
         file -- path to file
         callback -- function to run the file through
-        minimize -- whether or not we should minimize the file contents (html)
+        new_path -- path to write to, the file with prepend in front of its extension if None
         prepend -- what extension to prepend
 
         Returns:
         void
 
         """
-        content = callback(file)
         if new_path is None:
             new_path = Util.prependExtension(prepend, file)
-        if minimize is True:
-            self.output("minimizing " + file)
-            content = self.minimize(content)
-        self.output("optimizing " + file + " to " + new_path)
-        Util.filePutContents(new_path, content)
 
-        if self.config.show_savings:
-            SizeTracker.trackFile(file, new_path)
+        self.trackMemory(file)
 
-    def prepareDirectory(self, path):
-        if ".svn" in path:
-            return True
+        if callback in (self.optimizeCss, self.optimizeJavascript) and self.shouldStream(file):
+            self.streamFile(file, new_path, callback)
+            return
 
-        if Util.isDir(path):
-            return False
+        content = callback(file)
+        self.output("optimizing " + file + " to " + new_path)
+        self.writeFile(file, new_path, content)
 
-        Util.unlinkDir(path)
-        self.output("creating directory " + path)
-        os.mkdir(path)
-        return False
+    def getWriter(self):
+        """gets the writer every munched file goes through
 
-    def optimizeDirectory(self, path, callback, extension = "", minimize = False):
-        """optimizes a directory
+        Returns:
+        OutputWriter
+
+        """
+        if self.writer is None:
+            # queued writes hold their contents in memory until they are done
+            threads = self.config.write_threads if self.config.max_memory is None else 0
+            self.writer = OutputWriter(threads)
+        return self.writer
+
+    def writeFile(self, file, new_path, contents):
+        """writes a munched file, skipping it if the output already has the same contents
 
         Arguments:
-        path -- path to directory
-        callback -- function to run the file through
-        extension -- extension to search for in the directory
-        minimize -- whether or not we should minimize the file contents (html)
+        file -- path to the original file
+        new_path -- path to write to
+        contents -- munched contents
 
         Returns:
         void
 
         """
-        directory = path + "_opt"
-        skip = self.prepareDirectory(directory)
-        if skip is True:
-            return
+        self.getWriter().write(new_path, contents)
+        if self.config.show_savings:
+            self.tracked.append((file, new_path))
 
-        for dir_file in Util.getFilesFromDir(path, extension):
-            if Util.isDir(dir_file):
-                self.optimizeSubdirectory(dir_file, callback, directory, extension, minimize)
-                continue
+    def finishWrites(self):
+        """waits for every queued write and measures the savings once the files are on disk
 
-            new_path = directory + "/" + Util.getFileName(dir_file)
-            self.optimizeFile(dir_file, callback, minimize, new_path)
+        Returns:
+        void
+
+        """
+        self.getWriter().finish()
+        for file, new_path in self.tracked:
+            SizeTracker.trackFile(file, new_path)
+        self.tracked = []
 
-    def optimizeSubdirectory(self, path, callback, new_path, extension = "", minimize = False):
-        """optimizes a subdirectory within a directory being optimized
+    def streamFile(self, file, new_path, callback):
+        """optimizes a single css or js file one window at a time
 
         Arguments:
-        path -- path to directory
-        callback -- function to run the file through
-        new_path -- path to optimized parent directory
-        extension -- extension to search for in the directory
-        minimize -- whether or not we should minimize the file contents (html)
+        file -- path to file
+        new_path -- path to write the optimized file to
+        callback -- Muncher.optimizeCss or Muncher.optimizeJavascript
 
         Returns:
         void
 
         """
-        subdir_path = new_path + "/" + path.split("/").pop()
-        skip = self.prepareDirectory(subdir_path)
-        if skip is True:
-            return
+        self.output("streaming " + file + " to " + new_path)
+        writer = self.getWriter()
+        temp_path = writer.getTempPath(new_path)
+        try:
+            if callback == self.optimizeCss:
+                Streamer.rewrite(file, temp_path, self.replaceCss, self.config.stream_window, Streamer.cssBoundary)
+            else:
+                Streamer.rewrite(file, temp_path, self.replaceJavascript, self.config.stream_window, self.jsBoundary)
+        except:
+            Util.unlink(temp_path)
+            raise
+        writer.replace(temp_path, new_path)
 
-        for dir_file in Util.getFilesFromDir(path, extension):
-            if Util.isDir(dir_file):
-                self.optimizeSubdirectory(dir_file, callback, subdir_path, extension, minimize)
-                continue
+        if self.config.show_savings:
+            SizeTracker.trackFile(file, new_path)
+
+    def jsBoundary(self, chunk, force = False):
+        """cuts javascript after the last line break, moving the cut back in front of any
+        selector call that is not closed by then
+
+        minified javascript is often a single line, so without a line break it is cut after
+        the last ; or } outside of strings, regexes and comments. when it has to be cut and
+        there is neither, it is cut far enough from the end that no selector name is split
+
+        Arguments:
+        chunk -- window of javascript
+        force -- cut even if there is no safe place to
+
+        Returns:
+        int
+
+        """
+        cut = chunk.rfind("\n") + 1
+        if cut <= 0:
+            cut = JsMinifier.getLastStatementEnd(chunk)
+        if cut <= 0:
+            if not force:
+                return 0
+            selectors = set(self.config.custom_selectors) | set(self.config.id_selectors) | set(self.config.class_selectors)
+            cut = max(len(chunk) - max([len(selector) for selector in selectors]) - 1, 1)
+
+        last = None
+        for match in self.getJsSelectorNames(self.config).finditer(chunk):
+            if match.start() >= cut:
+                break
+            last = match
+
+        if last is not None and chunk.find(")", last.end(), cut) == -1:
+            # a selector call that does not close soon is cut through rather than grow the chunk
+            if not force or len(chunk) - last.start() <= Streamer.max_token:
+                return last.start()
+
+        return cut
 
-            new_file_path = subdir_path + "/" + Util.getFileName(dir_file)
-            self.optimizeFile(dir_file, callback, minimize, new_file_path)
+    def prepareDirectory(self, path):
+        if Util.isDir(path):
+            return
 
-    def minimize(self, content):
-        content = re.sub(r'\n', '', content)
-        content = re.sub(r'\s\s+', '', content)
-        content = re.sub(r'(<!--(?!\[if)(.*?)-->)', '', content, re.MULTILINE)
-        return content
+        Util.unlinkDir(path)
+        self.output("creating directory " + path)
+        os.mkdir(path)
 
     def optimizeCss(self, path):
         """replaces classes and ids with new values in a css file
@@ -653,8 +1568,26 @@ class Muncher(object):
         string
 
         """
-        css = Util.fileGetContents(path)
-        return self.replaceCss(css)
+        return self.munchCss(Util.fileGetContents(path), path)
+
+    def munchCss(self, css, path):
+        """prunes, renames and merges the contents of a css file
+
+        Arguments:
+        css -- contents of the file
+        path -- where the css came from for reporting
+
+        Returns:
+        string
+
+        """
+        if self.config.prune_css:
+            css = self.pruneCss(css, path)
+        css = self.replaceCss(css)
+
+        if self.config.merge_css:
+            css = self.mergeCss(css, path)
+        return css
 
     def optimizeHtml(self, path):
         """replaces classes and ids with new values in an html file
@@ -669,12 +1602,77 @@ class Muncher(object):
         string
 
         """
-        html = Util.fileGetContents(path)
-        html = self.replaceHtml(html)
-        html = self.optimizeCssBlocks(html)
-        html = self.optimizeJavascriptBlocks(html)
+        html, segments = self.getView(path)
+        # the rewrite is the last time the view is needed
+        self.parsed_views.pop(path, None)
+
+        maps = (self.class_map, self.id_map)
+        if path in self.view_maps:
+            # the names only this view uses go on top of the shared ones while it is rewritten
+            self.class_map = dict(maps[0])
+            self.class_map.update(self.view_maps[path][0])
+            self.id_map = dict(maps[1])
+            self.id_map.update(self.view_maps[path][1])
+
+        try:
+            # minifying and munching in a single pass over the document
+            if self.config.compress_html:
+                return HtmlMuncher(self, True, ()).munch(html)
 
-        return html
+            return self.munchHtml(html, segments)
+        finally:
+            self.class_map, self.id_map = maps
+
+    def munchHtml(self, html, segments = None):
+        """replaces classes and ids in html markup along with any inline css and js blocks
+
+        Arguments:
+        html -- contents to replace
+        segments -- the view split up by ViewParser.parse, parsed here if None
+
+        Returns:
+        string
+
+        """
+        if segments is None:
+            segments = ViewParser.parse(html)
+
+        # the markup is rewritten in one go with every block set aside
+        blocks = []
+        markup = []
+        for segment in segments:
+            if segment.type == ViewSegment.MARKUP:
+                markup.append(segment.text)
+                continue
+            markup.append("\x01" + str(len(blocks)) + "\x01")
+            blocks.append(segment)
+
+        def restore(match):
+            segment = blocks[int(match.group(1))]
+            if segment.type == ViewSegment.STYLE:
+                return self.replaceInlineCss(segment.text)
+            # class and id attributes in html strings inside the script are renamed too
+            return self.replaceJavascript(self.replaceHtml(segment.text), self.config.compress_html or self.config.compress_js)
+
+        return re.sub(r'\x01(\d+)\x01', restore, self.replaceHtml("".join(markup)))
+
+    def replaceInlineCss(self, css):
+        """rewrites the contents of a <style> block
+
+        Arguments:
+        css -- contents of the block
+
+        Returns:
+        string
+
+        """
+        if self.config.prune_css:
+            css = self.pruneCss(css)
+        css = self.replaceCss(css)
+
+        if self.config.merge_css:
+            css = self.mergeCss(css)
+        return css
 
     def replaceHtml(self, html):
         """replaces classes and ids with new values in an html file
@@ -753,40 +1751,6 @@ class Muncher(object):
 
         return html
 
-    def optimizeCssBlocks(self, html):
-        """rewrites css blocks that are part of an html file
-
-        Arguments:
-        html -- contents of file we are replacing
-
-        Returns:
-        string
-
-        """
-        result_css = ""
-        matches = self.getCssBlocks(html)
-        for match in matches:
-            match = self.replaceCss(match)
-            result_css = result_css + match
-
-        if len(matches):
-            return html.replace(matches[0], result_css)
-
-        return html
-
-    @staticmethod
-    def getCssBlocks(html):
-        """searches a file and returns all css blocks <style type="text/css"></style>
-
-        Arguments:
-        html -- contents of file we are replacing
-
-        Returns:
-        list
-
-        """
-        return re.compile(r'\<style.*?\>(.*)\<\/style\>', re.DOTALL).findall(html)
-
     def replaceCss(self, css):
         """single call to handle replacing ids and classes
 
@@ -828,44 +1792,6 @@ class Muncher(object):
 
         return css
 
-    def optimizeJavascriptBlocks(self, html):
-        """rewrites javascript blocks that are part of an html file
-
-        Arguments:
-        html -- contents of file we are replacing
-
-        Returns:
-        string
-
-        """
-        matches = self.getJsBlocks(html)
-
-        for match in matches:
-            new_js = match
-            if self.config.compress_html:
-                matches = re.findall(r'((:?)\/\/.*?\n|\/\*.*?\*\/)', new_js, re.DOTALL)
-                for single_match in matches:
-                    if single_match[1] == ':':
-                        continue
-                    new_js = new_js.replace(single_match[0], '');
-            new_js = self.replaceJavascript(new_js)
-            html = html.replace(match, new_js)
-
-        return html
-
-    @staticmethod
-    def getJsBlocks(html):
-        """searches a file and returns all javascript blocks: <script type="text/javascript"></script>
-
-        Arguments:
-        html -- contents of file we are replacing
-
-        Returns:
-        list
-
-        """
-        return re.compile(r'\<script(?! src).*?\>(.*?)\<\/script\>', re.DOTALL).findall(html)
-
     def optimizeJavascript(self, path):
         """optimizes javascript for a specific file
 
@@ -877,22 +1803,44 @@ class Muncher(object):
 
         """
         js = Util.fileGetContents(path)
-        return self.replaceJavascript(js)
+        return self.replaceJavascript(js, self.config.compress_js)
 
-    def replaceJavascript(self, js):
+    def replaceJavascript(self, js, compress = False):
         """single call to handle replacing ids and classes
 
+        compressing is a pass of its own before the rewrite. the rewrite matches whole selector
+        calls, arguments and all, with the same patterns the scan found the names with, while
+        the minifier only sees one token at a time. the minifier is a single linear pass, so
+        compressing costs one more read of the script
+
         Arguments:
         js -- contents of file to replace
+        compress -- whether or not comments and whitespace should be stripped first
 
         Returns:
         string
 
         """
+        if compress is True:
+            js = JsMinifier.minify(js)
+
         js = self.replaceJsFromDictionary(self.id_map, js)
         js = self.replaceJsFromDictionary(self.class_map, js)
         return js
 
+    @staticmethod
+    def getJsSelectorNames(config):
+        """gets a pattern matching the start of any js selector call
+
+        Arguments:
+        config -- Config object
+
+        Returns:
+        regex
+
+        """
+        return config.getJsSelectorNamePattern()
+
     @staticmethod
     def getJsSelectors(js, config):
         """finds all js selectors within a js block
@@ -904,9 +1852,7 @@ class Muncher(object):
         list
 
         """
-        valid_selectors = "|".join(config.custom_selectors) + "|" + "|".join(config.id_selectors) + "|" + "|".join(config.class_selectors)
-        valid_selectors = valid_selectors.replace('$', '\$')
-        return re.findall(r'(' + valid_selectors + ')(\(([^<>]*?)\))', js, re.DOTALL)
+        return config.getJsSelectorPattern().findall(js)
 
     def replaceJsFromDictionary(self, dictionary, js):
         """replaces any instances of classes and ids based on a dictionary
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re, time
+from htmlmuncher import HtmlMuncher
+from sizetracker import SizeTracker
+from varfactory import VarFactory
+
+class NameStrategy(object):
+    """picks how names are assigned by how small the munched site is once it is gzipped
+
+    every generated name has the same length, so the alphabet names are built from and the
+    order they are handed out in never change the raw size, only how well the output
+    compresses. a sample of the site is munched with every candidate and gzipped in memory,
+    and the candidate with the smallest result wins. the default strategy is always measured
+    first, anything that does not fit in the time budget is skipped
+    """
+    # bytes of css, views and js munched for every candidate
+    sample_size = 2097152
+
+    # characters on each side of a renamed selector that count towards its surroundings
+    window = 8
+
+    token_pattern = re.compile(r'[\w-]+')
+
+    def __init__(self, muncher, budget = 10.0):
+        """constructor
+
+        Arguments:
+        muncher -- Muncher that has scanned the site
+        budget -- seconds to spend measuring candidates
+
+        Returns:
+        void
+
+        """
+        self.muncher = muncher
+        self.budget = budget
+        self.results = []
+
+    def getSample(self):
+        """reads the start of every css, view and js file until the sample is full
+
+        Returns:
+        list -- (type, contents) tuples
+
+        """
+        config = self.muncher.config
+        sources = [("css", config.css, config.css_extensions), ("html", config.views, [config.view_extension])]
+        if config.js_manifest is None:
+            sources.append(("js", config.js, config.js_extensions))
+
+        sample = []
+        remaining = NameStrategy.sample_size
+        for type, paths, extensions in sources:
+            for file, new_path in self.muncher.getFiles(paths, extensions):
+                if remaining <= 0:
+                    return sample
+                handle = open(file, "rb")
+                try:
+                    contents = handle.read(remaining)
+                finally:
+                    handle.close()
+                remaining -= len(contents)
+                sample.append((type, contents))
+        return sample
+
+    def munchSample(self, sample):
+        """munches the sample with the maps the muncher has right now
+
+        Arguments:
+        sample -- list of (type, contents) tuples
+
+        Returns:
+        string
+
+        """
+        # inline css pruned or merged here would be counted again when the files are munched for real
+        pruned_bytes = self.muncher.pruned_bytes
+        merged_bytes = self.muncher.merged_bytes
+        config = self.muncher.config
+        munched = []
+        # every file is munched the same way the run writes it, so the sizes compare what gets served
+        for type, contents in sample:
+            if type == "css":
+                munched.append(self.muncher.munchCss(contents, "sample"))
+            elif type == "html" and config.compress_html:
+                munched.append(HtmlMuncher(self.muncher, True, ()).munch(contents))
+            elif type == "html":
+                munched.append(self.muncher.munchHtml(contents))
+            else:
+                munched.append(self.muncher.replaceJavascript(contents, config.compress_js))
+        self.muncher.pruned_bytes = pruned_bytes
+        self.muncher.merged_bytes = merged_bytes
+        return "".join(munched)
+
+    @staticmethod
+    def getFrequencyAlphabet(counts):
+        """orders the symbols names are built from by how often they already appear
+
+        letters always come before digits so a name never starts with a digit
+
+        Arguments:
+        counts -- dictionary of character to count
+
+        Returns:
+        string
+
+        """
+        letters = [symbol for symbol in VarFactory.symbols if symbol.isalpha()]
+        digits = [symbol for symbol in VarFactory.symbols if symbol.isdigit()]
+        by_count = lambda symbol: (-counts.get(symbol, 0), VarFactory.symbols.index(symbol))
+        return "".join(sorted(letters, key = by_count) + sorted(digits, key = by_count))
+
+    def getCandidates(self, sample, munched):
+        """builds every strategy worth measuring from the site munched the default way
+
+        Arguments:
+        sample -- list of (type, contents) tuples
+        munched -- sample munched with the default names
+
+        Returns:
+        list -- (label, symbols, order) tuples, order is None to sort by raw savings
+
+        """
+        new_names = set([name[1:] for name in self.muncher.class_map.values()])
+        new_names.update([name[1:] for name in self.muncher.id_map.values()])
+
+        corpus_counts = {}
+        for character in munched:
+            corpus_counts[character] = corpus_counts.get(character, 0) + 1
+
+        # everything right around a renamed selector, without the selector itself
+        selector_counts = {}
+        for match in NameStrategy.token_pattern.finditer(munched):
+            if not match.group(0) in new_names:
+                continue
+            around = munched[max(match.start() - NameStrategy.window, 0):match.start()] + munched[match.end():match.end() + NameStrategy.window]
+            for character in around:
+                selector_counts[character] = selector_counts.get(character, 0) + 1
+
+        # names that first show up close together get names that are close together
+        order = {}
+        for type, contents in sample:
+            for match in NameStrategy.token_pattern.finditer(contents):
+                for name in ("." + match.group(0), "#" + match.group(0)):
+                    if not name in order and (name in self.muncher.class_counter or name in self.muncher.id_counter):
+                        order[name] = len(order)
+
+        corpus = NameStrategy.getFrequencyAlphabet(corpus_counts)
+        selectors = NameStrategy.getFrequencyAlphabet(selector_counts)
+        return [
+            ("corpus alphabet", corpus, None),
+            ("selector alphabet", selectors, None),
+            ("first appearance", VarFactory.symbols, order),
+            ("corpus alphabet, first appearance", corpus, order),
+            ("selector alphabet, first appearance", selectors, order)
+        ]
+
+    def choose(self, stable_classes, stable_ids):
+        """measures the candidates and leaves the muncher with the maps of the best one
+
+        Arguments:
+        stable_classes -- class names kept from the last run
+        stable_ids -- id names kept from the last run
+
+        Returns:
+        void
+
+        """
+        started = time.time()
+        self.muncher.assignNames(stable_classes, stable_ids)
+        sample = self.getSample()
+        if not len(sample):
+            return
+
+        munched = self.munchSample(sample)
+        self.results.append(("default", len(munched), SizeTracker.getGzipSize(munched)))
+        best = (self.results[0][2], None, None)
+
+        candidates = self.getCandidates(sample, munched)
+        for label, symbols, order in candidates:
+            if time.time() - started > self.budget:
+                self.muncher.output("name strategy ran out of time after " + str(len(self.results) - 1) + " of " + str(len(candidates)) + " candidates", False)
+                break
+
+            self.muncher.assignNames(stable_classes, stable_ids, symbols, order)
+            munched = self.munchSample(sample)
+            gzip_size = SizeTracker.getGzipSize(munched)
+            self.results.append((label, len(munched), gzip_size))
+            if gzip_size < best[0]:
+                best = (gzip_size, symbols, order)
+
+        self.muncher.assignNames(stable_classes, stable_ids, best[1], best[2])
+
+    def getReport(self):
+        """compares every measured strategy with the default one
+
+        Returns:
+        string
+
+        """
+        if not len(self.results):
+            return "\nname strategy: nothing to sample, kept the default names"
+
+        label, raw, gzip_size = self.results[0]
+        best = min(self.results, key = lambda result: (result[2], result[0] != "default"))
+        report = "\n%-38s %12s %12s" % ("name strategy", "raw bytes", "gzip bytes")
+        for result in self.results:
+            report += "\n%-38s %12d %12d" % result
+        report += "\n\nusing " + best[0] + ": " + str(raw - best[1]) + " bytes raw and " + str(gzip_size - best[2]) + " bytes gzipped saved on the sample over the default"
+        return report
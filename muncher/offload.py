@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, time, hashlib, threading, multiprocessing
+from multiprocessing.pool import ThreadPool
+from htmlmuncher import HtmlMuncher
+from muncher import Muncher
+from util import Util
+from mapcache import MapCache, StylesheetMap, StylesheetCopies
+
+def munchPage(config, html, css_paths):
+    """scans and munches a single page and its stylesheets
+
+    lives at module level so a process pool can pickle it. with config.map_cache_memory the
+    map of the stylesheets comes from the MapCache of this process and only the classes and
+    ids the page adds in its own inline blocks get names per request, the shortest ones the
+    page leaves free with config.scope_names
+
+    a stylesheet linked by pages with different maps is munched differently for each, so the
+    munched copies are named after what was written and the links of the page point at them.
+    copies are deleted again once their map is evicted, or without the map cache once
+    StylesheetCopies has newer sets to keep
+
+    Arguments:
+    config -- Config every page starts from
+    html -- rendered page
+    css_paths -- files on disk of every stylesheet the page links
+
+    Returns:
+    tuple -- (munched page, Muncher with its maps computed)
+
+    """
+    config = config.replace(css = list(css_paths), views = [])
+
+    # pruning depends on the page, so a pruned stylesheet can not be shared
+    if not config.map_cache_memory or config.prune_css:
+        page_muncher = Muncher(config)
+        page_muncher.processCss()
+        page_muncher.processViewSource(html)
+        page_muncher.processMaps()
+        tag, files = writeStylesheets(page_muncher, config.css)
+        StylesheetCopies.getInstance().add(files)
+        return HtmlMuncher(page_muncher, True, ("css",), tag).munch(html), page_muncher
+
+    stylesheet_map = MapCache.getInstance(config.map_cache_memory).get(config, css_paths, buildStylesheetMap)
+    tag = stylesheet_map.tag
+    if not all([os.path.exists(path) for path in stylesheet_map.files]):
+        # the copies are gone since the map was built, they come out the same
+        css_muncher = Muncher(config)
+        css_muncher.class_map = stylesheet_map.class_map
+        css_muncher.id_map = stylesheet_map.id_map
+        writeStylesheets(css_muncher, config.css)
+
+    page_muncher = Muncher(config)
+    page_muncher.processViewSource(html)
+    reserved = stylesheet_map.reserved
+    if config.scope_names:
+        # the short page names must not take a class or id the markup uses that nothing else knows
+        classes, ids = Muncher.getMarkupNames(html)
+        reserved = reserved | classes | ids
+    page_muncher.extendMaps(stylesheet_map.class_map, stylesheet_map.id_map, reserved)
+    return HtmlMuncher(page_muncher, True, ("css",), tag).munch(html), page_muncher
+
+def buildStylesheetMap(config, css_paths):
+    """scans and munches a set of stylesheets on their own
+
+    Arguments:
+    config -- Config with css set to the stylesheets
+    css_paths -- files on disk of every stylesheet
+
+    Returns:
+    StylesheetMap
+
+    """
+    css_muncher = Muncher(config)
+    css_muncher.processCss()
+    css_muncher.processMaps()
+    tag, files = writeStylesheets(css_muncher, config.css)
+
+    reserved = set(css_muncher.class_map.values()) | set(css_muncher.id_map.values())
+    reserved.update(css_muncher.class_counter)
+    reserved.update(css_muncher.id_counter)
+    return StylesheetMap(css_muncher.class_map, css_muncher.id_map, frozenset(reserved), tag, files)
+
+def writeStylesheets(css_muncher, css_paths):
+    """munches the stylesheets of a page into copies named after a hash of their contents
+
+    the same stylesheet munched with another map gets another name, so a page never links
+    a copy that was overwritten for a page with a different map
+
+    Arguments:
+    css_muncher -- Muncher with its maps computed
+    css_paths -- files on disk of every stylesheet the page links
+
+    Returns:
+    tuple -- (tag every copy is named {name}.{tag}.opt.css with, paths of the copies)
+
+    """
+    contents = [css_muncher.optimizeCss(path) for path in css_paths]
+    tag = hashlib.sha1("\0".join(contents)).hexdigest()[:12]
+    files = [Util.prependExtension(tag + ".opt", path) for path in css_paths]
+
+    writer = css_muncher.getWriter()
+    for path, css in zip(files, contents):
+        writer.write(path, css)
+    writer.close()
+    return tag, files
+
+def runJob(cancelled, function, args):
+    """runs a job on a worker unless it was cancelled while it was queued
+
+    errors are handed back instead of raised so the pool always calls back when a job is done
+
+    Returns:
+    tuple -- (result, None) or (None, error)
+
+    """
+    if cancelled is not None and cancelled.is_set():
+        return None, None
+    try:
+        return function(*args), None
+    except Exception, e:
+        return None, e
+
+class MunchJob(object):
+    """handle to a munch running on an Offloader"""
+    def __init__(self, result, cancelled):
+        self.result = result
+        self.cancelled = cancelled
+        self.is_cancelled = False
+
+    def ready(self):
+        return self.is_cancelled or self.result.ready()
+
+    def get(self, timeout = None):
+        """waits for the munched result, raises multiprocessing.TimeoutError when it is not done in time
+
+        Arguments:
+        timeout -- seconds to wait, forever if None
+
+        Returns:
+        mixed -- whatever the job returned, None if it was cancelled
+
+        """
+        if self.is_cancelled:
+            return None
+        result, error = self.result.get(timeout)
+        if error is not None:
+            raise error
+        return result
+
+    def cancel(self):
+        """gives up on the job
+
+        a queued job on a thread pool is never started, a job that is already running or
+        that runs in another process finishes on its own and the result is thrown away
+
+        Returns:
+        void
+
+        """
+        self.is_cancelled = True
+        if self.cancelled is not None:
+            self.cancelled.set()
+
+class Offloader(object):
+    """runs munching on a pool of threads or processes so the caller never blocks on it
+
+    munching is regex heavy and holds the gil, a thread pool keeps a cooperative server
+    (gevent, eventlet) responsive while pages are munched and a process pool munches
+    pages in parallel on every core
+    """
+    executors = ("thread", "process")
+
+    def __init__(self, executor = "thread", workers = None):
+        """constructor
+
+        Arguments:
+        executor -- thread or process
+        workers -- size of the pool, one per core if None
+
+        Returns:
+        void
+
+        """
+        if not executor in Offloader.executors:
+            raise ValueError("executor must be one of " + ", ".join(Offloader.executors))
+        self.executor = executor
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = None
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def getPool(self):
+        """starts the pool the first time it is needed, so a forking server forks before it
+
+        Returns:
+        Pool
+
+        """
+        with self.lock:
+            if self.pool is None:
+                if self.executor == "process":
+                    self.pool = multiprocessing.Pool(self.workers)
+                else:
+                    self.pool = ThreadPool(self.workers)
+        return self.pool
+
+    def submit(self, function, *args):
+        """queues a function on the pool
+
+        Arguments:
+        function -- module level function when the pool runs processes
+        args -- arguments to call it with
+
+        Returns:
+        MunchJob
+
+        """
+        # threads share memory so a cancelled job can be skipped before it starts
+        cancelled = threading.Event() if self.executor == "thread" else None
+        pool = self.getPool()
+        with self.lock:
+            self.pending += 1
+        result = pool.apply_async(runJob, (cancelled, function, args), callback = self.finishJob)
+        return MunchJob(result, cancelled)
+
+    def finishJob(self, result):
+        with self.lock:
+            self.pending -= 1
+
+    def getPending(self):
+        """gets how many jobs are queued or running, including ones nobody waits for anymore
+
+        Returns:
+        int
+
+        """
+        with self.lock:
+            return self.pending
+
+    def close(self):
+        """stops the pool, anything still running is abandoned
+
+        Returns:
+        void
+
+        """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
+                self.pending = 0
+
+class MunchedBody(object):
+    """wsgi response body that waits for a munch job
+
+    the server only starts iterating once the headers are out and calls close when the
+    response is done or the client went away, so a client that disconnects before its
+    page is munched cancels the job. with a timeout, a job that is not done in time is
+    cancelled and the page comes from the fallback instead. the headers are already out
+    when the job fails, so a failure is handed to error for a page to send instead of
+    breaking off the response
+    """
+    def __init__(self, job, finish, charset = "utf-8", timeout = None, fallback = None, error = None):
+        """constructor
+
+        Arguments:
+        job -- MunchJob munching the page
+        finish -- called with the job result, returns the page to send
+        charset -- encoding of the page
+        timeout -- seconds to wait for the job, forever if None
+        fallback -- called when the job ran out of time, returns the page to send
+        error -- called with the exception when munching failed, returns the page to send
+
+        Returns:
+        void
+
+        """
+        self.job = job
+        self.finish = finish
+        self.charset = charset
+        self.timeout = timeout
+        self.fallback = fallback
+        self.error = error
+
+    def __iter__(self):
+        try:
+            html = self.finish(self.job.get(self.timeout))
+        except multiprocessing.TimeoutError:
+            # the worker can not be stopped, it finishes on its own and the result is dropped
+            self.job.cancel()
+            html = self.fallback()
+        except Exception, e:
+            html = self.error(e)
+        if html is not None:
+            yield html.encode(self.charset)
+
+    def close(self):
+        if not self.job.ready():
+            self.job.cancel()
+
+class MunchMiddleware(object):
+    """wsgi middleware that munches every html response of an app on an Offloader
+
+    app.wsgi_app = MunchMiddleware(app.wsgi_app, config, root)
+    """
+    def __init__(self, app, config, root, offloader = None, budget = None):
+        """constructor
+
+        Arguments:
+        app -- wsgi app to wrap
+        config -- Config every page starts from
+        root -- directory stylesheet links are resolved against
+        offloader -- Offloader to munch on, a thread pool if None
+        budget -- MunchBudget pages are held to, no limits if None
+
+        Returns:
+        void
+
+        """
+        self.app = app
+        self.config = config
+        self.root = root
+        self.offloader = offloader or Offloader()
+        self.budget = budget
+
+    def __call__(self, environ, start_response):
+        captured = {}
+
+        def capture(status, headers, exc_info = None):
+            captured["status"] = status
+            captured["headers"] = headers
+            captured["exc_info"] = exc_info
+            return lambda data: captured.setdefault("written", []).append(data)
+
+        body = self.app(environ, capture)
+        headers = captured["headers"]
+        content_type = dict([(name.lower(), value) for name, value in headers]).get("content-type", "")
+        if not content_type.startswith("text/html"):
+            start_response(captured["status"], headers, captured["exc_info"])
+            return body
+
+        try:
+            html = "".join(captured.get("written", []) + list(body))
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+        charset = "utf-8"
+        if "charset=" in content_type:
+            charset = content_type.split("charset=")[1].split(";")[0].strip()
+        html = html.decode(charset)
+
+        # the munched page has a different length
+        headers = [(name, value) for name, value in headers if name.lower() != "content-length"]
+        start_response(captured["status"], headers, captured["exc_info"])
+
+        path = environ.get("PATH_INFO", "")
+        if self.budget is None:
+            job = self.offloader.submit(munchPage, self.config, html, MunchMiddleware.getCssPaths(self.root, html))
+            return MunchedBody(job, lambda result: None if result is None else result[0], charset, error = lambda e: html)
+
+        reason = self.budget.getSkipReason(html, self.offloader)
+        if reason is not None:
+            return [self.budget.fallback(path, html, reason).encode(charset)]
+
+        started = time.time()
+        job = self.offloader.submit(munchPage, self.config, html, MunchMiddleware.getCssPaths(self.root, html))
+
+        def finish(result):
+            self.budget.recordMunch(time.time() - started)
+            return None if result is None else result[0]
+
+        def fallback():
+            return self.budget.fallback(path, html, "time", time.time() - started)
+
+        def error(e):
+            return self.budget.fallback(path, html, "error", time.time() - started)
+
+        return MunchedBody(job, finish, charset, self.budget.max_time, fallback, error)
+
+    @staticmethod
+    def getCssPaths(root, html):
+        """gets the files on disk of every stylesheet a page links
+
+        Arguments:
+        root -- directory the links are resolved against
+        html -- rendered page
+
+        Returns:
+        list
+
+        """
+        paths = []
+        for href in HtmlMuncher.getStylesheetLinks(html):
+            path = os.path.normpath(os.path.join(root, href.lstrip('/')))
+            paths.append(path.encode('utf-8'))
+        return paths
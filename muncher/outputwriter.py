@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, stat, errno, hashlib, binascii, threading
+from multiprocessing.pool import ThreadPool
+
+class OutputWriter(object):
+    """writes munched files so a reader never sees half of one and unchanged files are left alone
+
+    a file is only written when its contents hash differently from what is already on disk,
+    so its mtime does not move and rsync or a cdn has nothing to pick up. new contents go to
+    a temp file next to the output that is then renamed over it. with threads, writes are
+    queued on a pool and Muncher waits for them at the end of every phase
+    """
+    block_size = 65536
+
+    def __init__(self, threads = 0):
+        """constructor
+
+        Arguments:
+        threads -- number of threads to write on, writes happen straight away if 0
+
+        Returns:
+        void
+
+        """
+        self.threads = threads
+        self.pool = None
+        self.pending = []
+        self.changed = []
+        self.unchanged = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def getDigest(path):
+        """hashes a file on disk a block at a time
+
+        Arguments:
+        path -- path to file
+
+        Returns:
+        string
+
+        """
+        digest = hashlib.sha1()
+        file = open(path, "rb")
+        try:
+            block = file.read(OutputWriter.block_size)
+            while block:
+                digest.update(block)
+                block = file.read(OutputWriter.block_size)
+        finally:
+            file.close()
+        return digest.digest()
+
+    @staticmethod
+    def isUnchanged(path, size, digest):
+        """determines if a file on disk already has the given contents
+
+        Arguments:
+        path -- path to file
+        size -- length of the new contents
+        digest -- sha1 of the new contents
+
+        Returns:
+        bool
+
+        """
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            return False
+        return OutputWriter.getDigest(path) == digest
+
+    def getTempPath(self, path):
+        """creates an empty temp file next to an output
+
+        it is created with the umask applied like any new file, so a new output gets the
+        usual permissions without the umask being read, which would change it for every thread
+
+        Arguments:
+        path -- output path
+
+        Returns:
+        string
+
+        """
+        directory, name = os.path.split(path)
+        while True:
+            temp_path = os.path.join(directory, "." + name + "." + binascii.hexlify(os.urandom(6)) + ".tmp")
+            try:
+                handle = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0666)
+            except OSError, e:
+                if e.errno == errno.EEXIST:
+                    continue
+                raise
+            os.close(handle)
+            return temp_path
+
+    def write(self, path, contents):
+        """writes contents to a file unless the file already has them
+
+        Arguments:
+        path -- path to file
+        contents -- new contents, unicode is written as utf-8
+
+        Returns:
+        void
+
+        """
+        if isinstance(contents, unicode):
+            contents = contents.encode("utf-8")
+
+        if not self.threads:
+            self.writeFile(path, contents)
+            return
+
+        if self.pool is None:
+            self.pool = ThreadPool(self.threads)
+        self.pending.append(self.pool.apply_async(self.writeFile, (path, contents)))
+
+    def writeFile(self, path, contents):
+        if OutputWriter.isUnchanged(path, len(contents), hashlib.sha1(contents).digest()):
+            self.addResult(path, False)
+            return
+
+        temp_path = self.getTempPath(path)
+        try:
+            file = open(temp_path, "wb")
+            try:
+                file.write(contents)
+            finally:
+                file.close()
+            self.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self.addResult(path, True)
+
+    def replace(self, temp_path, path):
+        """moves a file that was written somewhere else into place unless the output already
+        has the same contents
+
+        Arguments:
+        temp_path -- file with the new contents, made with OutputWriter.getTempPath
+        path -- output path
+
+        Returns:
+        void
+
+        """
+        if OutputWriter.isUnchanged(path, os.path.getsize(temp_path), OutputWriter.getDigest(temp_path)):
+            os.unlink(temp_path)
+            self.addResult(path, False)
+            return
+
+        self.rename(temp_path, path)
+        self.addResult(path, True)
+
+    def rename(self, temp_path, path):
+        # an output that is already there keeps its permissions
+        if os.path.exists(path):
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            # windows will not rename over an existing file
+            os.unlink(path)
+            os.rename(temp_path, path)
+
+    def addResult(self, path, changed):
+        with self.lock:
+            if changed:
+                self.changed.append(path)
+            else:
+                self.unchanged.append(path)
+
+    def finish(self):
+        """waits for every queued write, raising the first error one of them ran into
+
+        Returns:
+        void
+
+        """
+        pending = self.pending
+        self.pending = []
+        for result in pending:
+            result.get()
+
+    def close(self):
+        self.finish()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -13,7 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sys, os, gzip
+import sys, os, gzip, shutil
+from cStringIO import StringIO
 from util import Util
 
 class SizeTracker(object):
@@ -29,7 +30,7 @@ class SizeTracker(object):
         gzip_path = path + '.gz'
         f_in = open(path, 'rb')
         f_out = gzip.open(gzip_path, 'wb')
-        f_out.writelines(f_in)
+        shutil.copyfileobj(f_in, f_out)
         f_out.close()
         f_in.close()
 
@@ -45,6 +46,39 @@ class SizeTracker(object):
 
         Util.unlink(gzip_path)
 
+    @staticmethod
+    def reset():
+        """starts the totals over for a new run in the same process
+
+        Returns:
+        void
+
+        """
+        SizeTracker.original_size = 0
+        SizeTracker.original_size_gzip = 0
+        SizeTracker.new_size = 0
+        SizeTracker.new_size_gzip = 0
+
+    @staticmethod
+    def getGzipSize(contents):
+        """gzips contents in memory to get their compressed size
+
+        Arguments:
+        contents -- string to compress
+
+        Returns:
+        int
+
+        """
+        if isinstance(contents, unicode):
+            contents = contents.encode("utf-8")
+
+        buffer = StringIO()
+        f_out = gzip.GzipFile(fileobj = buffer, mode = 'wb', mtime = 0)
+        f_out.write(contents)
+        f_out.close()
+        return len(buffer.getvalue())
+
     @staticmethod
     def trackFile(path, new_path):
         SizeTracker.addSize(path)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, re, mmap
+
+class Streamer(object):
+    """reads huge files through mmap in bounded windows so only a window's worth is ever in memory
+
+    every window is cut at a boundary chosen by a callback so nothing a regex or replace
+    has to see in one piece is split across two windows. a window the callback finds
+    nowhere to cut in is grown with the next one, up to max_windows windows, after that the
+    callback has to cut it anyway so no chunk is ever much bigger than max_windows windows
+    """
+    # how many windows a chunk can grow to before it is cut wherever the callback can
+    max_windows = 4
+
+    # how far a forced cut may back off to keep a name or call whole, so a chunk never carries much over
+    max_token = 1024
+
+    @staticmethod
+    def getChunks(path, window_size, boundary):
+        """yields the contents of a file one window at a time
+
+        Arguments:
+        path -- path to file on disk
+        window_size -- number of bytes to read per window
+        boundary -- function that takes a window and whether it has to be cut and returns the
+                    position to cut it at, anything after that is carried over to the next window
+
+        Returns:
+        generator
+
+        """
+        size = os.path.getsize(path)
+        if size == 0:
+            return
+
+        file = open(path, "rb")
+        try:
+            carry = ""
+            position = 0
+            while position < size:
+                chunk = carry + Streamer.readWindow(file, size, position, window_size)
+                position = position + window_size
+                if position >= size:
+                    carry = ""
+                    yield chunk
+                    break
+
+                cut = boundary(chunk, len(chunk) >= window_size * Streamer.max_windows)
+
+                # no safe place to cut so keep reading until there is one
+                if cut <= 0:
+                    carry = chunk
+                    continue
+
+                carry = chunk[cut:]
+                yield chunk[:cut]
+        finally:
+            file.close()
+
+    @staticmethod
+    def readWindow(file, size, position, window_size):
+        """maps a single window of a file and copies it out
+
+        the pages of a mapping count towards resident memory until it is closed, so mapping
+        the whole file would grow memory by the file size as it is read
+
+        Arguments:
+        file -- open file
+        size -- size of the file
+        position -- where the window starts
+        window_size -- number of bytes to read
+
+        Returns:
+        string
+
+        """
+        offset = position - position % mmap.ALLOCATIONGRANULARITY
+        length = min(position + window_size, size) - offset
+        contents = mmap.mmap(file.fileno(), length, access = mmap.ACCESS_READ, offset = offset)
+        try:
+            return contents[position - offset:]
+        finally:
+            contents.close()
+
+    @staticmethod
+    def rewrite(path, new_path, callback, window_size, boundary):
+        """runs a file through a callback one window at a time and streams the result to disk
+
+        Arguments:
+        path -- path to file on disk
+        new_path -- path to write the result to
+        callback -- function that takes a window and returns the new contents for it
+        window_size -- number of bytes to read per window
+        boundary -- see Streamer.getChunks
+
+        Returns:
+        void
+
+        """
+        out = open(new_path, "wb")
+        try:
+            for chunk in Streamer.getChunks(path, window_size, boundary):
+                out.write(callback(chunk))
+        finally:
+            out.close()
+
+    @staticmethod
+    def cssBoundary(chunk, force = False):
+        """cuts css after the last } or ; so no selector, declaration or #id lookbehind is split
+
+        Arguments:
+        chunk -- window of css
+        force -- cut even without a } or ;, in front of the last name and the : before it
+
+        Returns:
+        int
+
+        """
+        cut = max(chunk.rfind("}"), chunk.rfind(";")) + 1
+        if cut > 0 or not force:
+            return cut
+
+        cut = re.search(r'[:\s]*[\w\-#.]*$', chunk).start()
+        return cut if len(chunk) - cut <= Streamer.max_token else len(chunk)
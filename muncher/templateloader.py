@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from jinja2 import BaseLoader
+
+class MunchLoader(BaseLoader):
+    """jinja loader that munches template source once, when jinja loads and caches the template
+
+    wraps any other loader. {{ }}, {% %} and {# #} are set aside before munching and put back
+    after so expressions are never touched, only the static class/id attributes, inline
+    <style> and inline <script> in the template text
+    """
+
+    # jinja syntax that has to come through untouched
+    jinja_pattern = re.compile(r'\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\}', re.DOTALL)
+
+    # local stylesheet and script references that have a munched .opt copy
+    link_pattern = re.compile(r'((?:href|src)\s*=\s*[\'"](?![a-z]+:|//)[^\'"]*?)\.(css|js)([\'"\?#])', re.IGNORECASE)
+
+    # the same inside url_for('static', filename='...') expressions
+    url_for_pattern = re.compile(r'(filename\s*=\s*[\'"][^\'"]*?)\.(css|js)([\'"])', re.IGNORECASE)
+
+    def __init__(self, loader, muncher, extensions = ("css",)):
+        """constructor
+
+        Arguments:
+        loader -- jinja loader to get the original source from
+        muncher -- Muncher that has already computed its class and id maps
+        extensions -- which linked files should be pointed at their .opt copies
+
+        Returns:
+        void
+
+        """
+        self.loader = loader
+        self.muncher = muncher
+        self.extensions = extensions
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = self.loader.get_source(environment, template)
+        return self.munchSource(source), filename, uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+    def munchSource(self, source):
+        """munches a single template
+
+        Arguments:
+        source -- template source
+
+        Returns:
+        string
+
+        """
+        expressions = []
+
+        def hide(match):
+            expressions.append(match.group(0))
+            return "\x00" + str(len(expressions) - 1) + "\x00"
+
+        def link(match):
+            if match.group(2).lower() not in self.extensions or match.group(1).endswith(".opt"):
+                return match.group(0)
+            return match.group(1) + ".opt." + match.group(2) + match.group(3)
+
+        def restore(match):
+            return self.url_for_pattern.sub(link, expressions[int(match.group(1))])
+
+        source = self.jinja_pattern.sub(hide, source)
+        source = self.muncher.munchHtml(source)
+        source = self.link_pattern.sub(link, source)
+        return re.sub(r'\x00(\d+)\x00', restore, source)
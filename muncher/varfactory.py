@@ -13,27 +13,52 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import math
-from array import array
+import math, threading
 
 class VarFactory:
     """class to keep multiple counters and turn numeric counters into alphabetical ones"""
-    types = {}
+    # every thread gets its own counters so pages can be munched concurrently
+    counters = threading.local()
     letters = map(chr, range(97, 123))
+    # names are built from these in this order unless another alphabet is given
+    symbols = "abcdefghijklmnopqrstuvwxyz0123456789"
 
     @staticmethod
-    def getNext(type):
+    def reset():
+        """resets all counters so the same input always maps to the same names
+
+        Returns:
+        void
+
+        """
+        VarFactory.counters.types = {}
+
+    @staticmethod
+    def getTypes():
+        """gets the counters of the current thread
+
+        Returns:
+        dict
+
+        """
+        if not hasattr(VarFactory.counters, "types"):
+            VarFactory.counters.types = {}
+        return VarFactory.counters.types
+
+    @staticmethod
+    def getNext(type, symbols = None):
         """gets the next letter name based on counter name
 
         Arguments:
         type -- name of counter we want the next value for
+        symbols -- alphabet to build the name from, VarFactory.symbols if None
 
         Returns:
         string
 
         """
         i = VarFactory.getVersion(type)
-        return VarFactory.getSmallName(i)
+        return VarFactory.getSmallName(i, symbols)
 
     @staticmethod
     def getVersion(type):
@@ -46,27 +71,60 @@ class VarFactory:
         int
 
         """
-        if not type in VarFactory.types:
-            VarFactory.types[type] = 0
+        types = VarFactory.getTypes()
+        if not type in types:
+            types[type] = 0
             return 0
 
-        VarFactory.types[type] += 1
+        types[type] += 1
 
-        return VarFactory.types[type]
+        return types[type]
 
     @staticmethod
-    def getSmallName(index):
+    def getSmallName(index, symbols = None):
         """gets a letter index based on the numeric index
 
         Arguments:
         index -- the number you are looking for
+        symbols -- alphabet to build the name from, VarFactory.symbols if None
 
         Returns:
         string
 
         """
-        #print index,'$'
-        symbols = array('c', ["a", "b", "c", "d", "e", "f", "g", "h",
-        "i", "j", "k", "l", "m", "n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9"])
+        if symbols is None:
+            symbols = VarFactory.symbols
 
         return symbols[index / (len(symbols) * len(symbols))] + symbols[(index / len(symbols)) % len(symbols)]+symbols[index % len(symbols)]
+
+    @staticmethod
+    def getShortName(index, symbols = None):
+        """gets a name by its numeric index, counting up from a single character
+
+        the first name of every length starts with a letter since a class or id can not
+        start with a digit
+
+        Arguments:
+        index -- the number you are looking for
+        symbols -- alphabet to build the name from, VarFactory.symbols if None
+
+        Returns:
+        string
+
+        """
+        if symbols is None:
+            symbols = VarFactory.symbols
+
+        first = [symbol for symbol in symbols if not symbol.isdigit()]
+        count = len(first)
+        length = 1
+        while index >= count:
+            index -= count
+            count *= len(symbols)
+            length += 1
+
+        name = ""
+        for i in range(length - 1):
+            name = symbols[index % len(symbols)] + name
+            index /= len(symbols)
+        return first[index] + name
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Copyright 2011 Craig Campbell
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from htmlmuncher import HtmlMuncher
+
+class ViewSegment(object):
+    """a piece of a view: markup, the contents of a <style> block or the contents of a <script> block
+
+    the <style> and <script> tags themselves belong to the markup around them, so joining
+    every segment back together gives the original view
+    """
+    MARKUP = "markup"
+    STYLE = "style"
+    SCRIPT = "script"
+
+    def __init__(self, type, start, end, text):
+        """constructor
+
+        Arguments:
+        type -- ViewSegment.MARKUP, ViewSegment.STYLE or ViewSegment.SCRIPT
+        start -- offset of the segment in the view
+        end -- offset just past the segment
+        text -- contents of the segment
+
+        Returns:
+        void
+
+        """
+        self.type = type
+        self.start = start
+        self.end = end
+        self.text = text
+
+
+class ViewParser(object):
+    """splits a view into segments in a single pass"""
+
+    # comments are matched so a commented out block is left as markup
+    block_pattern = re.compile(r'<!--.*?-->|<(style|script)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', re.DOTALL | re.IGNORECASE)
+
+    @staticmethod
+    def parse(html):
+        """splits a view into markup, style and script segments
+
+        only scripts that hold javascript get a segment of their own, anything like a
+        <script type="text/template"> stays markup
+
+        Arguments:
+        html -- contents of view
+
+        Returns:
+        list -- ViewSegment objects in document order
+
+        """
+        segments = []
+        markup_start = 0
+        position = 0
+        length = len(html)
+
+        while position < length:
+            match = ViewParser.block_pattern.search(html, position)
+            if match is None:
+                break
+
+            position = match.end()
+            if match.group(1) is None:
+                continue
+
+            tag = match.group(1).lower()
+            end = HtmlMuncher.raw_end_patterns[tag].search(html, position)
+            end_position = length if end is None else end.start()
+
+            attributes = HtmlMuncher.getAttributes(match.group(2))
+            is_block = tag == "style" or (attributes.get("type", "").lower() in HtmlMuncher.js_types and not "src" in attributes)
+
+            if is_block and end_position > position:
+                segments.append(ViewSegment(ViewSegment.MARKUP, markup_start, position, html[markup_start:position]))
+                segment_type = ViewSegment.STYLE if tag == "style" else ViewSegment.SCRIPT
+                segments.append(ViewSegment(segment_type, position, end_position, html[position:end_position]))
+                markup_start = end_position
+
+            position = end_position
+
+        if markup_start < length or not len(segments):
+            segments.append(ViewSegment(ViewSegment.MARKUP, markup_start, length, html[markup_start:]))
+
+        return segments
+
+    @staticmethod
+    def getText(segments, type):
+        """joins the text of every segment of one type
+
+        Arguments:
+        segments -- list of ViewSegment objects
+        type -- segment type to join
+
+        Returns:
+        string
+
+        """
+        return "".join([segment.text for segment in segments if segment.type == type])
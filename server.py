@@ -1,105 +1,30 @@
 ################################################################################
 #   Libraries                                                                  #
 ################################################################################
-import os, time, codecs, hashlib
-################################################################################
-from bs4 import BeautifulSoup
+import os
 ################################################################################
 from flask import Flask, flash, redirect, render_template, request, session, abort, url_for
 ################################################################################
-from htmlmin.main import minify
-################################################################################
-from muncher.config import Config
-################################################################################
-from muncher.muncher import Muncher
-
-################################################################################
-#   Encrypt_String                                                             #
-################################################################################
-
-def encrypt_string(hash_string):
-    sha_signature = \
-        hashlib.sha256(hash_string.encode()).hexdigest()
-    return sha_signature
+from muncher.extension import Muncher, munch
 
 ################################################################################
 #   App                                                                        #
 ################################################################################
 
 app = Flask(__name__)
+#Inline the css each view needs and load the full stylesheets asynchronously
+app.config['MUNCHER_CRITICAL_CSS'] = False
+#Serve every linked stylesheet of a page as a single munched bundle
+app.config['MUNCHER_CSS_BUNDLE'] = False
+#Munch the templates once when jinja loads them instead of every response
+app.config['MUNCHER_TEMPLATES'] = False
 
 ################################################################################
 #   Minify and Muncher "Rendering" HTML                                        #
 ################################################################################
 
-@app.after_request
-def response_minify(response):
-    """
-    minify and muncher html
-    """
-    if response.content_type == u'text/html; charset=utf-8':
-        template = None
-        if str(request.path)=='/view1' or str(request.path)=='/view2' :
-            #Extractor of CSS Links
-            soup = BeautifulSoup(response.get_data(as_text=True),features='html.parser')
-            cssGroupLinks = ''
-            #Find the lines with the word 'link'
-            for link in soup.find_all('link'):
-                #If you find the substring 'CSS' in it then ..
-                if 'css' in link.get('href'):
-                    #Get the link
-                    link_css = link.get('href')
-                    #Get file fullpath
-                    file_fpath = str(os.getcwd())+link_css.replace('/','\\')
-                    #Generate a custom concatenate for Muncher
-                    if cssGroupLinks == '':
-                        cssGroupLinks = file_fpath
-                    else:
-                        cssGroupLinks = cssGroupLinks + ',' + file_fpath
-
-            #Name of the file encrypted with the unix time and the ip address of the browser
-            file_tmp = encrypt_string(str(time.time()) + request.remote_addr)
-            #Html Compressor
-            compress_site = minify(response.get_data(as_text=True))
-            #Search and replace the css original with the new compiled.
-            compress_site = compress_site.replace('.css', '.opt.css')
-            #Deposit tmp file for Muncher
-            temp_html_file = open("tmp/"+file_tmp+".html","w")
-            temp_html_file.write(compress_site)
-            temp_html_file.close()
-
-            #Get files fullpath
-            template = str(os.getcwd())+'\\tmp\\'+file_tmp+".html"
-            template_compiled = str(os.getcwd())+'\\tmp\\'+file_tmp+".opt.html"
-
-            #Add array for Muncher
-            list = []
-            list.append(('--css', cssGroupLinks.encode('UTF8')))
-            list.append(('--html',template))
-
-            #Run Muncher...
-            config = Config()
-            config.processArgs(list)
-            muncher = Muncher(config)
-            muncher.run()
-
-            #Open Result with BeautifulSoup
-            f=codecs.open(template_compiled, 'r', 'utf-8')
-            #Load in a tmp_compiled
-            tmp_compiled = BeautifulSoup(f.read())
-
-            #Show Minify and Muncher Site!
-            response.set_data(
-                tmp_compiled
-            )
-
-        else:
-            response.set_data(
-                minify(response.get_data(as_text=True))
-            )
-
-        return response
-    return response
+#Routes decorated with @munch are minified and munched after every request
+muncher = Muncher(app)
 
 ################################################################################
 #   Route Index                                                                #
@@ -117,6 +42,7 @@ def home():
 ################################################################################
 
 @app.route('/view1')
+@munch
 def view1():
     return render_template('view1.html')
 
@@ -125,6 +51,7 @@ def view1():
 ################################################################################
 
 @app.route('/view2')
+@munch
 def view2():
     return render_template('view2.html')
 
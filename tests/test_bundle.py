@@ -0,0 +1,51 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.util import Util
+
+class BundleTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, "css", "sub"))
+        config = Config()
+        config.quiet = True
+        self.muncher = Muncher(config)
+        self.muncher.class_map = {".box": ".aaa", ".item": ".aab"}
+        self.muncher.id_map = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.dir, name)
+        Util.filePutContents(path, contents)
+        return path
+
+    def testImportsAreInlinedAndUrlsRebased(self):
+        site = self.write("css/site.css", '@charset "utf-8";\n@import url("sub/base.css") print;\n@import "//cdn/x.css";\n'
+            '@import "site.css";\n.box{background:url(img/a.png)}\n')
+        self.write("css/sub/base.css", '@import "../site.css";\n.item{background:url("b.png")}\n')
+
+        name, css = self.muncher.getCssBundle([site], os.path.join(self.dir, "bundles"))
+
+        # remote imports go first, cycles back to site.css are skipped and @charset is dropped
+        self.assertEqual('@import "//cdn/x.css";\n\n@media print{\n\n\n.aab{background:url("../css/sub/b.png")}\n}\n\n\n\n'
+            '.aaa{background:url(../css/img/a.png)}\n', css)
+        self.assertTrue(name.startswith("bundle.") and name.endswith(".css"))
+
+    def testNameFollowsContents(self):
+        first = self.write("css/a.css", ".box{color:red}")
+        second = self.write("css/b.css", ".item{color:blue}")
+        bundle_dir = os.path.join(self.dir, "bundles")
+
+        name, css = self.muncher.getCssBundle([first, second], bundle_dir)
+        self.assertEqual(".aaa{color:red}\n.aab{color:blue}", css)
+        self.assertEqual(name, self.muncher.getCssBundle([first, second], bundle_dir)[0])
+        self.assertNotEqual(name, self.muncher.getCssBundle([second, first], bundle_dir)[0])
+
+    def testDataAndAbsoluteUrlsAreKept(self):
+        css = "a{background:url(data:image/png;base64,xx)}b{background:url('/img/x.png')}i{background:url(#f)}"
+        self.assertEqual(css, Muncher.rebaseUrls(css, "/site/css", "/site/bundles"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.census import Census
+from muncher.util import Util
+
+class CensusTest(unittest.TestCase):
+    shards = {
+        "a": {
+            "site.css": ".header{color:red}.nav .item{margin:0}#main{padding:0}.shared{color:blue}",
+            "view.html": '<div id="main" class="header shared"><ul class="nav"><li class="item">x</li></ul></div>',
+            "app.js": 'document.getElementById("main");$(".item").hide();'
+        },
+        "b": {
+            "site.css": ".footer{color:red}.item,.shared{margin:1px}#sidebar{float:left}.item .item{color:green}",
+            "view.html": '<div id="sidebar" class="footer item"><p class="shared">x</p></div>',
+            "app.js": '$("#sidebar .footer").show();'
+        }
+    }
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for shard, files in self.shards.items():
+            os.makedirs(os.path.join(self.dir, shard))
+            for name, contents in files.items():
+                Util.filePutContents(self.getPath(shard, name), contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def getPath(self, shard, name):
+        return os.path.join(self.dir, shard, name)
+
+    def munch(self, options):
+        config = Config()
+        config.quiet = True
+        for key, value in options:
+            config.setOption(key, value)
+        muncher = Muncher(config)
+        muncher.run()
+        return muncher
+
+    def getFiles(self, shard):
+        return [self.getPath(shard, name) for name in ("site.css", "view.html", "app.js")]
+
+    def getOutput(self):
+        output = {}
+        for shard in self.shards:
+            for path in self.getFiles(shard):
+                output[path] = Util.fileGetContents(Util.prependExtension("opt", path))
+        return output
+
+    def testMergedCensusMatchesSingleRun(self):
+        css, views, js = [",".join(paths) for paths in zip(self.getFiles("a"), self.getFiles("b"))]
+        single = self.munch((("--css", css), ("--html", views), ("--js", js)))
+        expected = self.getOutput()
+
+        census = []
+        for shard in sorted(self.shards):
+            census.append(os.path.join(self.dir, shard + ".census"))
+            css, views, js = self.getFiles(shard)
+            self.munch((("--css", css), ("--html", views), ("--js", js), ("--export-census", census[-1])))
+
+        map_path = os.path.join(self.dir, "map.json")
+        self.munch((("--merge-census", ",".join(census)), ("--export-map", map_path)))
+        self.assertEqual((single.class_map, single.id_map), Census.readMaps(map_path))
+
+        for shard in self.shards:
+            css, views, js = self.getFiles(shard)
+            self.munch((("--css", css), ("--html", views), ("--js", js), ("--import-map", map_path)))
+
+        self.assertEqual(expected, self.getOutput())
+
+    def testCensusFileRoundTrip(self):
+        css, views, js = self.getFiles("a")
+        path = os.path.join(self.dir, "a.census")
+        scanned = self.munch((("--css", css), ("--html", views), ("--js", js), ("--export-census", path)))
+
+        config = Config()
+        config.quiet = True
+        loaded = Muncher(config)
+        Census.load(loaded, [path, path])
+        self.assertEqual(scanned.used_classes, loaded.used_classes)
+        self.assertEqual(scanned.used_ids, loaded.used_ids)
+        self.assertEqual(set(scanned.class_counter), set(loaded.class_counter))
+        for name, savings in scanned.class_counter.items():
+            self.assertEqual(savings * 2, loaded.class_counter[name])
+        for name, savings in scanned.id_counter.items():
+            self.assertEqual(savings * 2, loaded.id_counter[name])
+
+if __name__ == "__main__":
+    unittest.main()
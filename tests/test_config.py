@@ -0,0 +1,62 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config, ConfigError
+
+class ConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def getConfig(self):
+        config = Config()
+        for option in (("--css", "a.css,b"), ("--html", "views"), ("--js", "c.js"), ("--ignore", ".x"), ("--js-ext", "js")):
+            config.setOption(*option)
+        return config
+
+    def testFreezeLeavesNothingMutable(self):
+        config = self.getConfig().freeze()
+        self.assertEqual(("a.css", "b"), config.css)
+        self.assertEqual(("views",), config.views)
+        self.assertEqual(("c.js",), config.js)
+        self.assertEqual((".*", "node_modules"), config.ignore_paths)
+        self.assertEqual((), config.merge_census)
+        self.assertEqual(("js",), config.js_extensions)
+        self.assertEqual(frozenset([".x"]), config.ignore)
+
+        self.assertRaises(ConfigError, setattr, config, "css", ["d.css"])
+        self.assertRaises(ConfigError, config.setOption, "--css", "d.css")
+        self.assertFalse(hasattr(config.css, "append"))
+
+    def testReplaceMakesAFrozenCopy(self):
+        config = self.getConfig().freeze()
+        changed = config.replace(css = ["d.css"], compress_js = True)
+        self.assertEqual(("d.css",), changed.css)
+        self.assertTrue(changed.frozen and changed.compress_js)
+        self.assertEqual(("a.css", "b"), config.css)
+        self.assertFalse(config.compress_js)
+        self.assertRaises(ConfigError, config.replace, nothing = True)
+
+    def testLoad(self):
+        path = os.path.join(self.dir, "munch.json")
+        open(path, "w").write('{"css": ["css"], "html": "views,more", "compress-js": true, "framework": "jquery"}')
+        config = Config.load(path)
+        self.assertEqual(("css",), config.css)
+        self.assertEqual(("views", "more"), config.views)
+        self.assertTrue(config.compress_js)
+        self.assertTrue("$" in config.custom_selectors)
+
+    def testInvalidSettingsRaise(self):
+        path = os.path.join(self.dir, "munch.json")
+        for contents in ('{"nothing": 1}', '{"compress-js": "yes"}', '[1]', '{'):
+            open(path, "w").write(contents)
+            self.assertRaises(ConfigError, Config.load, path)
+        self.assertRaises(ConfigError, Config.load, os.path.join(self.dir, "missing.json"))
+
+        config = Config()
+        config.setOption("--stream-window", "0")
+        self.assertRaises(ConfigError, config.freeze)
+        self.assertRaises(ConfigError, Config().setOption, "--max-memory", "lots")
+
+if __name__ == "__main__":
+    unittest.main()
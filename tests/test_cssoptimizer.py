@@ -0,0 +1,41 @@
+import unittest
+from muncher.cssoptimizer import CssOptimizer
+
+class CssOptimizerTest(unittest.TestCase):
+    def assertOptimized(self, expected, css):
+        self.assertEqual(expected, CssOptimizer.optimize(css))
+
+    def testRepeatedSelectorsAreFolded(self):
+        self.assertOptimized('.a{color:red;padding:0}.b{margin:0}', '.a{color:red}.b{margin:0}.a{padding:0}')
+        self.assertOptimized('.a,  .b{color:red;top:0}.b,.a{margin:0}', '.a,  .b{color:red}.b,.a{margin:0}.a, .b{top:0}')
+        self.assertOptimized('.a{color:red}@media print{.b{color:red;margin:0}}.a{margin:0}',
+            '.a{color:red}@media print{.b{color:red}.b{margin:0}}.a{margin:0}')
+
+    def testFoldingNeverChangesTheCascade(self):
+        # a rule in between sets the same property, a shorthand of it or one sharing a shorthand
+        for css in ('.a{color:red}.b{color:blue}.a{color:green}', '.a{margin-top:0}.b{margin:1px}.a{margin-left:0}',
+                '.a{line-height:1}.b{font:12px serif}.a{font-size:2px}', '.a{left:0}.b{inset:1px}.a{top:0}',
+                '.a{color:red}.b{-webkit-margin-start:0}.a{margin:0}', '.a{color:red}.b{all:unset}.a{margin:0}',
+                '.a{color:red/*x*/}.a{margin:0}', '.a{color:red}@media print{.b{margin:0}}.a{margin:0}'):
+            self.assertOptimized(css, css)
+
+    def testRepeatedDeclarations(self):
+        self.assertOptimized('.a{margin:0;color:red}', '.a{color:red;margin:0;color:red}')
+        self.assertOptimized('.a{margin:0;color:red;}', '.a{color : red;margin:0;color:red;}')
+
+        # the same property with another value is a fallback
+        self.assertOptimized('.a{display:block;display:flex}', '.a{display:block;display:flex}')
+
+    def testIdenticalBlocksAreJoined(self):
+        self.assertOptimized('.a,.b{color:red}', '.a{color:red}.b{color:red}')
+        self.assertOptimized('.a:hover,.b{color:red}', '.a:hover{color:red}.b{color:red}')
+        self.assertOptimized('input[value="::x"],.b{color:red}', 'input[value="::x"]{color:red}.b{color:red}')
+        self.assertOptimized('.a{color:red}.c,.a{margin:0}', '.a{color:red}.c{margin:0}.a{margin:0}')
+
+        # one selector a browser does not know would drop the other as well
+        for css in ('.a::selection{color:red}.b{color:red}', '.a:focus-visible{color:red}.b{color:red}',
+                '.a{margin:0;padding:0}.b{padding:0;margin:0}', '.a{color:red}.c{margin:0}.b{color:red}'):
+            self.assertOptimized(css, css)
+
+if __name__ == "__main__":
+    unittest.main()
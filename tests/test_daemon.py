@@ -0,0 +1,48 @@
+import os, json, stat, shutil, tempfile, threading, time, unittest
+from muncher.client import MunchClient
+from muncher.daemon import MunchDaemon
+
+class MunchDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "munch.sock")
+        self.daemon = MunchDaemon(self.path)
+        self.thread = threading.Thread(target = self.daemon.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        while not os.path.exists(self.path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        list(MunchClient(self.path).submit([{"command": "stop"}]))
+        self.thread.join(5)
+        shutil.rmtree(self.dir)
+
+    def submit(self, job):
+        return [message for message in MunchClient(self.path).submit([job]) if "status" in message][0]
+
+    def testSocketIsPrivate(self):
+        self.assertEqual(0600, stat.S_IMODE(os.stat(self.path).st_mode))
+        self.assertEqual(["munch.sock"], os.listdir(self.dir))
+
+    def testSourcesAreMunchedTogether(self):
+        sources = [{"name": "a.css", "type": "css", "contents": ".box{color:red}"},
+            {"name": "a.html", "type": "html", "contents": '<p class="box">x</p>'}]
+        result = self.submit({"id": 1, "args": [], "sources": sources})
+        self.assertEqual("ok", result["status"])
+        self.assertEqual([".aaa{color:red}", '<p class="aaa">x</p>'], [source["contents"] for source in result["sources"]])
+
+    def testJobsCanNotStartADaemonOrUseClientOptions(self):
+        config = os.path.join(self.dir, "munch.json")
+        open(config, "w").write(json.dumps({"html": "views", "daemon": os.path.join(self.dir, "other.sock")}))
+        for args in (["--daemon", os.path.join(self.dir, "other.sock")], ["--help"], ["--socket", self.path],
+                ["--stop"], ["--config", config]):
+            result = self.submit({"id": 1, "args": args, "sources": []})
+            self.assertEqual("error", result["status"], args)
+            self.assertFalse("traceback" in result)
+
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "other.sock")))
+        self.assertEqual("ok", self.submit({"id": 2, "args": [], "sources": []})["status"])
+
+if __name__ == "__main__":
+    unittest.main()
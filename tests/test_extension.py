@@ -0,0 +1,86 @@
+import os, shutil, tempfile, unittest
+from flask import Flask, Blueprint, render_template_string
+from muncher.extension import Muncher, munch
+from muncher.mapcache import MapCache, StylesheetCopies
+
+class ExtensionTest(unittest.TestCase):
+    page = ('<html><head><link href="/static/site.css" rel="stylesheet"></head>'
+        '<body><p class="title">{{ id }}</p></body></html>')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, "static"))
+        open(os.path.join(self.dir, "static", "site.css"), "w").write(".title{color:red}.footer{color:blue}")
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+        self.app = Flask(__name__, root_path = self.dir, static_folder = os.path.join(self.dir, "static"))
+        self.app.config['MUNCHER_ALL_ROUTES'] = True
+        self.app.config['MUNCHER_CRITICAL_CSS'] = True
+        self.app.config['MUNCHER_CACHE_SIZE'] = 2
+        self.muncher = Muncher(self.app)
+
+        @self.app.route('/post/<int:id>')
+        def post(id):
+            return render_template_string(self.page, id = id)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+    def testCriticalCssIsSharedByEveryUrlOfARoute(self):
+        client = self.app.test_client()
+        pages = [client.get('/post/%d' % id).data for id in range(3)]
+
+        self.assertEqual(1, len(self.muncher.critical_css_cache))
+        self.assertEqual('post', self.muncher.critical_css_cache.keys()[0][0])
+        for page in pages:
+            self.assertTrue('<style>' in page and 'color:blue' not in page.split('</style>')[0])
+
+    def testCacheDropsOnlyTheLeastRecentlyUsedEntry(self):
+        cache = self.muncher.critical_css_cache
+        built = []
+
+        def get(key):
+            return self.muncher.getCached(cache, key, lambda: built.append(key) or key)
+
+        for key in ("a", "b", "a", "c", "a", "b"):
+            get(key)
+
+        self.assertEqual(["a", "b", "c", "b"], built)
+        self.assertEqual(["a", "b"], cache.keys())
+
+    def testOnlyOptedInRoutesAreMunched(self):
+        app = Flask(__name__, root_path = self.dir, static_folder = os.path.join(self.dir, "static"))
+        Muncher(app).enableBlueprint('admin')
+        admin = Blueprint('admin', __name__)
+
+        @app.route('/plain')
+        def plain():
+            return render_template_string(self.page, id = 1)
+
+        @app.route('/munched')
+        @munch
+        def munched():
+            return render_template_string(self.page, id = 1)
+
+        @app.route('/text')
+        @munch
+        def text():
+            return render_template_string(self.page, id = 1), 200, {'Content-Type': 'text/plain'}
+
+        @admin.route('/admin')
+        def dashboard():
+            return render_template_string(self.page, id = 1)
+
+        app.register_blueprint(admin)
+        client = app.test_client()
+        self.assertEqual(client.get('/plain').data, client.get('/text').data)
+        self.assertTrue('class="title"' in client.get('/plain').data)
+        self.assertTrue('class="title"' not in client.get('/munched').data)
+        self.assertTrue('class="title"' not in client.get('/admin').data)
+        self.assertEqual(client.get('/munched').data, client.get('/admin').data)
+
+if __name__ == "__main__":
+    unittest.main()
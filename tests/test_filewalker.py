@@ -0,0 +1,43 @@
+import os, shutil, tempfile, unittest
+from muncher.filewalker import FileWalker
+
+class FileWalkerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for path in ("a.css", "b/c.css", "b/d.js", ".git/e.css", "node_modules/f/g.css", "build/h.css", "lib/build/i.css"):
+            path = os.path.join(self.dir, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def getRelative(self, walker, path = None):
+        return [relative for path, relative in walker.walk(path or self.dir)]
+
+    def testIgnoreGlobsMatchNamesAndRelativePaths(self):
+        self.assertEqual(["a.css", "b/c.css", "b/d.js", "build/h.css", "lib/build/i.css"], self.getRelative(FileWalker()))
+
+        # a name glob skips the directory wherever it is, a path glob only where it matches
+        self.assertEqual(["a.css", "b/c.css", "b/d.js"], self.getRelative(FileWalker([".*", "node_modules", "build"])))
+        self.assertEqual(["a.css", "b/c.css", "lib/build/i.css"], self.getRelative(FileWalker([".*", "node_modules", "build/*", "*.js"])))
+        self.assertEqual(7, len(self.getRelative(FileWalker([]))))
+
+    def testSymlinks(self):
+        os.symlink(os.path.join(self.dir, "b"), os.path.join(self.dir, "linked"))
+        os.symlink(self.dir, os.path.join(self.dir, "b", "loop"))
+        os.symlink(os.path.join(self.dir, "gone.css"), os.path.join(self.dir, "dangling.css"))
+
+        # the link back up the tree and the dangling link are skipped
+        self.assertEqual(["a.css", "b/c.css", "b/d.js", "build/h.css", "lib/build/i.css", "linked/c.css", "linked/d.js"],
+            self.getRelative(FileWalker()))
+        self.assertEqual(["a.css", "b/c.css", "b/d.js", "build/h.css", "lib/build/i.css"], self.getRelative(FileWalker(follow_symlinks = False)))
+
+    def testHasExtension(self):
+        self.assertTrue(FileWalker.hasExtension("site.css", ["js", ".css"]))
+        self.assertFalse(FileWalker.hasExtension("site.scss.map", ["scss"]))
+        self.assertTrue(FileWalker.hasExtension("anything", []))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os, re, gzip, shutil, tempfile, unittest
+from flask import Flask, render_template_string
+from muncher.extension import Muncher
+from muncher.util import Util
+
+class FreezerTest(unittest.TestCase):
+    page = ('<html><head><link href="/static/site.css?v=1" rel="stylesheet"></head>'
+        '<body><a href="/about">about</a><a href="http://example.com/">out</a><p class="title">{{ name }}</p></body></html>')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.dir, "build")
+        os.mkdir(os.path.join(self.dir, "static"))
+        Util.filePutContents(os.path.join(self.dir, "static", "site.css"), ".title{color:red;background:url(img.png)}")
+        Util.filePutContents(os.path.join(self.dir, "static", "img.png"), "png")
+
+        self.app = Flask(__name__, root_path = self.dir, static_folder = os.path.join(self.dir, "static"))
+        self.app.config['MUNCHER_ALL_ROUTES'] = True
+        self.muncher = Muncher(self.app)
+
+        @self.app.route('/')
+        def index():
+            return render_template_string(self.page, name = "index")
+
+        @self.app.route('/about')
+        def about():
+            return render_template_string(self.page, name = "about")
+
+        @self.app.route('/feed.json')
+        def feed():
+            return '{}', 200, {'Content-Type': 'application/json'}
+
+        @self.app.route('/post/<int:id>')
+        def post(id):
+            return render_template_string(self.page, name = id)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, url):
+        return Util.fileGetContents(self.output + url)
+
+    def testSiteIsMunchedWithOneMapAndFingerprinted(self):
+        freezer = self.muncher.freeze(self.output)
+        self.assertEqual(["/", "/about"], sorted(freezer.pages))
+        self.assertEqual("{}", self.read("/feed.json"))
+
+        index = self.read("/index.html")
+        about = self.read("/about/index.html")
+        self.assertTrue('class="title"' not in index and 'href="http://example.com/"' in index)
+        self.assertEqual(index.replace("index", "about"), about)
+
+        css_url = re.search(r'href="(/static/site\.[0-9a-f]{12}\.css)\?v=1"', index).group(1)
+        css = self.read(css_url)
+        png_url = re.search(r'url\((/static/img\.[0-9a-f]{12}\.png)\)', css).group(1)
+        self.assertEqual("png", self.read(png_url))
+        self.assertTrue(re.search(r'class="([a-z]+)"', index).group(1) in css)
+        self.assertEqual(css, self.read("/static/site.css"))
+
+        handle = gzip.open(self.output + css_url + ".gz")
+        self.assertEqual(css, handle.read())
+        handle.close()
+        self.assertFalse(os.path.exists(self.output + png_url + ".gz"))
+
+    def testFreezingAgainWritesNothing(self):
+        self.muncher.freeze(self.output)
+        freezer = self.muncher.freeze(self.output)
+        self.assertEqual([], freezer.writer.changed)
+        self.assertTrue(len(freezer.writer.unchanged) > 0)
+
+if __name__ == "__main__":
+    unittest.main()
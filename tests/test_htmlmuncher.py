@@ -0,0 +1,32 @@
+import unittest
+from muncher.config import Config
+from muncher.htmlmuncher import HtmlMuncher
+from muncher.muncher import Muncher
+
+class HtmlMuncherTest(unittest.TestCase):
+    def setUp(self):
+        config = Config()
+        config.quiet = True
+        self.muncher = Muncher(config)
+        self.muncher.class_map = {".box": ".aaa", ".item": ".aab"}
+        self.muncher.id_map = {"#main": "#aac"}
+
+    def testClassesAreRenamedAsWholeNamesLikeTheRegexPath(self):
+        html = '<div id="main" class="a.box box  x.item"><p class=\'item\'>x</p><span class="box.item boxes"></span></div>'
+        munched = HtmlMuncher(self.muncher, False, ()).munch(html)
+        self.assertEqual('<div id="aac" class="a.box aaa  x.item"><p class=\'aab\'>x</p><span class="box.item boxes"></span></div>', munched)
+        self.assertEqual(self.muncher.munchHtml(html), munched)
+
+    def testMinifiesInTheSamePass(self):
+        html = '<div  class="box item">\n  <!-- note -->\n  <pre>a\n  b</pre><!--[if IE]>x<![endif]-->\n</div>'
+        self.assertEqual('<div class="aaa aab">  <pre>a\n  b</pre><!--[if IE]>x<![endif]--> </div>', HtmlMuncher(self.muncher).munch(html))
+
+    def testInlineBlocksAndLinks(self):
+        html = ('<link href="/css/site.css?v=2" rel="stylesheet"><link href="//cdn/x.css" rel="stylesheet">'
+            '<style>.box{color:red}</style><script>document.getElementById("main")</script>')
+        self.assertEqual('<link href="/css/site.opt.css?v=2" rel="stylesheet"><link href="//cdn/x.css" rel="stylesheet">'
+            '<style>.aaa{color:red}</style><script>document.getElementById("aac")</script>', HtmlMuncher(self.muncher, False).munch(html))
+        self.assertEqual(["/css/site.css?v=2", "//cdn/x.css"], HtmlMuncher.getStylesheetLinks(html))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.util import Util
+
+class JsManifestTest(unittest.TestCase):
+    manifest = ('var Manifest = {\n $MAIN: "main",\n $$BOX: "box",\n $$JS: \'used-by-js\',\n $$OTHER: "other",\n'
+        ' MODE: "dark",\n _KEEP: "x",\n COUNT: "y",\n};\n')
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.css = self.write("site.css", ".box{color:red}#main{margin:0}.used-by-js{color:blue}")
+        self.view = self.write("view.html", '<div id="main" class="box"></div>')
+        self.path = self.write("manifest.js", self.manifest)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.dir, name)
+        Util.filePutContents(path, contents)
+        return path
+
+    def munch(self, rewrite_constants):
+        config = Config()
+        config.quiet = True
+        config.setOption("--css", self.css)
+        config.setOption("--html", self.view)
+        config.setOption("--js-manifest", self.path)
+        if rewrite_constants:
+            config.setOption("--rewrite-constants", "")
+        muncher = Muncher(config)
+
+        # the manifest is read once for the scan and the rewrite
+        reads = []
+        read = Util.fileGetContents
+        Util.fileGetContents = staticmethod(lambda path: reads.append(path) or read(path))
+        try:
+            muncher.run()
+        finally:
+            Util.fileGetContents = staticmethod(read)
+        self.assertEqual(1, reads.count(self.path))
+        return muncher, Util.fileGetContents(Util.prependExtension("opt", self.path))
+
+    def testIdsAndClassesAreRewritten(self):
+        muncher, manifest = self.munch(False)
+        self.assertEqual({"MAIN": "main"}, muncher.manifest_ids)
+        self.assertEqual({"BOX": "box", "JS": "used-by-js", "OTHER": "other"}, muncher.manifest_classes)
+        self.assertEqual(self.manifest.replace('"main"', '"' + muncher.id_map["#main"][1:] + '"')
+            .replace('"box"', '"' + muncher.class_map[".box"][1:] + '"')
+            .replace('\'used-by-js\'', '\'' + muncher.class_map[".used-by-js"][1:] + '\'')
+            .replace('"other"', '"' + muncher.class_map[".other"][1:] + '"'), manifest)
+
+    def testConstantsAreNumbered(self):
+        manifest = self.munch(True)[1]
+        self.assertTrue(' MODE: 1,\n _KEEP: "x",\n COUNT: 2,\n' in manifest)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from muncher.config import Config
+from muncher.jsminifier import JsMinifier
+from muncher.muncher import Muncher
+
+class JsMinifierTest(unittest.TestCase):
+    def assertMinified(self, expected, js):
+        self.assertEqual(expected, JsMinifier.minify(js))
+
+    def testWhitespaceAndComments(self):
+        self.assertMinified("var a=1,b=[2,3];", "var a = 1,  b = [ 2, 3 ];  // done\n")
+        self.assertMinified("a\nb", "/* drop\n */ a\nb")
+        self.assertMinified("/*! license */\nvar a", "/*! license */\nvar a")
+
+    def testLineBreaksKeptForSemicolonInsertion(self):
+        self.assertMinified("a=b\n++c", "a = b\n++c")
+        self.assertMinified("return\nx", "return\n  x")
+        self.assertMinified("x=y\n(z)", "x = y\n(z)")
+        self.assertMinified("if(a){b()}", "if (a) {\n  b()\n}")
+
+    def testOperatorsStayApart(self):
+        self.assertMinified("a+ +b", "a + +b")
+        self.assertMinified("a- -b", "a - -b")
+        self.assertMinified("1 .toString()", "1 .toString()")
+        self.assertMinified("typeof x", "typeof   x")
+
+    def testRegexAndDivision(self):
+        self.assertMinified("x=a/b/c", "x = a / b / c")
+        self.assertMinified("x=/a b+c/g.test(y)", "x = /a b+c/g.test(y)")
+        self.assertMinified("r=/a[/]b c/.test(x)", "r = /a[/]b c/.test(x)")
+        self.assertMinified("a=b\n/c d/.test(e)", "a = b\n/c d/.test(e)")
+        self.assertMinified("return/a b/", "return /a b/")
+
+    def testStringsAreCopiedThrough(self):
+        self.assertMinified('s="http://x  y"', 's = "http://x  y" // c\n')
+        self.assertMinified("t=`a  ${b} // no`", "t = `a  ${b} // no`")
+        self.assertMinified("s='a /* b */'", "s = 'a /* b */'")
+
+    def testLastStatementEnd(self):
+        js = 'a();s="x;}";r=/;}/;t=`;}`;// ;}\nb'
+        self.assertEqual(js.index("//"), JsMinifier.getLastStatementEnd(js))
+        self.assertEqual(len("f(){x()}"), JsMinifier.getLastStatementEnd("f(){x()}/* ; */"))
+        self.assertEqual(0, JsMinifier.getLastStatementEnd('a="b;c"'))
+
+    def testCompressedScriptIsMunched(self):
+        config = Config()
+        config.quiet = True
+        muncher = Muncher(config)
+        muncher.id_map = {"#box": "#a"}
+        muncher.class_map = {".item": ".b"}
+        js = 'var e = document.getElementById("box"); // find it\ne.className.addClass( "item" );\n'
+        self.assertEqual('var e=document.getElementById("a");e.className.addClass("b");', muncher.replaceJavascript(js, True))
+
+if __name__ == "__main__":
+    unittest.main()
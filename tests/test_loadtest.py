@@ -0,0 +1,49 @@
+import os, threading, unittest
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import loadtest
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status = 404 if self.path == "/missing" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write("ok")
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class LoadTestTest(unittest.TestCase):
+    def testPercentileUsesNearestRank(self):
+        values = range(1, 101)
+        self.assertEqual(50, loadtest.percentile(values, 50))
+        self.assertEqual(95, loadtest.percentile(values, 95))
+        self.assertEqual(100, loadtest.percentile(values, 100))
+        self.assertEqual(1, loadtest.percentile([1], 99))
+        self.assertEqual(0, loadtest.percentile([], 50))
+
+    def testDriveSendsEveryRequestOnce(self):
+        server = Server(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target = server.serve_forever)
+        thread.start()
+        try:
+            result = loadtest.drive(server.server_address[1], ["/a", "/b", "/missing"], 30, 4, 200, os.getpid())
+        finally:
+            server.shutdown()
+            thread.join()
+
+        self.assertEqual(20, result["requests"])
+        self.assertEqual(10, result["errors"])
+        self.assertEqual(10, result["paths"]["/a"]["requests"])
+        self.assertEqual(0, result["paths"]["/missing"]["requests"])
+        self.assertTrue(result["rss_peak"] > 0)
+
+        # 30 requests at 200 a second can not finish much faster than 0.15 seconds
+        self.assertTrue(result["throughput"] <= 220)
+
+if __name__ == "__main__":
+    unittest.main()
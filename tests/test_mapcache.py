@@ -0,0 +1,109 @@
+import os, re, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.mapcache import MapCache, StylesheetMap, StylesheetCopies
+from muncher.offload import munchPage
+from muncher.util import Util
+
+class MapCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.one = self.write("one.css", ".red{color:red}.box{padding:1px}")
+        self.two = self.write("two.css", ".box{border:1px solid}.blue{color:blue}")
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+    def write(self, name, contents):
+        path = os.path.join(self.dir, name)
+        Util.filePutContents(path, contents)
+        return path
+
+    def getPage(self, *paths):
+        links = "".join(['<link href="%s" rel="stylesheet">' % path for path in paths])
+        return '<html><head>' + links + '</head><body><p class="box blue red">x</p></body></html>'
+
+    def getConfig(self, **values):
+        config = Config()
+        config.quiet = True
+        return config.replace(**values)
+
+    def getMap(self, files = ()):
+        return StylesheetMap({".a": ".b"}, {}, frozenset(), "tag", files)
+
+    def assertLinksMatch(self, html, unstyled = ()):
+        """every class of the page is styled by the copy the page links under the same name"""
+        names = re.search(r'class="([^"]*)"', html).group(1).split()
+        css = "".join([Util.fileGetContents(href) for href in re.findall(r'href="([^"]*)"', html)])
+        for name in set(names) - set(unstyled):
+            self.assertTrue("." + name + "{" in css, name + " not in " + css)
+        return re.findall(r'href="([^"]*)"', html)
+
+    def testEvictsLeastRecentlyUsed(self):
+        cache = MapCache(1 << 20, 2)
+        config = self.getConfig()
+        built = []
+
+        def build(config, css_paths):
+            built.append(css_paths)
+            return self.getMap()
+
+        cache.get(config, [self.one], build)
+        cache.get(config, [self.two], build)
+        cache.get(config, [self.one], build)
+        cache.get(config, [self.one, self.two], build)
+        cache.get(config, [self.one], build)
+        cache.get(config, [self.two], build)
+
+        self.assertEqual([[self.one], [self.two], [self.one, self.two], [self.two]], built)
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+
+    def testEvictionDeletesCopiesNoOtherEntryUses(self):
+        shared = self.write("shared.tag.opt.css", "")
+        own = self.write("one.tag.opt.css", "")
+        cache = MapCache(1 << 20, 1)
+        config = self.getConfig()
+        cache.get(config, [self.one], lambda config, css_paths: self.getMap([own, shared]))
+        cache.get(config, [self.two], lambda config, css_paths: self.getMap([shared]))
+
+        self.assertFalse(os.path.exists(own))
+        self.assertTrue(os.path.exists(shared))
+
+    def testCopiesAreBounded(self):
+        copies = StylesheetCopies(2)
+        paths = [self.write("copy%d.opt.css" % i, "") for i in range(3)]
+        copies.add([paths[0]])
+        copies.add([paths[1]])
+        copies.add([paths[0]])
+        copies.add([paths[2]])
+
+        self.assertEqual([True, False, True], [os.path.exists(path) for path in paths])
+
+    def testPagesLinkCopiesMunchedWithTheirMap(self):
+        config = self.getConfig(map_cache_memory = 1 << 20)
+        first = self.getPage(self.two)
+        second = self.getPage(self.one, self.two)
+
+        hrefs = self.assertLinksMatch(munchPage(config, first, [self.two])[0], ["red"])
+        self.assertLinksMatch(munchPage(config, second, [self.one, self.two])[0])
+
+        # a hit has to put back copies that went missing
+        os.unlink(hrefs[0])
+        self.assertEqual(hrefs, self.assertLinksMatch(munchPage(config, first, [self.two])[0], ["red"]))
+        self.assertEqual(1, MapCache.instance.hits)
+
+    def testPrunedPagesKeepABoundedNumberOfCopies(self):
+        config = self.getConfig(prune_css = True)
+        StylesheetCopies.getInstance().max_sets = 2
+        for i in range(4):
+            page = self.getPage(self.one).replace("box", "box extra%d" % i)
+            self.write("one.css", ".red{color:red}.box{padding:1px}.extra%d{margin:%dpx}" % (i, i))
+            self.assertLinksMatch(munchPage(config, page, [self.one])[0], ["blue"])
+
+        self.assertEqual(2, len([name for name in os.listdir(self.dir) if name.endswith(".opt.css")]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.memoryprofiler import MemoryProfiler
+from muncher.util import Util
+
+class MaxMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testOneLineJsStaysUnderBudget(self):
+        view = os.path.join(self.dir, "view.html")
+        bundle = os.path.join(self.dir, "bundle.js")
+        Util.filePutContents(view, '<div id="box" class="item"></div>')
+        call = 'document.getElementById("box");$(".item").addClass("on");'
+        Util.filePutContents(bundle, call + "var a=1;" * 524288 + call)
+
+        # reading the 4mb file whole would go over a budget of 3mb on top of what is used now
+        budget = (MemoryProfiler.getRss() + 3 * 1048576) / 1048576.0
+        config = Config()
+        config.quiet = True
+        for option in (("--html", view), ("--js", bundle), ("--framework", "jquery"), ("--max-memory", str(budget)), ("--stream-window", "65536")):
+            config.setOption(*option)
+        Muncher(config).run()
+
+        munched = Util.fileGetContents(Util.prependExtension("opt", bundle))
+        call = 'document.getElementById("aaa");$(".aaa").addClass("aab");'
+        self.assertEqual(call + "var a=1;" * 524288 + call, munched)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os, time, shutil, tempfile, unittest
+from flask import Flask, render_template_string
+import muncher.extension
+from muncher.extension import Muncher
+from muncher.munchbudget import MunchBudget
+from muncher.config import Config
+from muncher.mapcache import MapCache, StylesheetCopies
+
+class Queue(object):
+    def __init__(self, pending):
+        self.pending = pending
+
+    def getPending(self):
+        return self.pending
+
+class MunchBudgetTest(unittest.TestCase):
+    page = ('<html><head><link href="/static/site.css" rel="stylesheet"></head><body>\n'
+        '  <p class="title">{{ text }}</p>\n</body></html>')
+
+    minified = '<html><head><link href="/static/site.css" rel="stylesheet"></head><body> <p class="title">%s</p> </body></html>'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, "static"))
+        open(os.path.join(self.dir, "static", "site.css"), "w").write(".title{color:red}")
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+        self.munch_page = muncher.extension.munchPage
+
+    def tearDown(self):
+        muncher.extension.munchPage = self.munch_page
+        shutil.rmtree(self.dir)
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+    def getApp(self, **settings):
+        app = Flask(__name__, root_path = self.dir, static_folder = os.path.join(self.dir, "static"))
+        app.config['MUNCHER_ALL_ROUTES'] = True
+        app.config.update(settings)
+        app.logger.disabled = True
+        extension = Muncher(app)
+
+        @app.route('/<text>')
+        def page(text):
+            return render_template_string(self.page, text = text)
+
+        return app, extension
+
+    def testSkipReasons(self):
+        config = Config()
+        config.quiet = True
+        budget = MunchBudget(config.freeze(), max_size = 10, shed_queue = 2)
+        self.assertEqual("size", budget.getSkipReason("x" * 11))
+        self.assertEqual(None, budget.getSkipReason("x" * 10))
+        self.assertEqual(None, budget.getSkipReason("x", Queue(1)))
+        self.assertEqual("queue", budget.getSkipReason("x", Queue(2)))
+
+    def testBigPagesAreOnlyMinified(self):
+        app, extension = self.getApp(MUNCHER_MAX_PAGE_SIZE = 120)
+        client = app.test_client()
+        self.assertEqual(self.minified % 'long-enough', client.get('/long-enough').data)
+        self.assertTrue('class="title"' not in client.get('/short').data)
+
+        metrics = extension.getMetrics()
+        self.assertEqual(1, metrics["munched"])
+        self.assertEqual(1, metrics["skipped"]["size"])
+        self.assertEqual(["/long-enough"], [offender["path"] for offender in metrics["offenders"]])
+
+    def testSlowMunchesFallBack(self):
+        def slow(config, html, css_paths):
+            time.sleep(1)
+            return self.munch_page(config, html, css_paths)
+
+        muncher.extension.munchPage = slow
+        app, extension = self.getApp(MUNCHER_MAX_MUNCH_TIME = 0.05)
+        try:
+            self.assertEqual(self.minified % 'slow', app.test_client().get('/slow').data)
+            self.assertEqual(1, extension.getMetrics()["skipped"]["time"])
+        finally:
+            extension.offloader.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.namestrategy import NameStrategy
+from muncher.varfactory import VarFactory
+from muncher.sizetracker import SizeTracker
+from muncher.util import Util
+
+class NameStrategyTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        names = ["item-%d" % i for i in range(40)]
+        Util.filePutContents(os.path.join(self.dir, "site.css"), "".join(["." + name + "{color:red}" for name in names]))
+        Util.filePutContents(os.path.join(self.dir, "view.html"), "".join(['<p class="' + name + '">zzz</p>' for name in names * 3]))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def getMuncher(self, budget):
+        config = Config()
+        config.quiet = True
+        config.setOption("--css", os.path.join(self.dir, "site.css"))
+        config.setOption("--html", os.path.join(self.dir, "view.html"))
+        config.setOption("--gzip-names", "")
+        config.setOption("--name-budget", budget)
+        muncher = Muncher(config)
+        muncher.scan()
+        return muncher
+
+    def testFrequencyAlphabetKeepsDigitsLast(self):
+        alphabet = NameStrategy.getFrequencyAlphabet({"9": 10, "z": 5, "p": 5, "a": 1})
+        self.assertEqual(sorted(VarFactory.symbols), sorted(alphabet))
+        self.assertEqual("pza", alphabet[:3])
+        self.assertEqual("9", alphabet[26])
+
+    def testSmallestGzipWins(self):
+        muncher = self.getMuncher("10")
+        strategy = NameStrategy(muncher, 10.0)
+        strategy.choose({}, {})
+
+        # every candidate renames to names of the same length, only the gzipped size can differ
+        self.assertEqual(6, len(strategy.results))
+        self.assertEqual(1, len(set([raw for label, raw, gzip_size in strategy.results])))
+        best = min([gzip_size for label, raw, gzip_size in strategy.results])
+        self.assertEqual(best, SizeTracker.getGzipSize(strategy.munchSample(strategy.getSample())))
+        self.assertTrue("using " in strategy.getReport())
+
+    def testNoBudgetKeepsTheDefaultNames(self):
+        default = self.getMuncher("0")
+        default.assignNames({}, {})
+
+        muncher = self.getMuncher("0")
+        strategy = NameStrategy(muncher, 0)
+        strategy.choose({}, {})
+        self.assertEqual(["default"], [result[0] for result in strategy.results])
+        self.assertEqual(default.class_map, muncher.class_map)
+
+if __name__ == "__main__":
+    unittest.main()
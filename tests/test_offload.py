@@ -0,0 +1,74 @@
+import os, shutil, tempfile, threading, unittest
+from muncher.config import Config
+from muncher.mapcache import MapCache, StylesheetCopies
+from muncher.offload import Offloader, MunchedBody, munchPage
+
+def fail(message):
+    raise ValueError(message)
+
+def wait(event):
+    event.wait()
+    return "late"
+
+class OffloadTest(unittest.TestCase):
+    html = '<html><head><link href="/site.css" rel="stylesheet"></head><body><div id="main" class="title">x</div></body></html>'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.css = os.path.join(self.dir, "site.css")
+        open(self.css, "w").write(".title{color:red}#main{margin:0}")
+        self.config = Config()
+        self.config.quiet = True
+        self.config.freeze()
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        MapCache.instance = None
+        StylesheetCopies.instance = None
+
+    def testPoolsMunchLikeTheRequestThread(self):
+        expected = munchPage(self.config, self.html, [self.css])[0]
+        self.assertTrue('class="title"' not in expected)
+        for executor in Offloader.executors:
+            offloader = Offloader(executor, 2)
+            try:
+                jobs = [offloader.submit(munchPage, self.config, self.html, [self.css]) for i in range(3)]
+                self.assertEqual([expected] * 3, [job.get(10)[0] for job in jobs])
+                self.assertEqual(0, offloader.getPending())
+            finally:
+                offloader.close()
+
+    def testFailedAndSlowJobsFallBack(self):
+        offloader = Offloader("thread", 1)
+        release = threading.Event()
+        try:
+            body = MunchedBody(offloader.submit(fail, "broken"), lambda result: result, error = lambda e: "error: " + str(e))
+            self.assertEqual(["error: broken"], list(body))
+
+            job = offloader.submit(wait, release)
+            body = MunchedBody(job, lambda result: result, timeout = 0.05, fallback = lambda: "minified")
+            self.assertEqual(["minified"], list(body))
+            self.assertTrue(job.ready() and job.get() is None)
+        finally:
+            release.set()
+            offloader.close()
+
+    def testCancelledJobNeverStarts(self):
+        offloader = Offloader("thread", 1)
+        release = threading.Event()
+        started = []
+        try:
+            offloader.submit(wait, release)
+            job = offloader.submit(started.append, True)
+            job.cancel()
+            release.set()
+            offloader.submit(wait, release).get(10)
+            self.assertEqual([], started)
+            self.assertEqual(None, job.get())
+        finally:
+            offloader.close()
+
+if __name__ == "__main__":
+    unittest.main()
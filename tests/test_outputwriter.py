@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import os, stat, shutil, tempfile, unittest
+from muncher.outputwriter import OutputWriter
+from muncher.util import Util
+
+class OutputWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "out.css")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def getMode(self, path):
+        return stat.S_IMODE(os.stat(path).st_mode)
+
+    def testUnchangedFileIsLeftAlone(self):
+        writer = OutputWriter()
+        writer.write(self.path, ".a{color:red}")
+        os.utime(self.path, (0, 0))
+        writer.write(self.path, ".a{color:red}")
+        writer.write(self.path, ".a{color:blue}")
+
+        self.assertEqual([self.path, self.path], writer.changed)
+        self.assertEqual([self.path], writer.unchanged)
+        self.assertEqual(".a{color:blue}", Util.fileGetContents(self.path))
+        self.assertEqual(["out.css"], os.listdir(self.dir))
+
+    def testUnicodeIsWrittenAsUtf8(self):
+        writer = OutputWriter(2)
+        writer.write(self.path, u".a:after{content:\"✓ caf\xe9\"}")
+        writer.write(self.path, u".a:after{content:\"✓ caf\xe9\"}")
+        writer.close()
+
+        self.assertEqual(".a:after{content:\"✓ café\"}", Util.fileGetContents(self.path))
+        self.assertEqual([self.path], writer.unchanged)
+
+    def testNewFileGetsUmaskAndExistingFileKeepsItsMode(self):
+        umask = os.umask(022)
+        try:
+            OutputWriter().write(self.path, "a")
+            self.assertEqual(0644, self.getMode(self.path))
+
+            os.chmod(self.path, 0600)
+            OutputWriter().write(self.path, "b")
+            self.assertEqual(0600, self.getMode(self.path))
+
+            # the writer never touches the umask of the process
+            self.assertEqual(022, os.umask(022))
+        finally:
+            os.umask(umask)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.census import Census
+from muncher.util import Util
+
+class PersistMapTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.map_path = os.path.join(self.dir, "map.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def munch(self, classes, remap_threshold = None):
+        css = "".join(["." + name + "{color:red}" for name in classes])
+        html = '<div class="' + " ".join(classes) + '"></div>'
+        Util.filePutContents(os.path.join(self.dir, "site.css"), css)
+        Util.filePutContents(os.path.join(self.dir, "view.html"), html)
+
+        config = Config()
+        config.quiet = True
+        config.setOption("--css", os.path.join(self.dir, "site.css"))
+        config.setOption("--html", os.path.join(self.dir, "view.html"))
+        config.setOption("--persist-map", self.map_path)
+        if remap_threshold is not None:
+            config.setOption("--remap-threshold", remap_threshold)
+        muncher = Muncher(config)
+        muncher.run()
+        return muncher.class_map
+
+    def testExistingNamesAreKept(self):
+        first = self.munch(["header", "footer"])
+
+        # a new class that saves more than the old ones would normally take the shortest name
+        second = self.munch(["header", "footer", "very-long-navigation-item"] * 3)
+        self.assertEqual(first[".header"], second[".header"])
+        self.assertEqual(first[".footer"], second[".footer"])
+        self.assertFalse(second[".very-long-navigation-item"] in first.values())
+
+        # names that drop out stay in the file and come back with the same name
+        self.munch(["header"])
+        self.assertEqual(first[".footer"], Census.readMaps(self.map_path)[0][".footer"])
+        self.assertEqual(second, self.munch(["header", "footer", "very-long-navigation-item"]))
+
+    def testDriftPastThresholdReassignsEverything(self):
+        classes = ["header", "footer", "very-long-navigation-item", "sidebar", "content"]
+        self.munch(["header", "footer"])
+        self.assertEqual(self.munch(["header", "footer"], "0.5"), self.munch(["header", "footer"]))
+
+        # three of five names are new, so the map is computed as if there was no file
+        reassigned = self.munch(classes, "0.5")
+        os.remove(self.map_path)
+        self.assertEqual(self.munch(classes), reassigned)
+
+if __name__ == "__main__":
+    unittest.main()
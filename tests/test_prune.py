@@ -0,0 +1,57 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.util import Util
+
+class PruneTest(unittest.TestCase):
+    css = "\n".join([
+        ".used{color:red}",
+        ".unused{color:blue}",
+        ".used .unused, .used > p{margin:0}",
+        ".js-toggle{display:none}",
+        ".from-js{color:green}",
+        "#main .used:not(.gone){padding:0}",
+        "a[href$=\".gone\"]{color:red}",
+        "@media print{.unused{display:none}}",
+        "@media screen{.used{display:block}.unused{display:none}}",
+        ".keep-me{color:pink}",
+        ""])
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.dir, name)
+        Util.filePutContents(path, contents)
+        return path
+
+    def testUnusedRulesAreDropped(self):
+        css = self.write("site.css", self.css)
+        view = self.write("view.html", '<div id="main" class="used"><p>x</p></div>')
+        js = self.write("app.js", 'document.getElementsByClassName("from-js");')
+
+        config = Config()
+        config.quiet = True
+        for option in (("--css", css), ("--html", view), ("--js", js), ("--prune-css", ""), ("--prune-safelist", ".js-*,.keep-*")):
+            config.setOption(*option)
+        muncher = Muncher(config)
+        muncher.run()
+
+        # names inside :not() and attribute selectors are not required, empty @media blocks go too
+        self.assertEqual("\n".join([
+            ".aaa{color:red}",
+            ".aaa > p{margin:0}",
+            ".aac{display:none}",
+            ".aab{color:green}",
+            "#aaa .aaa:not(.gone){padding:0}",
+            "a[href$=\".gone\"]{color:red}",
+            "@media screen{.aaa{display:block}}",
+            ".aad{color:pink}",
+            ""]), Util.fileGetContents(Util.prependExtension("opt", css)))
+        self.assertTrue(muncher.pruned_bytes > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config, ConfigError
+from muncher.muncher import Muncher
+from muncher.util import Util
+
+class ScopeNamesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.css = self.write("site.css", ".shared{color:red}#main{margin:0}")
+        self.a = self.write("a.html", '<style>.only-a{color:blue}.also-a{margin:0}</style><div id="main" class="shared only-a also-a b"></div>')
+        self.b = self.write("b.html", '<style>.only-b{color:blue}</style><div class="shared only-b"></div>'
+            '<script>document.getElementById("private-b")</script><p id="private-b"></p>')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.dir, name)
+        Util.filePutContents(path, contents)
+        return path
+
+    def munch(self, scope_names):
+        config = Config()
+        config.quiet = True
+        config.setOption("--css", self.css)
+        config.setOption("--html", self.a + "," + self.b)
+        if scope_names:
+            config.setOption("--scope-names", "")
+        Muncher(config).run()
+        return [Util.fileGetContents(Util.prependExtension("opt", path)) for path in (self.css, self.a, self.b)]
+
+    def testViewsGetTheShortestFreeNames(self):
+        css, a, b = self.munch(True)
+        self.assertEqual(".aaa{color:red}#aaa{margin:0}", css)
+
+        # b is used in the markup of a without any css knowing it, so it is skipped
+        self.assertEqual('<style>.c{color:blue}.a{margin:0}</style><div id="aaa" class="aaa c a b"></div>', a)
+        self.assertEqual('<style>.a{color:blue}</style><div class="aaa a"></div>'
+            '<script>document.getElementById("a")</script><p id="a"></p>', b)
+
+    def testScopedViewsAreSmaller(self):
+        scoped = self.munch(True)
+        unscoped = self.munch(False)
+        self.assertTrue(len(scoped[1]) < len(unscoped[1]) and len(scoped[2]) < len(unscoped[2]))
+
+    def testCensusAndImportedMapsAreRefused(self):
+        for key in ("--export-census", "--import-map"):
+            config = Config()
+            config.setOption("--scope-names", "")
+            config.setOption(key, os.path.join(self.dir, "census"))
+            self.assertRaises(ConfigError, config.validate)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os, shutil, tempfile, unittest
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.streamer import Streamer
+from muncher.util import Util
+
+class StreamerTest(unittest.TestCase):
+    window = 4096
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.dir, name)
+        Util.filePutContents(path, contents)
+        return path
+
+    def getMuncher(self, *options):
+        config = Config()
+        config.quiet = True
+        for option in options:
+            config.setOption(*option)
+        return Muncher(config)
+
+    def getOneLineJs(self):
+        """a minified bundle on a single line with selector calls, strings, regexes and templates"""
+        parts = []
+        for i in range(600):
+            parts.append('var a%d=document.getElementById("box%d");' % (i, i % 20))
+            parts.append('$(".item%d").addClass("on");' % (i % 10))
+            parts.append('function f%d(x){return x/2/3+"s;}t"+/r;g}x/.test(x)}' % i)
+            parts.append('var t%d=`a ${x};}`;' % i)
+        return "".join(parts)
+
+    def getView(self):
+        html = ['<div id="box%d" class="item%d on"></div>' % (i, i % 10) for i in range(20)]
+        return "".join(html)
+
+    def assertBounded(self, path, boundary):
+        chunks = list(Streamer.getChunks(path, self.window, boundary))
+        self.assertEqual(Util.fileGetContents(path), "".join(chunks))
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(max([len(chunk) for chunk in chunks]) < self.window * (Streamer.max_windows + 1))
+        return chunks
+
+    def testOneLineJsIsCut(self):
+        path = self.write("bundle.js", self.getOneLineJs())
+        muncher = self.getMuncher(("--framework", "jquery"))
+        chunks = self.assertBounded(path, muncher.jsBoundary)
+
+        # every cut falls right after a ; or } outside of a string, regex or template
+        for chunk in chunks[:-1]:
+            self.assertTrue(chunk[-1] in ";}")
+            self.assertEqual(chunk.count("`") % 2, 0)
+
+    def testJsWithoutStatementsIsForcedApart(self):
+        path = self.write("string.js", 'var x="' + "ab cd" * 20000 + '"+document.getElementById("box1")+"' + "q" * 20000 + '";')
+        muncher = self.getMuncher()
+        chunks = self.assertBounded(path, muncher.jsBoundary)
+        self.assertEqual(1, len([chunk for chunk in chunks if 'document.getElementById("box1")' in chunk]))
+
+    def testCssWithoutRulesIsForcedApart(self):
+        path = self.write("data.css", ".a{background:url(data:image/png;base64," + "QUJD" * 20000 + ")}.b #c{color:red}")
+        chunks = self.assertBounded(path, Streamer.cssBoundary)
+        self.assertTrue(chunks[-1].endswith(".b #c{color:red}"))
+
+    def testStreamedJsMatchesWholeFile(self):
+        js = self.getOneLineJs()
+        outputs = []
+        for name, options in (("whole", []), ("streamed", [("--stream", ""), ("--stream-window", str(self.window))])):
+            os.mkdir(os.path.join(self.dir, name))
+            view = self.write(name + "/view.html", self.getView())
+            bundle = self.write(name + "/bundle.js", js)
+            options = [("--html", view), ("--js", bundle), ("--framework", "jquery")] + options
+            self.getMuncher(*options).run()
+            outputs.append(Util.fileGetContents(Util.prependExtension("opt", bundle)))
+
+        self.assertNotEqual(js, outputs[0])
+        self.assertEqual(outputs[0], outputs[1])
+
+if __name__ == "__main__":
+    unittest.main()
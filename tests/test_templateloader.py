@@ -0,0 +1,39 @@
+import unittest
+from jinja2 import Environment, DictLoader
+from muncher.config import Config
+from muncher.muncher import Muncher
+from muncher.templateloader import MunchLoader
+
+class MunchLoaderTest(unittest.TestCase):
+    def setUp(self):
+        config = Config()
+        config.quiet = True
+        self.muncher = Muncher(config)
+        self.muncher.class_map = {".box": ".aaa", ".item": ".aab"}
+        self.muncher.id_map = {"#main": "#aac"}
+
+    def testExpressionsAreLeftAlone(self):
+        source = ('<link href="{{ url_for(\'static\', filename=\'site.css\') }}" rel="stylesheet">'
+            '<script src="/js/app.js"></script><link href="//cdn/x.css" rel="stylesheet">'
+            '<div id="main" class="box {{ extra }}">{% if item %}<p class="item">{# class="box" #}{{ item }}</p>{% endif %}</div>')
+        self.assertEqual('<link href="{{ url_for(\'static\', filename=\'site.opt.css\') }}" rel="stylesheet">'
+            '<script src="/js/app.js"></script><link href="//cdn/x.css" rel="stylesheet">'
+            '<div id="aac" class="aaa {{ extra }}">{% if item %}<p class="aab">{# class="box" #}{{ item }}</p>{% endif %}</div>',
+            MunchLoader(None, self.muncher).munchSource(source))
+
+    def testSourceIsMunchedOnceWhenLoaded(self):
+        calls = []
+        munch = self.muncher.munchHtml
+
+        def count(html):
+            calls.append(html)
+            return munch(html)
+
+        self.muncher.munchHtml = count
+        environment = Environment(loader = MunchLoader(DictLoader({"page.html": '<p class="box">{{ text }}</p>'}), self.muncher))
+        for text in ("a", "b"):
+            self.assertEqual('<p class="aaa">' + text + '</p>', environment.get_template("page.html").render(text = text))
+        self.assertEqual(1, len(calls))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from muncher.viewparser import ViewParser, ViewSegment
+
+class ViewParserTest(unittest.TestCase):
+    def getSegments(self, html):
+        segments = ViewParser.parse(html)
+        self.assertEqual(html, "".join([segment.text for segment in segments]))
+        for segment in segments:
+            self.assertEqual(html[segment.start:segment.end], segment.text)
+        return [(segment.type, segment.text) for segment in segments]
+
+    def testBlocksGetTheirOwnSegments(self):
+        html = ('<style media="a>b">.box{}</style><p>x</p><SCRIPT>var a = "</style>";</SCRIPT>'
+            '<script type="text/template"><div class="box"></div></script><script src="/app.js"></script>'
+            '<!-- <style>.gone{}</style> --><script type="module">go()</script>')
+        self.assertEqual([
+            (ViewSegment.MARKUP, '<style media="a>b">'),
+            (ViewSegment.STYLE, '.box{}'),
+            (ViewSegment.MARKUP, '</style><p>x</p><SCRIPT>'),
+            (ViewSegment.SCRIPT, 'var a = "</style>";'),
+            (ViewSegment.MARKUP, '</SCRIPT><script type="text/template"><div class="box"></div></script><script src="/app.js"></script>'
+                '<!-- <style>.gone{}</style> --><script type="module">'),
+            (ViewSegment.SCRIPT, 'go()'),
+            (ViewSegment.MARKUP, '</script>')], self.getSegments(html))
+
+    def testEdgeCases(self):
+        self.assertEqual([(ViewSegment.MARKUP, '')], self.getSegments(''))
+        self.assertEqual([(ViewSegment.MARKUP, '<style></style>')], self.getSegments('<style></style>'))
+
+        # an unclosed block runs to the end of the view
+        self.assertEqual([(ViewSegment.MARKUP, '<p>x</p><style>'), (ViewSegment.STYLE, '.box{')], self.getSegments('<p>x</p><style>.box{'))
+
+    def testGetText(self):
+        segments = ViewParser.parse('<style>.a{}</style><script>a()</script><style>.b{}</style>')
+        self.assertEqual('.a{}.b{}', ViewParser.getText(segments, ViewSegment.STYLE))
+        self.assertEqual('a()', ViewParser.getText(segments, ViewSegment.SCRIPT))
+
+if __name__ == "__main__":
+    unittest.main()